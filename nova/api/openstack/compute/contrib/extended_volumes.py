@@ -25,9 +25,7 @@ class ExtendedVolumesController(wsgi.Controller):
     def __init__(self, *args, **kwargs):
         super(ExtendedVolumesController, self).__init__(*args, **kwargs)
 
-    def _extend_server(self, context, server, instance):
-        bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
-                context, instance.uuid)
+    def _extend_server(self, context, server, bdms):
         volume_ids = [bdm.volume_id for bdm in bdms if bdm.volume_id]
         key = "%s:volumes_attached" % Extended_volumes.alias
         server[key] = [{'id': volume_id} for volume_id in volume_ids]
@@ -40,18 +38,22 @@ class ExtendedVolumesController(wsgi.Controller):
             db_instance = req.get_db_instance(server['id'])
             # server['id'] is guaranteed to be in the cache due to
             # the core API adding it in its 'show' method.
-            self._extend_server(context, server, db_instance)
+            bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
+                    context, db_instance.uuid)
+            self._extend_server(context, server, bdms)
 
     @wsgi.extends
     def detail(self, req, resp_obj):
         context = req.environ['nova.context']
         if authorize(context):
             servers = list(resp_obj.obj['servers'])
+            # NOTE: Fetch the mappings of the whole page in one query.
+            bdms_by_uuid = (
+                objects.BlockDeviceMappingList.bdms_by_instance_uuid(
+                    context, [server['id'] for server in servers]))
             for server in servers:
-                db_instance = req.get_db_instance(server['id'])
-                # server['id'] is guaranteed to be in the cache due to
-                # the core API adding it in its 'detail' method.
-                self._extend_server(context, server, db_instance)
+                self._extend_server(context, server,
+                                    bdms_by_uuid[server['id']])
 
 
 class Extended_volumes(extensions.ExtensionDescriptor):
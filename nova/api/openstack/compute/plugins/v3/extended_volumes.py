@@ -27,9 +27,7 @@ class ExtendedVolumesController(wsgi.Controller):
         super(ExtendedVolumesController, self).__init__(*args, **kwargs)
         self.api_version_2_3 = api_version_request.APIVersionRequest('2.3')
 
-    def _extend_server(self, context, server, instance, requested_version):
-        bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
-                context, instance.uuid)
+    def _extend_server(self, context, server, bdms, requested_version):
         volumes_attached = []
         for bdm in bdms:
             if bdm.get('volume_id'):
@@ -49,7 +47,9 @@ class ExtendedVolumesController(wsgi.Controller):
             db_instance = req.get_db_instance(server['id'])
             # server['id'] is guaranteed to be in the cache due to
             # the core API adding it in its 'show' method.
-            self._extend_server(context, server, db_instance,
+            bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
+                    context, db_instance.uuid)
+            self._extend_server(context, server, bdms,
                                 req.api_version_request)
 
     @wsgi.extends
@@ -57,11 +57,13 @@ class ExtendedVolumesController(wsgi.Controller):
         context = req.environ['nova.context']
         if soft_authorize(context):
             servers = list(resp_obj.obj['servers'])
+            # NOTE: Fetch the mappings of the whole page in one query.
+            bdms_by_uuid = (
+                objects.BlockDeviceMappingList.bdms_by_instance_uuid(
+                    context, [server['id'] for server in servers]))
             for server in servers:
-                db_instance = req.get_db_instance(server['id'])
-                # server['id'] is guaranteed to be in the cache due to
-                # the core API adding it in its 'detail' method.
-                self._extend_server(context, server, db_instance,
+                self._extend_server(context, server,
+                                    bdms_by_uuid[server['id']],
                                     req.api_version_request)
 
 
@@ -28,7 +28,6 @@ The interface into this module is the MessageRunner class.
 """
 
 import sys
-import traceback
 
 from eventlet import queue
 from oslo_config import cfg
@@ -39,7 +38,6 @@ from oslo_utils import excutils
 from oslo_utils import importutils
 from oslo_utils import timeutils
 from oslo_utils import uuidutils
-import six
 
 from nova.cells import state as cells_state
 from nova.cells import utils as cells_utils
@@ -1827,8 +1825,8 @@ class Response(object):
     def to_json(self):
         resp_value = self.serializer.serialize_entity(self.ctxt, self.value)
         if self.failure:
-            resp_value = serialize_remote_exception(resp_value,
-                                                    log_failure=False)
+            resp_value = rpc.serialize_remote_exception(resp_value,
+                                                        log_failure=False)
         _dict = {'cell_name': self.cell_name,
                  'value': resp_value,
                  'failure': self.failure}
@@ -1838,8 +1836,7 @@ class Response(object):
     def from_json(cls, ctxt, json_message):
         _dict = jsonutils.loads(json_message)
         if _dict['failure']:
-            resp_value = deserialize_remote_exception(_dict['value'],
-                                                      rpc.get_allowed_exmods())
+            resp_value = rpc.deserialize_remote_exception(_dict['value'])
             _dict['value'] = resp_value
         response = cls(ctxt, **_dict)
         response.value = response.serializer.deserialize_entity(
@@ -1853,88 +1850,3 @@ class Response(object):
             else:
                 raise self.value
         return self.value
-
-
-_REMOTE_POSTFIX = '_Remote'
-
-
-def serialize_remote_exception(failure_info, log_failure=True):
-    """Prepares exception data to be sent over rpc.
-
-    Failure_info should be a sys.exc_info() tuple.
-
-    """
-    tb = traceback.format_exception(*failure_info)
-    failure = failure_info[1]
-    if log_failure:
-        LOG.error(_LE("Returning exception %s to caller"),
-                  six.text_type(failure))
-        LOG.error(tb)
-
-    kwargs = {}
-    if hasattr(failure, 'kwargs'):
-        kwargs = failure.kwargs
-
-    # NOTE(matiu): With cells, it's possible to re-raise remote, remote
-    # exceptions. Lets turn it back into the original exception type.
-    cls_name = str(failure.__class__.__name__)
-    mod_name = str(failure.__class__.__module__)
-    if (cls_name.endswith(_REMOTE_POSTFIX) and
-            mod_name.endswith(_REMOTE_POSTFIX)):
-        cls_name = cls_name[:-len(_REMOTE_POSTFIX)]
-        mod_name = mod_name[:-len(_REMOTE_POSTFIX)]
-
-    data = {
-        'class': cls_name,
-        'module': mod_name,
-        'message': six.text_type(failure),
-        'tb': tb,
-        'args': failure.args,
-        'kwargs': kwargs
-    }
-
-    json_data = jsonutils.dumps(data)
-
-    return json_data
-
-
-def deserialize_remote_exception(data, allowed_remote_exmods):
-    failure = jsonutils.loads(str(data))
-
-    trace = failure.get('tb', [])
-    message = failure.get('message', "") + "\n" + "\n".join(trace)
-    name = failure.get('class')
-    module = failure.get('module')
-
-    # NOTE(ameade): We DO NOT want to allow just any module to be imported, in
-    # order to prevent arbitrary code execution.
-    if module != 'exceptions' and module not in allowed_remote_exmods:
-        return messaging.RemoteError(name, failure.get('message'), trace)
-
-    try:
-        mod = importutils.import_module(module)
-        klass = getattr(mod, name)
-        if not issubclass(klass, Exception):
-            raise TypeError("Can only deserialize Exceptions")
-
-        failure = klass(*failure.get('args', []), **failure.get('kwargs', {}))
-    except (AttributeError, TypeError, ImportError):
-        return messaging.RemoteError(name, failure.get('message'), trace)
-
-    ex_type = type(failure)
-    str_override = lambda self: message
-    new_ex_type = type(ex_type.__name__ + _REMOTE_POSTFIX, (ex_type,),
-                       {'__str__': str_override, '__unicode__': str_override})
-    new_ex_type.__module__ = '%s%s' % (module, _REMOTE_POSTFIX)
-    try:
-        # NOTE(ameade): Dynamically create a new exception type and swap it in
-        # as the new type for the exception. This only works on user defined
-        # Exceptions and not core python exceptions. This is important because
-        # we cannot necessarily change an exception message so we must override
-        # the __str__ method.
-        failure.__class__ = new_ex_type
-    except TypeError:
-        # NOTE(ameade): If a core exception then just add the traceback to the
-        # first exception argument.
-        failure.args = (message,) + failure.args[1:]
-    return failure
@@ -57,6 +57,7 @@ from __future__ import print_function
 import argparse
 import os
 import sys
+import time
 import urllib
 
 import decorator
@@ -64,6 +65,7 @@ import netaddr
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_serialization import jsonutils
 from oslo_utils import importutils
 import six
 
@@ -900,6 +902,8 @@ class HostCommands(object):
 class DbCommands(object):
     """Class for managing the main database."""
 
+    _ARCHIVE_BATCH_SIZE = 1000
+
     def __init__(self):
         pass
 
@@ -914,9 +918,24 @@ class DbCommands(object):
 
     @args('--max_rows', metavar='<number>',
             help='Maximum number of deleted rows to archive')
-    def archive_deleted_rows(self, max_rows):
+    @args('--batch_size', metavar='<number>',
+          help='Archive online, moving at most this number of rows per '
+               'transaction')
+    @args('--rows_per_second', metavar='<number>',
+          help='Archive online, moving at most this number of rows per '
+               'second. By default the archiving is not throttled')
+    @args('--checkpoint', metavar='<path>',
+          help='Archive online, recording the progress in this file so that '
+               'the next run resumes where this one stopped')
+    def archive_deleted_rows(self, max_rows, batch_size=None,
+                             rows_per_second=None, checkpoint=None):
         """Move up to max_rows deleted rows from production tables to shadow
         tables.
+
+        When any of batch_size, rows_per_second or checkpoint is given, the
+        rows are archived online: table by table, dependent tables first,
+        in short transactions of batch_size rows, so that the archiving can
+        run against a busy database without holding long locks.
         """
         if max_rows is not None:
             max_rows = int(max_rows)
@@ -924,7 +943,86 @@ class DbCommands(object):
                 print(_("Must supply a positive value for max_rows"))
                 return(1)
         admin_context = context.get_admin_context()
-        db.archive_deleted_rows(admin_context, max_rows)
+        if batch_size is None and rows_per_second is None and \
+                checkpoint is None:
+            db.archive_deleted_rows(admin_context, max_rows)
+            return
+
+        if batch_size is None:
+            batch_size = self._ARCHIVE_BATCH_SIZE
+        batch_size = int(batch_size)
+        if rows_per_second is not None:
+            rows_per_second = float(rows_per_second)
+        if batch_size <= 0 or (rows_per_second is not None and
+                               rows_per_second <= 0):
+            print(_("Must supply a positive value for batch_size and "
+                    "rows_per_second"))
+            return(1)
+        self._archive_deleted_rows_online(admin_context, max_rows,
+                                          batch_size, rows_per_second,
+                                          checkpoint)
+
+    @staticmethod
+    def _load_archive_checkpoint(checkpoint):
+        if checkpoint is None or not os.path.exists(checkpoint):
+            return None, None
+        with open(checkpoint) as f:
+            progress = jsonutils.load(f)
+        return progress['table'], progress['marker']
+
+    @staticmethod
+    def _save_archive_checkpoint(checkpoint, tablename, marker):
+        if checkpoint is None:
+            return
+        if tablename is None:
+            # A whole pass is done, the next run starts over.
+            if os.path.exists(checkpoint):
+                os.unlink(checkpoint)
+            return
+        # NOTE: Write then rename, so that an interrupted run never leaves
+        # a truncated checkpoint behind.
+        tmp = checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            jsonutils.dump({'table': tablename, 'marker': marker}, f)
+        os.rename(tmp, checkpoint)
+
+    def _archive_deleted_rows_online(self, ctxt, max_rows, batch_size,
+                                     rows_per_second, checkpoint):
+        tablenames = db.archive_table_names()
+        resume_table, marker = self._load_archive_checkpoint(checkpoint)
+        if resume_table in tablenames:
+            tablenames = tablenames[tablenames.index(resume_table):]
+        else:
+            marker = None
+
+        rows_archived = 0
+        for tablename in tablenames:
+            table_rows = 0
+            while True:
+                limit = batch_size
+                if max_rows is not None:
+                    limit = min(limit, max_rows - rows_archived)
+                    if limit <= 0:
+                        self._save_archive_checkpoint(checkpoint, tablename,
+                                                      marker)
+                        return rows_archived
+                start = time.time()
+                count, marker = db.archive_deleted_rows_batch(
+                    ctxt, tablename, limit, marker=marker)
+                rows_archived += count
+                table_rows += count
+                self._save_archive_checkpoint(checkpoint, tablename, marker)
+                if rows_per_second and count:
+                    time.sleep(max(0, count / rows_per_second -
+                                      (time.time() - start)))
+                if count < limit:
+                    break
+            if table_rows:
+                print(_('Archived %(rows)d rows from table %(table)s') %
+                      {'rows': table_rows, 'table': tablename})
+            marker = None
+        self._save_archive_checkpoint(checkpoint, None, None)
+        return rows_archived
 
     @args('--delete', action='store_true', dest='delete',
           help='If specified, automatically delete any records found where '
@@ -2091,7 +2091,8 @@ class ComputeManager(manager.Manager):
         context = context.elevated()
         instances = objects.InstanceList.get_by_host(context, self.host,
                                                      expected_attrs=[],
-                                                     use_slave=True)
+                                                     use_slave=True,
+                                                     expected_fields=[])
         uuids = [instance.uuid for instance in instances]
         self.scheduler_client.sync_instance_info(context, self.host, uuids)
 
@@ -5601,7 +5602,8 @@ class ComputeManager(manager.Manager):
             # The list of instances to heal is empty so rebuild it
             LOG.debug('Rebuilding the list of instances to heal')
             db_instances = objects.InstanceList.get_by_host(
-                context, self.host, expected_attrs=[], use_slave=True)
+                context, self.host, expected_attrs=[], use_slave=True,
+                expected_fields=['host', 'task_state', 'vm_state'])
             for inst in db_instances:
                 # We don't want to refresh the cache for instances
                 # which are building or deleting so don't put them
@@ -5678,7 +5680,8 @@ class ComputeManager(manager.Manager):
                         task_states.REBOOT_PENDING],
                        'host': self.host}
             rebooting = objects.InstanceList.get_by_filters(
-                context, filters, expected_attrs=[], use_slave=True)
+                context, filters, expected_attrs=[], use_slave=True,
+                expected_fields=['host', 'task_state', 'updated_at'])
 
             to_poll = []
             for instance in rebooting:
@@ -6273,17 +6276,19 @@ class ComputeManager(manager.Manager):
             context, filters,
             expected_attrs=objects.instance.INSTANCE_DEFAULT_FIELDS,
             use_slave=True)
+        instances = [instance for instance in instances
+                     if self._deleted_old_enough(instance, interval)]
+        bdms_by_uuid = objects.BlockDeviceMappingList.bdms_by_instance_uuid(
+                context, [instance.uuid for instance in instances])
         for instance in instances:
-            if self._deleted_old_enough(instance, interval):
-                bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
-                        context, instance.uuid)
-                LOG.info(_LI('Reclaiming deleted instance'), instance=instance)
-                try:
-                    self._delete_instance(context, instance, bdms, quotas)
-                except Exception as e:
-                    LOG.warning(_LW("Periodic reclaim failed to delete "
-                                    "instance: %s"),
-                                e, instance=instance)
+            bdms = bdms_by_uuid[instance.uuid]
+            LOG.info(_LI('Reclaiming deleted instance'), instance=instance)
+            try:
+                self._delete_instance(context, instance, bdms, quotas)
+            except Exception as e:
+                LOG.warning(_LW("Periodic reclaim failed to delete "
+                                "instance: %s"),
+                            e, instance=instance)
 
     @periodic_task.periodic_task(spacing=CONF.update_resources_interval)
     def update_available_resource(self, context):
@@ -6568,21 +6573,26 @@ class ComputeManager(manager.Manager):
                 context, filters, expected_attrs=attrs, use_slave=True)
         LOG.debug('There are %d instances to clean', len(instances))
 
-        for instance in instances:
-            attempts = int(instance.system_metadata.get('clean_attempts', '0'))
-            LOG.debug('Instance has had %(attempts)s of %(max)s '
-                      'cleanup attempts',
-                      {'attempts': attempts,
-                       'max': CONF.maximum_instance_delete_attempts},
-                      instance=instance)
-            if attempts < CONF.maximum_instance_delete_attempts:
-                success = self.driver.delete_instance_files(instance)
+        # The instances are saved at once at the end
+        with utils.temporary_mutation(context, read_deleted='yes'):
+            with obj_base.batched_saves():
+                for instance in instances:
+                    self._clean_deleted_instance_files(instance)
+
+    def _clean_deleted_instance_files(self, instance):
+        attempts = int(instance.system_metadata.get('clean_attempts', '0'))
+        LOG.debug('Instance has had %(attempts)s of %(max)s '
+                  'cleanup attempts',
+                  {'attempts': attempts,
+                   'max': CONF.maximum_instance_delete_attempts},
+                  instance=instance)
+        if attempts < CONF.maximum_instance_delete_attempts:
+            success = self.driver.delete_instance_files(instance)
 
-                instance.system_metadata['clean_attempts'] = str(attempts + 1)
-                if success:
-                    instance.cleaned = True
-                with utils.temporary_mutation(context, read_deleted='yes'):
-                    instance.save()
+            instance.system_metadata['clean_attempts'] = str(attempts + 1)
+            if success:
+                instance.cleaned = True
+            instance.save()
 
     @messaging.expected_exceptions(exception.InstanceQuiesceNotSupported,
                                    exception.NovaException,
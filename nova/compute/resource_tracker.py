@@ -55,6 +55,15 @@ resource_tracker_opts = [
     cfg.ListOpt('compute_resources',
                 default=['vcpu'],
                 help='The names of the extra resources to track.'),
+    cfg.IntOpt('resource_tracker_full_audit_interval',
+               default=1,
+               help='Number of runs of the update_available_resource '
+                    'periodic task between two full audits of the resources '
+                    'used by the instances, migrations and orphans of the '
+                    'node. In between, the usage tracked by the claims is '
+                    'reported along with the latest view of the hypervisor, '
+                    'which avoids loading all the instances of the node. '
+                    'A value of 1 audits the usage at each run.'),
 ]
 
 CONF = cfg.CONF
@@ -63,7 +72,12 @@ CONF.register_opts(resource_tracker_opts)
 LOG = logging.getLogger(__name__)
 COMPUTE_RESOURCE_SEMAPHORE = "compute_resources"
 
+# The usage which the scheduler claims in the database when placing instances
+USAGE_KEYS = ('vcpus_used', 'memory_mb_used', 'free_ram_mb', 'local_gb_used',
+              'free_disk_gb')
+
 CONF.import_opt('my_ip', 'nova.netconf')
+CONF.import_opt('scheduler_claim_resources', 'nova.scheduler.filter_scheduler')
 
 
 class ResourceTracker(object):
@@ -87,6 +101,7 @@ class ResourceTracker(object):
         self.ext_resources_handler = \
             ext_resources.ResourceHandler(CONF.compute_resources)
         self.old_resources = {}
+        self.audit_cycle = 0
         self.scheduler_client = scheduler_client.SchedulerClient()
 
     @utils.synchronized(COMPUTE_RESOURCE_SEMAPHORE)
@@ -380,6 +395,7 @@ class ResourceTracker(object):
             LOG.info(_LI("Virt driver does not support "
                  "'get_available_resource'. Compute tracking is disabled."))
             self.compute_node = None
+            self.audit_cycle = 0
             return
         resources['host_ip'] = CONF.my_ip
 
@@ -429,6 +445,49 @@ class ResourceTracker(object):
                                                              node_id=n_id)
             self.pci_tracker.set_hvdevs(devs)
 
+        if self._needs_full_audit():
+            self._audit_usage(context, resources)
+        else:
+            self._update_usage_from_tracked(resources)
+
+        self._report_final_resource_view(resources)
+
+        metrics = self._get_host_metrics(context, self.nodename)
+        resources['metrics'] = jsonutils.dumps(metrics)
+
+        # TODO(sbauza): Juno compute nodes are missing the host field and
+        # the Juno ResourceTracker does not set this field, even if
+        # the ComputeNode object can show it.
+        # Unfortunately, as we're not yet using ComputeNode.save(), we need
+        # to add this field in the resources dict until the RT is using
+        # the ComputeNode.save() method for populating the table.
+        # tl;dr: To be removed once RT is using ComputeNode.save()
+        resources['host'] = self.host
+
+        if CONF.scheduler_claim_resources:
+            # The claims of the scheduler add to the usage of the node in the
+            # database, so the usage is always written here, which releases
+            # the resources claimed for instances which never came to this
+            # node
+            for key in USAGE_KEYS:
+                self.old_resources.pop(key, None)
+        self._update(context, resources)
+        LOG.info(_LI('Compute_service record updated for %(host)s:%(node)s'),
+                     {'host': self.host, 'node': self.nodename})
+
+    def _needs_full_audit(self):
+        """Returns True if the usage of the node must be computed again from
+        its instances and migrations at this run of the periodic task.
+        """
+        interval = max(CONF.resource_tracker_full_audit_interval, 1)
+        full_audit = self.audit_cycle % interval == 0
+        self.audit_cycle += 1
+        return full_audit
+
+    def _audit_usage(self, context, resources):
+        """Computes the usage of the node from its instances, in-progress
+        migrations and orphaned instances.
+        """
         # Grab all instances assigned to this node:
         instances = objects.InstanceList.get_by_host_and_node(
             context, self.host, self.nodename,
@@ -459,23 +518,21 @@ class ResourceTracker(object):
         else:
             resources['pci_device_pools'] = []
 
-        self._report_final_resource_view(resources)
-
-        metrics = self._get_host_metrics(context, self.nodename)
-        resources['metrics'] = jsonutils.dumps(metrics)
-
-        # TODO(sbauza): Juno compute nodes are missing the host field and
-        # the Juno ResourceTracker does not set this field, even if
-        # the ComputeNode object can show it.
-        # Unfortunately, as we're not yet using ComputeNode.save(), we need
-        # to add this field in the resources dict until the RT is using
-        # the ComputeNode.save() method for populating the table.
-        # tl;dr: To be removed once RT is using ComputeNode.save()
-        resources['host'] = self.host
-
-        self._update(context, resources)
-        LOG.info(_LI('Compute_service record updated for %(host)s:%(node)s'),
-                     {'host': self.host, 'node': self.nodename})
+    def _update_usage_from_tracked(self, resources):
+        """Reports the usage tracked by the claims since the last audit
+        along with the latest view of the hypervisor.
+        """
+        for key in ('memory_mb_used', 'local_gb_used', 'running_vms',
+                    'current_workload', 'numa_topology'):
+            resources[key] = self.compute_node[key]
+        resources['free_ram_mb'] = (resources['memory_mb'] -
+                                    resources['memory_mb_used'])
+        resources['free_disk_gb'] = (resources['local_gb'] -
+                                     resources['local_gb_used'])
+        if self.pci_tracker:
+            resources['pci_device_pools'] = self.pci_tracker.stats
+        else:
+            resources['pci_device_pools'] = []
 
     def _get_compute_node(self, context):
         """Returns compute node for the host and nodename."""
@@ -589,6 +646,7 @@ class ResourceTracker(object):
         # so this can be removed when using ComputeNode.
         values['stats'] = jsonutils.dumps(values['stats'])
 
+        old_resources = self.old_resources
         if not self._resource_change(values):
             return
         if "service" in self.compute_node:
@@ -596,8 +654,12 @@ class ResourceTracker(object):
         # NOTE(sbauza): Now the DB update is asynchronous, we need to locally
         #               update the values
         self.compute_node.update(values)
-        # Persist the stats to the Scheduler
-        self._update_resource_stats(context, values)
+        # Persist the stats to the Scheduler, only sending the values which
+        # changed since the previous update
+        changes = {key: value for key, value in values.iteritems()
+                   if key not in old_resources or
+                   old_resources[key] != value}
+        self._update_resource_stats(context, changes)
         if self.pci_tracker:
             self.pci_tracker.save(context)
 
@@ -16,7 +16,9 @@
 
 import copy
 import itertools
+import sys
 
+from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_serialization import jsonutils
@@ -33,6 +35,7 @@ from nova.compute import task_states
 from nova.compute import utils as compute_utils
 from nova.compute import vm_states
 from nova.conductor.tasks import live_migrate
+from nova import context as nova_context
 from nova.db import base
 from nova import exception
 from nova.i18n import _, _LE, _LW
@@ -43,12 +46,18 @@ from nova.network.security_group import openstack_driver
 from nova import notifications
 from nova import objects
 from nova.objects import base as nova_object
+from nova.openstack.common import periodic_task
 from nova import quota
+from nova import rpc
 from nova.scheduler import client as scheduler_client
 from nova.scheduler import utils as scheduler_utils
 
 LOG = logging.getLogger(__name__)
 
+CONF = cfg.CONF
+CONF.import_opt('instance_event_write_buffer_size', 'nova.db.api')
+CONF.import_opt('instance_event_write_buffer_interval', 'nova.db.api')
+
 # Instead of having a huge list of arguments to instance_update(), we just
 # accept a dict of fields to update and use this whitelist to validate it.
 allowed_updates = ['task_state', 'vm_state', 'expected_task_state',
@@ -78,7 +87,7 @@ class ConductorManager(manager.Manager):
     namespace.  See the ComputeTaskManager class for details.
     """
 
-    target = messaging.Target(version='2.1')
+    target = messaging.Target(version='2.2')
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
@@ -91,6 +100,17 @@ class ConductorManager(manager.Manager):
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
         self.additional_endpoints.append(self.compute_task_mgr)
 
+    def cleanup_host(self):
+        if CONF.instance_event_write_buffer_size:
+            self.db.instance_event_writes_flush(
+                nova_context.get_admin_context())
+
+    @periodic_task.periodic_task(
+        spacing=CONF.instance_event_write_buffer_interval)
+    def _flush_instance_event_writes(self, context):
+        if CONF.instance_event_write_buffer_size:
+            self.db.instance_event_writes_flush(context)
+
     @property
     def network_api(self):
         # NOTE(danms): We need to instantiate our network_api on first use
@@ -470,6 +490,32 @@ class ConductorManager(manager.Manager):
         updates['obj_what_changed'] = objinst.obj_what_changed()
         return updates, result
 
+    def object_actions(self, context, actions):
+        """Perform actions on objects, in order.
+
+        An action is performed even if the previous ones failed. The result
+        of a failed action is its exception, as serialized by
+        rpc.serialize_remote_exception().
+        """
+        results = []
+        for objinst, objmethod, args, kwargs in actions:
+            try:
+                results.append(self.object_action(
+                    context, objinst=objinst, objmethod=objmethod, args=args,
+                    kwargs=kwargs))
+            except Exception as e:
+                LOG.debug("Action %(method)s failed on %(obj)s",
+                          {'method': objmethod, 'obj': objinst.obj_name()},
+                          exc_info=True)
+                # Like the RPC dispatcher, return the error which the
+                # action raised rather than its ExpectedException
+                exc_info = (e.exc_info
+                            if isinstance(e, messaging.ExpectedException)
+                            else sys.exc_info())
+                results.append(rpc.serialize_remote_exception(
+                    exc_info, log_failure=False))
+        return results
+
     def object_backport(self, context, objinst, target_version):
         return objinst.obj_to_primitive(target_version=target_version)
 
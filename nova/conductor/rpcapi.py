@@ -15,6 +15,8 @@
 
 """Client side of the conductor RPC API."""
 
+import sys
+
 from oslo_config import cfg
 import oslo_messaging as messaging
 from oslo_serialization import jsonutils
@@ -178,6 +180,7 @@ class ConductorAPI(object):
     * Remove compute_node_delete()
     * Remove security_groups_trigger_handler()
 
+    * 2.2  - Added object_actions()
     """
 
     VERSION_ALIASES = {
@@ -265,6 +268,21 @@ class ConductorAPI(object):
         return cctxt.call(context, 'object_action', objinst=objinst,
                           objmethod=objmethod, args=args, kwargs=kwargs)
 
+    def object_actions(self, context, actions):
+        if not self.client.can_send_version('2.2'):
+            results = []
+            for objinst, objmethod, args, kwargs in actions:
+                try:
+                    results.append(self.object_action(
+                        context, objinst, objmethod, args, kwargs))
+                except Exception:
+                    # Like the conductor, return the error of the action
+                    results.append(rpc.serialize_remote_exception(
+                        sys.exc_info(), log_failure=False))
+            return results
+        cctxt = self.client.prepare(version='2.2')
+        return cctxt.call(context, 'object_actions', actions=actions)
+
     def object_backport(self, context, objinst, target_version):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'object_backport', objinst=objinst,
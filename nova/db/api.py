@@ -45,6 +45,20 @@ db_opts = [
     cfg.StrOpt('snapshot_name_template',
                default='snapshot-%s',
                help='Template string to be used to generate snapshot names'),
+    cfg.IntOpt('instance_event_write_buffer_size',
+               default=0,
+               help='Number of instance faults and instance action events '
+                    'to buffer before writing them to the database in bulk. '
+                    'Buffered faults are only visible to the process which '
+                    'buffered them until they are written, and up to 10 '
+                    'times this number of them are kept while the database '
+                    'cannot be reached. Meant for nova-conductor; 0 writes '
+                    'each of them at once.'),
+    cfg.IntOpt('instance_event_write_buffer_interval',
+               default=5,
+               help='Maximum number of seconds the instance faults and '
+                    'instance action events stay buffered, when '
+                    'instance_event_write_buffer_size is set.'),
 ]
 
 CONF = cfg.CONF
@@ -209,6 +223,18 @@ def compute_node_get_all(context):
     return IMPL.compute_node_get_all(context)
 
 
+def compute_node_get_all_changed_since(context, changes_since):
+    """Get computeNodes which were created, updated or deleted since a time.
+
+    :param context: The security context
+    :param changes_since: datetime from which changes are returned
+
+    :returns: List of dictionaries each containing compute node properties,
+              including the soft-deleted nodes
+    """
+    return IMPL.compute_node_get_all_changed_since(context, changes_since)
+
+
 def compute_node_get_all_by_host(context, host, use_slave=False):
     """Get compute nodes by host name
 
@@ -259,6 +285,24 @@ def compute_node_update(context, compute_id, values):
     return IMPL.compute_node_update(context, compute_id, values)
 
 
+def compute_node_claim_resources(context, compute_id, generation, vcpus,
+                                 memory_mb, local_gb):
+    """Consume resources on a compute node if it didn't change meanwhile.
+
+    :param context: The security context
+    :param compute_id: ID of the compute node
+    :param generation: Generation of the compute node when it was read
+    :param vcpus: Number of VCPUs to consume
+    :param memory_mb: Amount of RAM to consume, in MB
+    :param local_gb: Amount of disk to consume, in GB
+
+    :returns: True if the resources were consumed, False if the compute node
+              was updated or deleted since it was read
+    """
+    return IMPL.compute_node_claim_resources(context, compute_id, generation,
+                                             vcpus, memory_mb, local_gb)
+
+
 def compute_node_delete(context, compute_id):
     """Delete a compute node from the database.
 
@@ -664,8 +708,12 @@ def instance_get_all(context, columns_to_join=None):
 
 def instance_get_all_by_filters(context, filters, sort_key='created_at',
                                 sort_dir='desc', limit=None, marker=None,
-                                columns_to_join=None, use_slave=False):
-    """Get all instances that match all filters."""
+                                columns_to_join=None, use_slave=False,
+                                columns=None):
+    """Get all instances that match all filters.
+
+    If columns is given, only those instance columns are loaded.
+    """
     # Note: This function exists for backwards compatibility since calls to
     # the instance layer coming in over RPC may specify the single sort
     # key/direction values; in this case, this function is invoked instead
@@ -674,21 +722,23 @@ def instance_get_all_by_filters(context, filters, sort_key='created_at',
                                             sort_dir, limit=limit,
                                             marker=marker,
                                             columns_to_join=columns_to_join,
-                                            use_slave=use_slave)
+                                            use_slave=use_slave,
+                                            columns=columns)
 
 
 def instance_get_all_by_filters_sort(context, filters, limit=None,
                                      marker=None, columns_to_join=None,
                                      use_slave=False, sort_keys=None,
-                                     sort_dirs=None):
+                                     sort_dirs=None, columns=None):
     """Get all instances that match all filters sorted by multiple keys.
 
-    sort_keys and sort_dirs must be a list of strings.
+    sort_keys and sort_dirs must be a list of strings. If columns is given,
+    only those instance columns are loaded.
     """
     return IMPL.instance_get_all_by_filters_sort(
         context, filters, limit=limit, marker=marker,
         columns_to_join=columns_to_join, use_slave=use_slave,
-        sort_keys=sort_keys, sort_dirs=sort_dirs)
+        sort_keys=sort_keys, sort_dirs=sort_dirs, columns=columns)
 
 
 def instance_get_active_by_window_joined(context, begin, end=None,
@@ -707,11 +757,24 @@ def instance_get_active_by_window_joined(context, begin, end=None,
 
 
 def instance_get_all_by_host(context, host,
-                             columns_to_join=None, use_slave=False):
-    """Get all instances belonging to a host."""
+                             columns_to_join=None, use_slave=False,
+                             columns=None):
+    """Get all instances belonging to a host.
+
+    If columns is given, only those instance columns are loaded.
+    """
     return IMPL.instance_get_all_by_host(context, host,
                                          columns_to_join,
-                                         use_slave=use_slave)
+                                         use_slave=use_slave,
+                                         columns=columns)
+
+
+def instance_get_all_by_hosts(context, hosts, columns_to_join=None,
+                              use_slave=False):
+    """Get all instances belonging to any of the given hosts."""
+    return IMPL.instance_get_all_by_hosts(context, hosts,
+                                          columns_to_join,
+                                          use_slave=use_slave)
 
 
 def instance_get_all_by_host_and_node(context, host, node,
@@ -1158,6 +1221,29 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
                                      user_id=user_id)
 
 
+def quota_reserve_optimistic(context, resources, quotas, user_quotas, deltas,
+                             expire, until_refresh, max_age, project_id=None,
+                             user_id=None):
+    """Check quotas and create appropriate reservations, without locking
+    the quota usages of the project.
+    """
+    return IMPL.quota_reserve_optimistic(context, resources, quotas,
+                                         user_quotas, deltas, expire,
+                                         until_refresh, max_age,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+
+def reservation_commit_optimistic(context, reservations):
+    """Commit quota reservations, without locking the quota usages."""
+    return IMPL.reservation_commit_optimistic(context, reservations)
+
+
+def reservation_rollback_optimistic(context, reservations):
+    """Roll back quota reservations, without locking the quota usages."""
+    return IMPL.reservation_rollback_optimistic(context, reservations)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     """Destroy all quotas associated with a given project and user."""
     return IMPL.quota_destroy_all_by_project_and_user(context,
@@ -1230,6 +1316,13 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                                                          use_slave)
 
 
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    """Get all block device mapping belonging to a list of instances."""
+    return IMPL.block_device_mapping_get_all_by_instance_uuids(
+        context, instance_uuids, use_slave)
+
+
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
     """Get block device mapping for a given volume."""
@@ -1816,6 +1909,11 @@ def instance_fault_get_by_instance_uuids(context, instance_uuids):
     return IMPL.instance_fault_get_by_instance_uuids(context, instance_uuids)
 
 
+def instance_event_writes_flush(context):
+    """Write the buffered instance faults and action events."""
+    return IMPL.instance_event_writes_flush(context)
+
+
 ####################
 
 
@@ -1946,6 +2044,22 @@ def archive_deleted_rows_for_table(context, tablename, max_rows=None):
                                                max_rows=max_rows)
 
 
+def archive_deleted_rows_batch(context, tablename, max_rows, marker=None):
+    """Move up to max_rows rows of tablename whose key sorts after marker
+    to corresponding shadow table.
+
+    :returns: a (rows_archived, marker) tuple, marker being the key to
+              resume the archiving of the table from.
+    """
+    return IMPL.archive_deleted_rows_batch(context, tablename, max_rows,
+                                           marker=marker)
+
+
+def archive_table_names():
+    """Return the names of the tables to archive, dependent tables first."""
+    return IMPL.archive_table_names()
+
+
 def migrate_flavor_data(context, max_count, flavor_cache, force=False):
     """Migrate instance flavor data from system_metadata to instance_extra.
 
@@ -23,9 +23,11 @@ import datetime
 import functools
 import sys
 import threading
+import time
 import uuid
 
 from oslo_config import cfg
+from oslo_context import context as common_context
 from oslo_db import api as oslo_db_api
 from oslo_db import exception as db_exc
 from oslo_db import options as oslo_db_options
@@ -38,6 +40,7 @@ from oslo_utils import uuidutils
 import six
 from sqlalchemy import and_
 from sqlalchemy import Boolean
+from sqlalchemy import event
 from sqlalchemy.exc import NoSuchTableError
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
@@ -46,6 +49,7 @@ from sqlalchemy.orm import aliased
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
+from sqlalchemy.orm import load_only
 from sqlalchemy.orm import noload
 from sqlalchemy.orm import undefer
 from sqlalchemy.schema import Table
@@ -73,6 +77,18 @@ db_opts = [
                help='When set, compute API will consider duplicate hostnames '
                     'invalid within the specified scope, regardless of case. '
                     'Should be empty, "project" or "global".'),
+    cfg.BoolOpt('use_slave_for_reads',
+                default=False,
+                help='Send the read-only database calls which tolerate '
+                     'slightly stale data, such as the listings made by the '
+                     'API, the scheduler and the periodic tasks, to the slave '
+                     'database set by [database]slave_connection.'),
+    cfg.IntOpt('slave_read_after_write_delay',
+               default=10,
+               help='Number of seconds after a request wrote to the main '
+                    'database during which its reads still go to the main '
+                    'database, so that it reads its own writes. This should '
+                    'exceed the replication lag of the slave database.'),
 ]
 
 api_db_opts = [
@@ -128,6 +144,9 @@ CONF.register_opts(db_opts)
 CONF.register_opts(oslo_db_options.database_opts, 'database')
 CONF.register_opts(api_db_opts, group='api_database')
 CONF.import_opt('compute_topic', 'nova.compute.rpcapi')
+CONF.import_opt('scheduler_claim_resources', 'nova.scheduler.filter_scheduler')
+CONF.import_opt('instance_event_write_buffer_size', 'nova.db.api')
+CONF.import_opt('instance_event_write_buffer_interval', 'nova.db.api')
 
 LOG = logging.getLogger(__name__)
 
@@ -140,7 +159,7 @@ _LOCK = threading.Lock()
 def _create_facade(conf_group):
 
     # NOTE(dheeraj): This fragment is copied from oslo.db
-    return db_session.EngineFacade(
+    facade = db_session.EngineFacade(
         sql_connection=conf_group.connection,
         slave_connection=conf_group.slave_connection,
         sqlite_fk=False,
@@ -156,6 +175,9 @@ def _create_facade(conf_group):
         connection_trace=conf_group.connection_trace,
         max_retries=conf_group.max_retries,
         retry_interval=conf_group.retry_interval)
+    # Only the main engine, the slave one never sees the writes.
+    event.listen(facade.get_engine(), 'after_cursor_execute', _record_write)
+    return facade
 
 
 def _create_facade_lazily(facade, conf_group):
@@ -180,6 +202,7 @@ def get_api_engine():
 
 
 def get_session(use_slave=False, **kwargs):
+    use_slave = use_slave or getattr(_SLAVE_READ, 'enabled', False)
     conf_group = CONF.database
     facade = _create_facade_lazily(_MAIN_FACADE, conf_group)
     return facade.get_session(use_slave=use_slave, **kwargs)
@@ -233,6 +256,60 @@ def require_context(f):
     return wrapper
 
 
+# The request ids which wrote to the main database, by time of their last
+# write, oldest first.
+_RECENT_WRITES = collections.OrderedDict()
+_SLAVE_READ = threading.local()
+
+
+def _record_write(conn, cursor, statement, parameters, context, executemany):
+    if not CONF.use_slave_for_reads or \
+            statement.lstrip()[:6].upper() == 'SELECT':
+        return
+    request_id = getattr(common_context.get_current(), 'request_id', None)
+    if request_id is None:
+        return
+    now = time.time()
+    _RECENT_WRITES.pop(request_id, None)
+    _RECENT_WRITES[request_id] = now
+    expired = now - CONF.slave_read_after_write_delay
+    while next(six.itervalues(_RECENT_WRITES)) < expired:
+        _RECENT_WRITES.popitem(last=False)
+
+
+def _wrote_recently(context):
+    written = _RECENT_WRITES.get(getattr(context, 'request_id', None))
+    return (written is not None and
+            time.time() - written < CONF.slave_read_after_write_delay)
+
+
+def allow_slave_read(f):
+    """Decorator to let a read-only DB API call use the slave database.
+
+    With use_slave_for_reads set, the sessions created by the call use the
+    slave database, unless the request of the context wrote to the main
+    database within the last slave_read_after_write_delay seconds.  Only
+    decorate the calls whose callers tolerate data as stale as the
+    replication lag.
+
+    The first argument to the wrapped function must be the context.
+
+    """
+
+    @functools.wraps(f)
+    def wrapper(context, *args, **kwargs):
+        if (not CONF.use_slave_for_reads or
+                getattr(_SLAVE_READ, 'enabled', False) or
+                _wrote_recently(context)):
+            return f(context, *args, **kwargs)
+        _SLAVE_READ.enabled = True
+        try:
+            return f(context, *args, **kwargs)
+        finally:
+            _SLAVE_READ.enabled = False
+    return wrapper
+
+
 def require_instance_exists_using_uuid(f):
     """Decorator to require the specified instance to exist.
 
@@ -598,6 +675,16 @@ def compute_node_get_all(context):
     return model_query(context, models.ComputeNode, read_deleted='no').all()
 
 
+@require_admin_context
+def compute_node_get_all_changed_since(context, changes_since):
+    """Get compute nodes created, updated or deleted since a timestamp."""
+    return model_query(context, models.ComputeNode, read_deleted='yes').\
+            filter(or_(models.ComputeNode.created_at >= changes_since,
+                       models.ComputeNode.updated_at >= changes_since,
+                       models.ComputeNode.deleted_at >= changes_since)).\
+            all()
+
+
 @require_admin_context
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
@@ -635,11 +722,38 @@ def compute_node_update(context, compute_id, values):
         values['updated_at'] = timeutils.utcnow()
         datetime_keys = ('created_at', 'deleted_at', 'updated_at')
         convert_objects_related_datetimes(values, *datetime_keys)
+        if CONF.scheduler_claim_resources:
+            # Incremented in SQL, so that the claims of the scheduler based
+            # on the previous generation fail
+            values['generation'] = func.coalesce(
+                models.ComputeNode.generation, 0) + 1
         compute_ref.update(values)
+        if CONF.scheduler_claim_resources:
+            session.flush()
+            session.refresh(compute_ref)
 
     return compute_ref
 
 
+@require_admin_context
+def compute_node_claim_resources(context, compute_id, generation, vcpus,
+                                 memory_mb, local_gb):
+    compute_node = models.ComputeNode
+    values = {
+        'vcpus_used': compute_node.vcpus_used + vcpus,
+        'memory_mb_used': compute_node.memory_mb_used + memory_mb,
+        'free_ram_mb': compute_node.free_ram_mb - memory_mb,
+        'local_gb_used': compute_node.local_gb_used + local_gb,
+        'free_disk_gb': compute_node.free_disk_gb - local_gb,
+        'generation': compute_node.generation + 1,
+        'updated_at': timeutils.utcnow(),
+    }
+    result = model_query(context, compute_node, read_deleted='no').\
+             filter_by(id=compute_id, generation=generation).\
+             update(values, synchronize_session=False)
+    return result == 1
+
+
 @require_admin_context
 def compute_node_delete(context, compute_id):
     """Delete a ComputeNode record."""
@@ -1776,7 +1890,8 @@ def _build_instance_get(context, session=None,
 
 
 def _instances_fill_metadata(context, instances,
-                             manual_joins=None, use_slave=False):
+                             manual_joins=None, use_slave=False,
+                             projected=False):
     """Selectively fill instances with manually-joined metadata. Note that
     instance will be converted to a dict.
 
@@ -1785,6 +1900,10 @@ def _instances_fill_metadata(context, instances,
     :param manual_joins: list of tables to manually join (can be any
                          combination of 'metadata' and 'system_metadata' or
                          None to take the default of both)
+    :param projected: whether the instances were queried with only some of
+                      their columns, in which case the dicts just hold the
+                      loaded attributes, so that the others are not loaded
+                      one instance at a time
     """
     uuids = [inst['uuid'] for inst in instances]
 
@@ -1810,7 +1929,11 @@ def _instances_fill_metadata(context, instances,
 
     filled_instances = []
     for inst in instances:
-        inst = dict(inst.iteritems())
+        if projected:
+            inst = {key: value for key, value in six.iteritems(inst.__dict__)
+                    if not key.startswith('_')}
+        else:
+            inst = dict(inst.iteritems())
         inst['system_metadata'] = sys_meta[inst['uuid']]
         inst['metadata'] = meta[inst['uuid']]
         if 'pci_devices' in manual_joins:
@@ -1820,6 +1943,29 @@ def _instances_fill_metadata(context, instances,
     return filled_instances
 
 
+def _instance_load_only(query, columns):
+    """Load only the given columns of the instances of a query.
+
+    The id and uuid columns are always loaded, as the instances are keyed
+    by them.
+
+    :param query: the query of the instances
+    :param columns: the names of the instance columns to load, or None to
+                    load all of them
+    :return: the query and whether it was projected
+    """
+    if columns is None:
+        return query, False
+    table_columns = models.Instance.__table__.columns
+    columns = set(columns) | set(['id', 'uuid'])
+    unknown = [column for column in columns if column not in table_columns]
+    if unknown:
+        raise exception.InvalidInput(
+            reason=_('Unknown instance columns: %s') %
+                   ', '.join(sorted(unknown)))
+    return query.options(load_only(*sorted(columns))), True
+
+
 def _manual_join_columns(columns_to_join):
     """Separate manually joined columns from columns_to_join
 
@@ -1867,7 +2013,7 @@ def instance_get_all(context, columns_to_join=None):
 @require_context
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                 limit=None, marker=None, columns_to_join=None,
-                                use_slave=False):
+                                use_slave=False, columns=None):
     """Return instances matching all filters sorted by the primary key.
 
     See instance_get_all_by_filters_sort for more information.
@@ -1879,17 +2025,23 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                             columns_to_join=columns_to_join,
                                             use_slave=use_slave,
                                             sort_keys=[sort_key],
-                                            sort_dirs=[sort_dir])
+                                            sort_dirs=[sort_dir],
+                                            columns=columns)
 
 
 @require_context
 def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
                                      columns_to_join=None, use_slave=False,
-                                     sort_keys=None, sort_dirs=None):
+                                     sort_keys=None, sort_dirs=None,
+                                     columns=None):
     """Return instances that match all filters sorted the the given keys.
     Deleted instances will be returned by default, unless there's a filter that
     says otherwise.
 
+    When columns is given, only those columns of the instances are loaded,
+    along with id and uuid, and the dicts returned only have those keys
+    besides the joined ones.
+
     Depending on the name of a filter, matching for that filter is
     performed using either exact matching or as regular expression
     matching. Exact matching is applied for the following filters::
@@ -1964,6 +2116,7 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
             query_prefix = query_prefix.options(undefer(column))
         else:
             query_prefix = query_prefix.options(joinedload(column))
+    query_prefix, projected = _instance_load_only(query_prefix, columns)
 
     # Note: order_by is done in the sqlalchemy.utils.py paginate_query(),
     # no need to do it here as well
@@ -2054,16 +2207,14 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
 
     # paginate query
     if marker is not None:
-        try:
-            if deleted:
-                marker = _instance_get_by_uuid(
-                    context.elevated(read_deleted='yes'), marker,
-                    session=session)
-            else:
-                marker = _instance_get_by_uuid(context,
-                                               marker, session=session)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
+        if deleted:
+            marker_context = context.elevated(read_deleted='yes')
+        else:
+            marker_context = context
+        marker = _instance_get_sort_values(marker_context, marker,
+                                           sort_keys, session=session)
+        query_prefix = _instance_seek_filter(query_prefix, marker,
+                                             sort_keys, sort_dirs)
     try:
         query_prefix = sqlalchemyutils.paginate_query(query_prefix,
                                models.Instance, limit,
@@ -2073,7 +2224,49 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     except db_exc.InvalidSortKey:
         raise exception.InvalidSortKey()
 
-    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+    return _instances_fill_metadata(context, query_prefix.all(), manual_joins,
+                                    projected=projected)
+
+
+def _instance_get_sort_values(context, uuid, sort_keys, session=None):
+    """Returns the values of the sort keys of the marker instance.
+
+    Only the sort key columns are loaded, as the marker is just used to know
+    where the previous page ended.
+    """
+    columns = []
+    for sort_key in sort_keys:
+        if sort_key not in models.Instance.__table__.columns:
+            raise exception.InvalidSortKey()
+        columns.append(getattr(models.Instance, sort_key))
+    result = model_query(context, models.Instance, args=columns,
+                         session=session, project_only=True).\
+                filter_by(uuid=uuid).\
+                first()
+    if not result:
+        raise exception.MarkerNotFound(uuid)
+    return result
+
+
+def _instance_seek_filter(query, marker, sort_keys, sort_dirs):
+    """Bounds an Instance query by the value of the first sort key of the
+    marker.
+
+    The pagination criteria are an OR of all the sort keys, which does not
+    let the database seek in an index to the end of the previous page. As
+    all the instances after the marker have a first sort key at least equal
+    to the one of the marker, this extra bound allows the range scan of an
+    index starting with that key, such as the (sort key, id) indexes.
+    """
+    value = getattr(marker, sort_keys[0])
+    if value is None:
+        # Nothing compares to NULL, the pagination criteria will filter
+        # out all the instances anyway
+        return query
+    column = getattr(models.Instance, sort_keys[0])
+    if sort_dirs[0] == 'desc':
+        return query.filter(column <= value)
+    return query.filter(column >= value)
 
 
 def _tag_instance_filter(context, query, filters):
@@ -2297,6 +2490,7 @@ def process_sort_params(sort_keys, sort_dirs,
 
 
 @require_context
+@allow_slave_read
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None,
                                          use_slave=False,
@@ -2348,12 +2542,27 @@ def _instance_get_all_query(context, project_only=False,
 
 
 @require_admin_context
+@allow_slave_read
 def instance_get_all_by_host(context, host,
                              columns_to_join=None,
-                             use_slave=False):
+                             use_slave=False, columns=None):
+    query, projected = _instance_load_only(
+        _instance_get_all_query(context, use_slave=use_slave), columns)
+    return _instances_fill_metadata(context,
+                                    query.filter_by(host=host).all(),
+                                    manual_joins=columns_to_join,
+                                    use_slave=use_slave,
+                                    projected=projected)
+
+
+def instance_get_all_by_hosts(context, hosts,
+                              columns_to_join=None,
+                              use_slave=False):
+    if not hosts:
+        return []
     return _instances_fill_metadata(context,
-      _instance_get_all_query(context,
-                              use_slave=use_slave).filter_by(host=host).all(),
+      _instance_get_all_query(context, use_slave=use_slave).filter(
+          models.Instance.host.in_(hosts)).all(),
                               manual_joins=columns_to_join,
                               use_slave=use_slave)
 
@@ -2694,6 +2903,7 @@ def key_pair_get(context, user_id, name):
 
 
 @require_context
+@allow_slave_read
 def key_pair_get_all_by_user(context, user_id):
     nova.context.authorize_user_context(context, user_id)
     return model_query(context, models.KeyPair, read_deleted="no").\
@@ -3312,13 +3522,14 @@ def _reservation_create(uuid, usage, project_id, user_id, resource,
 # on reservations.
 
 def _get_project_user_quota_usages(context, session, project_id,
-                                   user_id):
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-                   filter_by(project_id=project_id).\
-                   with_lockmode('update').\
-                   all()
+                                   user_id, lock=True):
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+                    filter_by(project_id=project_id)
+    if lock:
+        query = query.with_lockmode('update')
+    rows = query.all()
     proj_result = dict()
     user_result = dict()
     # Get the total count of in_use,reserved
@@ -3575,32 +3786,153 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                         "resources: %s"), unders)
 
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
-        else:
-            # NOTE(mriedem): user_usages is a dict of resource keys to
-            # QuotaUsage sqlalchemy dict-like objects and doen't log well
-            # so convert the user_usages values to something useful for
-            # logging. Remove this if we ever change how
-            # _get_project_user_quota_usages returns the user_usages values.
-            user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
-                                   total=v['total'])
-                      for k, v in user_usages.items()}
-            usages = user_usages
-        usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
-                  for k, v in usages.items()}
-        LOG.debug('Raise OverQuota exception because: '
-                  'project_quotas: %(project_quotas)s, '
-                  'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
-                  'overs: %(overs)s, project_usages: %(project_usages)s, '
-                  'user_usages: %(user_usages)s',
-                  {'project_quotas': project_quotas,
-                   'user_quotas': user_quotas,
-                   'overs': overs, 'deltas': deltas,
-                   'project_usages': project_usages,
-                   'user_usages': user_usages})
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages)
+        _raise_over_quota(overs, project_quotas, user_quotas, deltas,
+                          project_usages, user_usages)
+
+    return reservations
+
+
+def _raise_over_quota(overs, project_quotas, user_quotas, deltas,
+                      project_usages, user_usages):
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        # NOTE(mriedem): user_usages is a dict of resource keys to
+        # QuotaUsage sqlalchemy dict-like objects and doen't log well
+        # so convert the user_usages values to something useful for
+        # logging. Remove this if we ever change how
+        # _get_project_user_quota_usages returns the user_usages values.
+        user_usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'],
+                               total=v['total'])
+                  for k, v in user_usages.items()}
+        usages = user_usages
+    usages = {k: dict(in_use=v['in_use'], reserved=v['reserved'])
+              for k, v in usages.items()}
+    LOG.debug('Raise OverQuota exception because: '
+              'project_quotas: %(project_quotas)s, '
+              'user_quotas: %(user_quotas)s, deltas: %(deltas)s, '
+              'overs: %(overs)s, project_usages: %(project_usages)s, '
+              'user_usages: %(user_usages)s',
+              {'project_quotas': project_quotas,
+               'user_quotas': user_quotas,
+               'overs': overs, 'deltas': deltas,
+               'project_usages': project_usages,
+               'user_usages': user_usages})
+    raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                              usages=usages)
+
+
+# NOTE: The optimistic variants below never lock the usages of a project.
+# A reservation updates each usage with a single conditional UPDATE, which
+# only applies while the usage fits the quota, so the concurrent requests of
+# a project only wait on each other for the duration of that UPDATE.  To
+# avoid deadlocks, the usages are always updated in the order of their
+# resource.
+
+def _quota_usage_needs_refresh(quota_usage, max_age):
+    """Like _is_quota_refresh_needed, without counting down until_refresh."""
+    if quota_usage.in_use < 0:
+        return True
+    if quota_usage.until_refresh is not None:
+        return quota_usage.until_refresh <= 1
+    return bool(max_age and (timeutils.utcnow() -
+                             quota_usage.updated_at).seconds >= max_age)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def quota_reserve_optimistic(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=None, user_id=None):
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    return _quota_reserve_optimistic(context, resources, project_quotas,
+                                     user_quotas, deltas, expire,
+                                     until_refresh, max_age, project_id,
+                                     user_id, retry=True)
+
+
+def _quota_reserve_optimistic(context, resources, project_quotas,
+                              user_quotas, deltas, expire, until_refresh,
+                              max_age, project_id, user_id, retry):
+    session = get_session()
+    project_usages, user_usages = _get_project_user_quota_usages(
+            context, session, project_id, user_id, lock=False)
+
+    # Creating or recounting a usage needs the project lock, so the
+    # reservations touching such a usage go through quota_reserve.
+    if any(res not in user_usages or
+           _quota_usage_needs_refresh(user_usages[res], max_age)
+           for res in deltas):
+        return quota_reserve(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=project_id, user_id=user_id)
+
+    overs = _calculate_overquota(project_quotas, user_quotas, deltas,
+                                 project_usages, user_usages)
+    if overs:
+        _raise_over_quota(overs, project_quotas, user_quotas, deltas,
+                          project_usages, user_usages)
+
+    reservations = []
+    with session.begin():
+        for res, delta in sorted(deltas.items()):
+            usage = user_usages[res]
+            values = {}
+            query = model_query(context, models.QuotaUsage,
+                                read_deleted="no", session=session).\
+                            filter_by(id=usage.id)
+            # NOTE(Vek): We are only concerned here about positive
+            #            increments, see quota_reserve.
+            if delta > 0:
+                values['reserved'] = models.QuotaUsage.reserved + delta
+                if user_quotas[res] >= 0:
+                    query = query.filter(models.QuotaUsage.in_use +
+                                         models.QuotaUsage.reserved +
+                                         delta <= user_quotas[res])
+            if usage.until_refresh is not None:
+                values['until_refresh'] = models.QuotaUsage.until_refresh - 1
+            if values and not query.update(values,
+                                           synchronize_session=False):
+                # A concurrent reservation took what was left of the quota
+                # since the usages were read.
+                overs.append(res)
+                continue
+            reservation = _reservation_create(str(uuid.uuid4()), usage,
+                                              project_id, user_id, res,
+                                              delta, expire, session=session)
+            reservations.append(reservation.uuid)
+
+        if overs:
+            _raise_over_quota(overs, project_quotas, user_quotas, deltas,
+                              project_usages, user_usages)
+
+    # The project quota spans the usages of all the users of the project,
+    # which no single UPDATE can check.  Check it now that the reservation
+    # is visible to the concurrent ones: of two reservations racing for the
+    # same room, at least the last one to get here sees both.  Both may see
+    # each other and roll back though, so the first rollback is retried.
+    over_project = [res for res, delta in deltas.items()
+                    if delta > 0 and user_quotas[res] >= 0 and
+                    project_quotas[res] >= 0]
+    if over_project:
+        project_usages, user_usages = _get_project_user_quota_usages(
+                context, get_session(), project_id, user_id, lock=False)
+        over_project = [res for res in over_project
+                        if project_usages[res]['total'] >
+                        project_quotas[res]]
+        if over_project:
+            reservation_rollback_optimistic(context, reservations)
+            if retry:
+                return _quota_reserve_optimistic(
+                    context, resources, project_quotas, user_quotas, deltas,
+                    expire, until_refresh, max_age, project_id, user_id,
+                    retry=False)
+            _raise_over_quota(over_project, project_quotas, user_quotas,
+                              deltas, project_usages, user_usages)
 
     return reservations
 
@@ -3649,6 +3981,49 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
         reservation_query.soft_delete(synchronize_session=False)
 
 
+def _reservations_apply_optimistic(context, reservations, commit):
+    session = get_session()
+    with session.begin():
+        rows = model_query(context, models.Reservation, read_deleted="no",
+                           session=session).\
+                       filter(models.Reservation.uuid.in_(reservations)).\
+                       all()
+        for reservation in sorted(rows, key=lambda r: r.resource):
+            # Claim the reservation first, so that a concurrent commit,
+            # rollback or expiry of the same reservation can't apply it
+            # twice.
+            claimed = model_query(context, models.Reservation,
+                                  read_deleted="no", session=session).\
+                              filter_by(id=reservation.id).\
+                              soft_delete(synchronize_session=False)
+            if not claimed:
+                continue
+            values = {}
+            if reservation.delta >= 0:
+                values['reserved'] = (models.QuotaUsage.reserved -
+                                      reservation.delta)
+            if commit:
+                values['in_use'] = (models.QuotaUsage.in_use +
+                                    reservation.delta)
+            if values:
+                model_query(context, models.QuotaUsage, read_deleted="no",
+                            session=session).\
+                        filter_by(id=reservation.usage_id).\
+                        update(values, synchronize_session=False)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def reservation_commit_optimistic(context, reservations):
+    _reservations_apply_optimistic(context, reservations, commit=True)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+def reservation_rollback_optimistic(context, reservations):
+    _reservations_apply_optimistic(context, reservations, commit=False)
+
+
 @require_admin_context
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     session = get_session()
@@ -3899,6 +4274,17 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                  all()
 
 
+@require_context
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    if not instance_uuids:
+        return []
+    return _block_device_mapping_get_query(context, use_slave=use_slave).\
+                 filter(models.BlockDeviceMapping.instance_uuid.in_(
+                     instance_uuids)).\
+                 all()
+
+
 @require_context
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
@@ -4026,6 +4412,7 @@ def security_group_get_by_name(context, project_id, group_name,
 
 
 @require_context
+@allow_slave_read
 def security_group_get_by_project(context, project_id):
     return _security_group_get_query(context, read_deleted="no").\
                         filter_by(project_id=project_id).\
@@ -4430,6 +4817,7 @@ def migration_get_in_progress_by_host_and_node(context, host, node):
             all()
 
 
+@allow_slave_read
 def migration_get_all_by_filters(context, filters):
     query = model_query(context, models.Migration)
     if "status" in filters:
@@ -4621,6 +5009,7 @@ def _flavor_get_query(context, session=None, read_deleted=None):
 
 
 @require_context
+@allow_slave_read
 def flavor_get_all(context, inactive=False, filters=None,
                    sort_key='flavorid', sort_dir='asc', limit=None,
                    marker=None):
@@ -5079,6 +5468,7 @@ def agent_build_update(context, agent_build_id, values):
 ####################
 
 @require_context
+@allow_slave_read
 def bw_usage_get(context, uuid, start_period, mac, use_slave=False):
     values = {'start_period': start_period}
     values = convert_objects_related_datetimes(values, 'start_period')
@@ -5091,6 +5481,7 @@ def bw_usage_get(context, uuid, start_period, mac, use_slave=False):
 
 
 @require_context
+@allow_slave_read
 def bw_usage_get_by_uuids(context, uuids, start_period, use_slave=False):
     values = {'start_period': start_period}
     values = convert_objects_related_datetimes(values, 'start_period')
@@ -5368,6 +5759,7 @@ def aggregate_get(context, aggregate_id):
     return aggregate
 
 
+@allow_slave_read
 def aggregate_get_by_host(context, host, key=None):
     """Return rows that match host (mandatory) and metadata key (optional).
 
@@ -5386,6 +5778,7 @@ def aggregate_get_by_host(context, host, key=None):
     return query.all()
 
 
+@allow_slave_read
 def aggregate_metadata_get_by_host(context, host, key=None):
     query = model_query(context, models.Aggregate)
     query = query.join("_hosts")
@@ -5600,19 +5993,217 @@ def aggregate_host_add(context, aggregate_id, host):
 ################
 
 
+# The instance faults and action events waiting for a bulk write, see
+# instance_event_writes_flush().  The events are keyed by action id and
+# event name, so that finishing a buffered event updates its row in place.
+# The finishes of the events whose start was buffered by another process
+# are retried by the next flushes.
+_BUFFERED_FAULTS = []
+_BUFFERED_EVENTS = collections.OrderedDict()
+_BUFFERED_EVENT_FINISHES = {}
+_BUFFERED_FAILED_ACTIONS = set()
+_BUFFERED_SINCE = [None]
+_BUFFER_LOCK = threading.Lock()
+_EVENT_FINISH_RETRIES = 3
+# The buffer keeps at most this many times instance_event_write_buffer_size
+# faults and events while the database cannot be reached.
+_BUFFER_MAX_SIZE_FACTOR = 10
+
+
+def _buffering_event_writes():
+    return CONF.instance_event_write_buffer_size > 0
+
+
+def _buffered_row(model, values):
+    """Return the row to insert in bulk for values, without an id."""
+    columns = [column.name for column in model.__table__.columns
+               if column.name != 'id']
+    row = {name: values.get(name) for name in columns}
+    row['created_at'] = timeutils.utcnow()
+    row['deleted'] = 0
+    return row
+
+
+def _buffered_size():
+    return (len(_BUFFERED_FAULTS) + len(_BUFFERED_EVENTS) +
+            len(_BUFFERED_EVENT_FINISHES))
+
+
+def _buffer_added():
+    """Flush the buffer if it reached a threshold, the lock being held."""
+    now = time.time()
+    if _BUFFERED_SINCE[0] is None:
+        _BUFFERED_SINCE[0] = now
+    if (_buffered_size() >= CONF.instance_event_write_buffer_size or
+            now - _BUFFERED_SINCE[0] >=
+            CONF.instance_event_write_buffer_interval):
+        _flush_buffered_writes()
+
+
+def _finish_buffered_events(session, finishes, failed_actions):
+    """Write the buffered event finishes, return those to retry."""
+    retried = {}
+    for key, (updates, retries) in finishes.items():
+        action_id, event = key
+        count = session.query(models.InstanceActionEvent).\
+                        filter_by(action_id=action_id).\
+                        filter_by(event=event).\
+                        filter_by(deleted=0).\
+                        update(updates, synchronize_session=False)
+        if count:
+            if updates['result'].lower() == 'error':
+                failed_actions.add(action_id)
+        elif retries < _EVENT_FINISH_RETRIES:
+            retried[key] = (updates, retries + 1)
+        else:
+            LOG.warning(_LW("Dropping the finish of event %(event)s of "
+                            "action %(action_id)s, the event was never "
+                            "started."),
+                        {'event': event, 'action_id': action_id})
+    return retried
+
+
+def _fail_buffered_actions(session, failed_actions):
+    if failed_actions:
+        session.query(models.InstanceAction).\
+                filter(models.InstanceAction.id.in_(failed_actions)).\
+                update({'message': 'Error'}, synchronize_session=False)
+
+
+def _flush_buffered_writes():
+    """Write the buffered faults and events, the lock being held.
+
+    They are written in bulk. When that fails, they are written one by one
+    and those failing are dropped, unless the database cannot be reached:
+    what is left is then kept for the next flush, up to
+    _BUFFER_MAX_SIZE_FACTOR times instance_event_write_buffer_size.
+    """
+    if not (_BUFFERED_FAULTS or _BUFFERED_EVENTS or
+            _BUFFERED_EVENT_FINISHES):
+        return
+    failed_actions = set(_BUFFERED_FAILED_ACTIONS)
+    try:
+        session = get_session()
+        with session.begin():
+            if _BUFFERED_FAULTS:
+                session.execute(models.InstanceFault.__table__.insert().
+                                values(_BUFFERED_FAULTS))
+            if _BUFFERED_EVENTS:
+                session.execute(models.InstanceActionEvent.__table__.insert().
+                                values(list(_BUFFERED_EVENTS.values())))
+            retried = _finish_buffered_events(session,
+                                              _BUFFERED_EVENT_FINISHES,
+                                              failed_actions)
+            _fail_buffered_actions(session, failed_actions)
+    except Exception:
+        LOG.exception(_LE("Failed to write the buffered instance faults and "
+                          "action events in bulk, writing them one by one"))
+        try:
+            _flush_buffered_writes_one_by_one()
+        except Exception:
+            LOG.exception(_LE("Failed to write the buffered instance faults "
+                              "and action events, keeping them for the "
+                              "next flush"))
+            _trim_buffer()
+        return
+    del _BUFFERED_FAULTS[:]
+    _BUFFERED_EVENTS.clear()
+    _BUFFERED_EVENT_FINISHES.clear()
+    _BUFFERED_EVENT_FINISHES.update(retried)
+    _BUFFERED_FAILED_ACTIONS.clear()
+    _BUFFERED_SINCE[0] = time.time() if retried else None
+
+
+def _insert_buffered_row(session, model, row):
+    session.execute(model.__table__.insert().values(row))
+
+
+def _write_one(session, what, write, *args):
+    """Write in a transaction of its own, dropping what fails to be written.
+
+    A DBConnectionError is raised instead, the caller keeping what was not
+    written then.
+    """
+    try:
+        with session.begin():
+            return write(session, *args)
+    except db_exc.DBConnectionError:
+        raise
+    except Exception:
+        LOG.exception(_LE("Dropping the buffered %s which failed to be "
+                          "written"), what)
+
+
+def _flush_buffered_writes_one_by_one():
+    """Write the buffered faults and events each in its own transaction."""
+    session = get_session()
+    while _BUFFERED_FAULTS:
+        _write_one(session, 'instance fault', _insert_buffered_row,
+                   models.InstanceFault, _BUFFERED_FAULTS[0])
+        del _BUFFERED_FAULTS[0]
+    while _BUFFERED_EVENTS:
+        key, row = next(six.iteritems(_BUFFERED_EVENTS))
+        _write_one(session, 'instance action event', _insert_buffered_row,
+                   models.InstanceActionEvent, row)
+        del _BUFFERED_EVENTS[key]
+    retried = {}
+    failed_actions = set()
+    try:
+        while _BUFFERED_EVENT_FINISHES:
+            key, finish = next(six.iteritems(_BUFFERED_EVENT_FINISHES))
+            retried.update(_write_one(session,
+                                      'instance action event finish',
+                                      _finish_buffered_events,
+                                      {key: finish}, failed_actions) or {})
+            del _BUFFERED_EVENT_FINISHES[key]
+    finally:
+        _BUFFERED_EVENT_FINISHES.update(retried)
+        _BUFFERED_FAILED_ACTIONS.update(failed_actions)
+    _write_one(session, 'instance action errors', _fail_buffered_actions,
+               set(_BUFFERED_FAILED_ACTIONS))
+    _BUFFERED_FAILED_ACTIONS.clear()
+    _BUFFERED_SINCE[0] = time.time() if retried else None
+
+
+def _trim_buffer():
+    """Drop the oldest buffered faults and events beyond the maximum size."""
+    extra = (_buffered_size() - _BUFFER_MAX_SIZE_FACTOR *
+             CONF.instance_event_write_buffer_size)
+    if extra <= 0:
+        return
+    LOG.warning(_LW("Dropping the %d oldest buffered instance faults and "
+                    "action events, the buffer is full."), extra)
+    for _i in range(extra):
+        if _BUFFERED_FAULTS:
+            del _BUFFERED_FAULTS[0]
+        elif _BUFFERED_EVENTS:
+            _BUFFERED_EVENTS.popitem(last=False)
+        else:
+            _BUFFERED_EVENT_FINISHES.popitem()
+
+
+def instance_event_writes_flush(context):
+    """Write the buffered instance faults and action events."""
+    with _BUFFER_LOCK:
+        _flush_buffered_writes()
+
+
 def instance_fault_create(context, values):
     """Create a new InstanceFault."""
+    if _buffering_event_writes():
+        row = _buffered_row(models.InstanceFault, values)
+        with _BUFFER_LOCK:
+            _BUFFERED_FAULTS.append(row)
+            _buffer_added()
+        return dict(row)
+
     fault_ref = models.InstanceFault()
     fault_ref.update(values)
     fault_ref.save()
     return dict(fault_ref.iteritems())
 
 
-def instance_fault_get_by_instance_uuids(context, instance_uuids):
-    """Get all instance faults for the provided instance_uuids."""
-    if not instance_uuids:
-        return {}
-
+def _instance_fault_get_by_instance_uuids(context, instance_uuids):
     rows = model_query(context, models.InstanceFault, read_deleted='no').\
                        filter(models.InstanceFault.instance_uuid.in_(
                            instance_uuids)).\
@@ -5630,6 +6221,27 @@ def instance_fault_get_by_instance_uuids(context, instance_uuids):
     return output
 
 
+@allow_slave_read
+def instance_fault_get_by_instance_uuids(context, instance_uuids):
+    """Get all instance faults for the provided instance_uuids."""
+    if not instance_uuids:
+        return {}
+
+    if not _buffering_event_writes():
+        return _instance_fault_get_by_instance_uuids(context, instance_uuids)
+
+    # NOTE: Hold the lock so that no flush moves faults between the
+    # buffer and the database while both are read.
+    with _BUFFER_LOCK:
+        output = _instance_fault_get_by_instance_uuids(context,
+                                                       instance_uuids)
+        buffered = [dict(row) for row in reversed(_BUFFERED_FAULTS)
+                    if row['instance_uuid'] in output]
+    for row in reversed(buffered):
+        output[row['instance_uuid']].insert(0, row)
+    return output
+
+
 ##################
 
 
@@ -5682,6 +6294,8 @@ def _action_get_by_request_id(context, instance_uuid, request_id,
 def action_event_start(context, values):
     """Start an event on an instance action."""
     convert_objects_related_datetimes(values, 'start_time')
+    if _buffering_event_writes():
+        return _action_event_start_buffered(context, values)
     session = get_session()
     with session.begin():
         action = _action_get_by_request_id(context, values['instance_uuid'],
@@ -5700,9 +6314,68 @@ def action_event_start(context, values):
     return event_ref
 
 
+def _action_event_start_buffered(context, values):
+    action = _action_get_by_request_id(context, values['instance_uuid'],
+                                       values['request_id'])
+    if not action:
+        raise exception.InstanceActionNotFound(
+                                    request_id=values['request_id'],
+                                    instance_uuid=values['instance_uuid'])
+
+    values['action_id'] = action['id']
+    row = _buffered_row(models.InstanceActionEvent, values)
+    key = (row['action_id'], row['event'])
+    with _BUFFER_LOCK:
+        if key in _BUFFERED_EVENTS:
+            _flush_buffered_writes()
+        _BUFFERED_EVENTS[key] = row
+        _buffer_added()
+    return dict(row)
+
+
+def _action_event_finish_buffered(context, values):
+    action = _action_get_by_request_id(context, values['instance_uuid'],
+                                       values['request_id'])
+    if not action:
+        raise exception.InstanceActionNotFound(
+                                    request_id=values['request_id'],
+                                    instance_uuid=values['instance_uuid'])
+
+    updates = {name: values[name]
+               for name in ('start_time', 'finish_time', 'result',
+                            'traceback')
+               if name in values}
+    key = (action['id'], values['event'])
+    with _BUFFER_LOCK:
+        row = _BUFFERED_EVENTS.get(key)
+        if row is not None:
+            row.update(updates)
+            if values['result'].lower() == 'error':
+                _BUFFERED_FAILED_ACTIONS.add(action['id'])
+            _buffer_added()
+            return dict(row)
+
+    try:
+        return _action_event_finish(context, values)
+    except exception.InstanceActionEventNotFound:
+        # NOTE: Another process may still buffer the start of the event,
+        # finish it in a later flush.
+        with _BUFFER_LOCK:
+            _BUFFERED_EVENT_FINISHES[key] = (updates, 0)
+            _buffer_added()
+        updates.update(action_id=action['id'], event=values['event'])
+        return updates
+
+
 def action_event_finish(context, values):
     """Finish an event on an instance action."""
     convert_objects_related_datetimes(values, 'start_time', 'finish_time')
+    if _buffering_event_writes():
+        return _action_event_finish_buffered(context, values)
+    return _action_event_finish(context, values)
+
+
+def _action_event_finish(context, values):
     session = get_session()
     with session.begin():
         action = _action_get_by_request_id(context, values['instance_uuid'],
@@ -5820,6 +6493,7 @@ def task_log_get(context, task_name, period_beginning, period_ending, host,
                                period_ending, host, state).first()
 
 
+@allow_slave_read
 def task_log_get_all(context, task_name, period_beginning, period_ending,
                      host=None, state=None):
     return _task_log_get_query(context, task_name, period_beginning,
@@ -5886,17 +6560,16 @@ def _get_default_deleted_value(table):
         return None
 
 
-@require_admin_context
-def archive_deleted_rows_for_table(context, tablename, max_rows):
-    """Move up to max_rows rows from one tables to the corresponding
-    shadow table. The context argument is only used for the decorator.
+def _archive_deleted_rows_for_table(tablename, max_rows, marker=None):
+    """Move up to max_rows rows whose key sorts after marker from one table
+    to the corresponding shadow table.
 
-    :returns: number of rows archived
-    """
-    # NOTE(guochbo): There is a circular import, nova.db.sqlalchemy.utils
-    # imports nova.db.sqlalchemy.api.
-    from nova.db.sqlalchemy import utils as db_utils
+    The batch is bounded by a key range, so each call only scans the rows
+    after the previous batch instead of the table from its start.
 
+    :returns: a (rows_archived, marker) tuple, marker being the key of the
+              last row of the batch
+    """
     engine = get_engine()
     conn = engine.connect()
     metadata = MetaData()
@@ -5908,12 +6581,11 @@ def archive_deleted_rows_for_table(context, tablename, max_rows):
     table = models.BASE.metadata.tables[tablename]
 
     shadow_tablename = _SHADOW_TABLE_PREFIX + tablename
-    rows_archived = 0
     try:
         shadow_table = Table(shadow_tablename, metadata, autoload=True)
     except NoSuchTableError:
         # No corresponding shadow table; skip it.
-        return rows_archived
+        return 0, marker
 
     if tablename == "dns_domains":
         # We have one table (dns_domains) where the key is called
@@ -5921,25 +6593,29 @@ def archive_deleted_rows_for_table(context, tablename, max_rows):
         column = table.c.domain
     else:
         column = table.c.id
-    # NOTE(guochbo): Use DeleteFromSelect to avoid
-    # database's limit of maximum parameter in one SQL statement.
     deleted_column = table.c.deleted
+    conditions = [deleted_column != deleted_column.default.arg]
+    if marker is not None:
+        conditions.append(column > marker)
+    batch = sql.select([column], and_(*conditions)).\
+        order_by(column).limit(max_rows).alias('batch')
     columns = [c.name for c in table.c]
-    insert = shadow_table.insert(inline=True).\
-        from_select(columns,
-                    sql.select([table],
-                               deleted_column != deleted_column.default.arg).
-                    order_by(column).limit(max_rows))
-    query_delete = sql.select([column],
-                          deleted_column != deleted_column.default.arg).\
-                          order_by(column).limit(max_rows)
-
-    delete_statement = db_utils.DeleteFromSelect(table, query_delete, column)
     try:
         # Group the insert and delete in a transaction.
         with conn.begin():
+            last = conn.execute(
+                sql.select([func.max(batch.c[column.name])])).scalar()
+            if last is None:
+                return 0, marker
+            # NOTE: Select and delete the key range of the batch rather
+            # than the keys themselves, to avoid the database's limit of
+            # maximum parameter in one SQL statement.
+            conditions.append(column <= last)
+            insert = shadow_table.insert(inline=True).\
+                from_select(columns, sql.select([table], and_(*conditions)))
             conn.execute(insert)
-            result_delete = conn.execute(delete_statement)
+            result_delete = conn.execute(
+                table.delete().where(and_(*conditions)))
     except db_exc.DBError:
         # TODO(ekudryashova): replace by DBReferenceError when db layer
         # raise it.
@@ -5948,11 +6624,46 @@ def archive_deleted_rows_for_table(context, tablename, max_rows):
         # skip this table for now; we'll come back to it later.
         msg = _("IntegrityError detected when archiving table %s") % tablename
         LOG.warn(msg)
-        return rows_archived
+        return 0, marker
 
-    rows_archived = result_delete.rowcount
+    return result_delete.rowcount, last
 
-    return rows_archived
+
+@require_admin_context
+def archive_deleted_rows_for_table(context, tablename, max_rows):
+    """Move up to max_rows rows from one tables to the corresponding
+    shadow table. The context argument is only used for the decorator.
+
+    :returns: number of rows archived
+    """
+    return _archive_deleted_rows_for_table(tablename, max_rows)[0]
+
+
+@require_admin_context
+def archive_deleted_rows_batch(context, tablename, max_rows, marker=None):
+    """Move up to max_rows rows whose key sorts after marker from one table
+    to the corresponding shadow table.
+
+    :returns: a (rows_archived, marker) tuple, marker being the key to
+              resume the archiving of the table from
+    """
+    return _archive_deleted_rows_for_table(tablename, max_rows, marker)
+
+
+def archive_table_names():
+    """Return the names of the tables to archive, dependent tables first.
+
+    Archiving the rows referencing a deleted row, such as the children of
+    an instance, before the row itself avoids hitting the foreign key
+    constraints.
+    """
+    tablenames = set()
+    for model_class in models.__dict__.itervalues():
+        if hasattr(model_class, "__tablename__"):
+            tablenames.add(model_class.__tablename__)
+    return [table.name
+            for table in reversed(models.BASE.metadata.sorted_tables)
+            if table.name in tablenames]
 
 
 @require_admin_context
@@ -5963,12 +6674,8 @@ def archive_deleted_rows(context, max_rows=None):
     :returns: Number of rows archived.
     """
     # The context argument is only used for the decorator.
-    tablenames = []
-    for model_class in models.__dict__.itervalues():
-        if hasattr(model_class, "__tablename__"):
-            tablenames.append(model_class.__tablename__)
     rows_archived = 0
-    for tablename in tablenames:
+    for tablename in archive_table_names():
         rows_archived += archive_deleted_rows_for_table(context, tablename,
                                          max_rows=max_rows - rows_archived)
         if rows_archived >= max_rows:
@@ -6191,11 +6898,13 @@ def instance_group_delete(context, group_uuid):
                     soft_delete()
 
 
+@allow_slave_read
 def instance_group_get_all(context):
     """Get all groups."""
     return _instance_group_get_query(context, models.InstanceGroup).all()
 
 
+@allow_slave_read
 def instance_group_get_all_by_project_id(context, project_id):
     """Get all groups."""
     return _instance_group_get_query(context, models.InstanceGroup).\
@@ -169,6 +169,11 @@ class ComputeNode(BASE, NovaBase):
     # objects.NUMATopoloogy._to_json()
     numa_topology = Column(Text)
 
+    # Incremented on every update of the compute node, so that resources are
+    # only claimed by the scheduler if the node didn't change since it was
+    # read. NULL until the first update after the upgrade.
+    generation = Column(Integer, default=0)
+
 
 class Certificate(BASE, NovaBase):
     """Represents a x509 certificate."""
@@ -203,6 +208,10 @@ class Instance(BASE, NovaBase):
               'host', 'node', 'deleted'),
         Index('instances_host_deleted_cleaned_idx',
               'host', 'deleted', 'cleaned'),
+        Index('instances_project_id_deleted_created_at_idx',
+              'project_id', 'deleted', 'created_at', 'id'),
+        Index('instances_updated_at_idx',
+              'updated_at'),
         schema.UniqueConstraint('uuid', name='uniq_instances0uuid'),
     )
     injected_files = []
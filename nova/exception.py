@@ -1598,6 +1598,11 @@ class ImageDownloadModuleConfigurationError(ImageDownloadModuleError):
     msg_fmt = _("The module %(module)s is misconfigured: %(reason)s.")
 
 
+class ImageDownloadModuleUnavailableError(ImageDownloadModuleError):
+    msg_fmt = _("The image is not available from the download module "
+                "%(module)s. %(reason)s")
+
+
 class ResourceMonitorError(NovaException):
     msg_fmt = _("Error when creating resource monitor: %(monitor)s")
 
@@ -17,6 +17,8 @@
 Filter support
 """
 
+import time
+
 from oslo_log import log as logging
 
 from nova.i18n import _LI
@@ -66,16 +68,31 @@ class BaseFilterHandler(loadables.BaseLoader):
     """
 
     def get_filtered_objects(self, filters, objs, filter_properties, index=0):
+        """Returns the objects which pass all the filters.
+
+        If filter_properties contains a 'scheduler_trace' list, a dict with
+        the name, the number of objects in and out and the time taken by
+        each filter which ran is appended to it.
+        """
+        trace = filter_properties.get('scheduler_trace')
         list_objs = list(objs)
         LOG.debug("Starting with %d host(s)", len(list_objs))
         for filter in filters:
             if filter.run_filter_for_index(index):
                 cls_name = filter.__class__.__name__
+                start = time.time()
                 objs = filter.filter_all(list_objs, filter_properties)
                 if objs is None:
                     LOG.debug("Filter %s says to stop filtering", cls_name)
                     return
+                objs_in = len(list_objs)
                 list_objs = list(objs)
+                if trace is not None:
+                    trace.append({'filter': cls_name,
+                                  'index': index,
+                                  'hosts_in': objs_in,
+                                  'hosts_out': len(list_objs),
+                                  'elapsed': time.time() - start})
                 if not list_objs:
                     LOG.info(_LI("Filter %s returned 0 hosts"), cls_name)
                     break
@@ -0,0 +1,197 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import os
+import random
+
+import eventlet
+from oslo_concurrency import processutils
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from nova.compute import vm_states
+from nova import exception
+from nova.i18n import _, _LI, _LW
+import nova.image.download.base as xfer_base
+from nova import objects
+from nova.openstack.common import fileutils
+from nova import servicegroup
+from nova import utils
+import nova.virt.libvirt.imagecache as lv_imagecache
+import nova.virt.libvirt.utils as lv_utils
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+peer_opts = [
+    cfg.IntOpt('max_peers',
+               default=3,
+               help=_('The maximum number of peer compute nodes asked for '
+                      'a base image before falling back to the next image '
+                      'location or to Glance itself')),
+]
+CONF.register_opts(peer_opts, group='image_peer')
+CONF.import_opt('host', 'nova.netconf')
+CONF.import_opt('instances_path', 'nova.compute.manager')
+CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
+CONF.import_opt('force_raw_images', 'nova.virt.images')
+
+# The size of the blocks read when verifying the checksum of a copied image.
+_CHECKSUM_CHUNK_SIZE = 64 * 1024
+
+# The states of the instances whose host has finished caching their image.
+_CACHED_VM_STATES = [vm_states.ACTIVE, vm_states.STOPPED, vm_states.PAUSED,
+                     vm_states.SUSPENDED]
+
+
+#  This module lets a compute node copy the base image of an image from
+#  another compute node which already has it in its image cache, rather than
+#  downloading it from Glance.  To use it 'peer' must be added to the
+#  allowed_direct_url_schemes list of the [glance] section in nova.conf.
+#
+#  Peers are the nova-compute services reported up by the servicegroup API
+#  which run an active, stopped, paused or suspended instance of the image,
+#  so that no peer is asked for an image none of them could have yet, e.g.
+#  during the first wave of boots of a new image.  The base image is copied
+#  from the same location it is cached at locally, i.e.
+#  <instances_path>/<image_cache_subdirectory_name>/<sha1 of image id>,
+#  using the rsync/scp transport already used by the libvirt driver to move
+#  disks between compute nodes during resize.  Only base images which hold
+#  the unmodified Glance image are used, i.e. the peers are not asked when
+#  force_raw_images converts the image, and the size of a base image is
+#  checked over ssh before it is copied.  Every copy is then checked against
+#  the checksum advertised by Glance.  Any failure makes the caller fall back
+#  to the next image location and ultimately to Glance.
+#
+#  The peers are picked at random among those, without knowing which of them
+#  actually cache the image, e.g. an instance booted from a volume leaves no
+#  base image behind.  The sizes of the base images of up to max_peers peers
+#  are checked in parallel, so a fetch still pays one ssh round trip before
+#  it gets to copy the image or fall back.
+
+
+class PeerTransfer(xfer_base.TransferBase):
+
+    def __init__(self):
+        self.servicegroup_api = servicegroup.API()
+
+    def _get_peers(self, context, image_id):
+        """Return the addresses of the other up compute nodes running the
+        image.
+        """
+        instances = objects.InstanceList.get_by_filters(
+            context, {'image_ref': image_id, 'vm_state': _CACHED_VM_STATES,
+                      'deleted': False},
+            expected_attrs=[], expected_fields=['host'])
+        image_hosts = set(instance.host for instance in instances)
+        image_hosts.discard(CONF.host)
+        if not image_hosts:
+            return []
+        services = objects.ServiceList.get_by_binary(context, 'nova-compute')
+        hosts = [service.host for service in services
+                 if service.host in image_hosts and
+                 self.servicegroup_api.service_is_up(service)]
+        if not hosts:
+            return []
+        host_ips = {node.host: node.host_ip for node in
+                    objects.ComputeNodeList.get_all(context)
+                    if node.host in hosts}
+        # Spread the load among the peers rather than having every node
+        # copy from the first one which has the image.
+        random.shuffle(hosts)
+        return [str(host_ips.get(host) or host) for host in hosts]
+
+    def _get_size(self, peer, path):
+        """Return the size of path on peer, None if it does not exist."""
+        try:
+            out, _err = utils.ssh_execute(peer, 'stat', '-c', '%s', path)
+        except processutils.ProcessExecutionError:
+            return None
+        return int(out)
+
+    def _verify(self, dst_path, metadata):
+        size = metadata.get('size')
+        if size is not None and os.path.getsize(dst_path) != size:
+            return False
+        md5 = hashlib.md5()
+        with open(dst_path, 'rb') as image_file:
+            for chunk in iter(lambda: image_file.read(_CHECKSUM_CHUNK_SIZE),
+                              ''):
+                md5.update(chunk)
+        return md5.hexdigest() == metadata['checksum']
+
+    def download(self, context, url_parts, dst_path, metadata, **kwargs):
+        if not metadata.get('checksum'):
+            msg = _('The image has no checksum to verify a peer copy with')
+            raise exception.ImageDownloadModuleMetaDataError(
+                module=str(self), reason=msg)
+
+        image_id = url_parts.netloc
+        if CONF.force_raw_images and metadata.get('disk_format') != 'raw':
+            msg = _('The base images of the peers are converted to raw')
+            raise exception.ImageDownloadModuleUnavailableError(
+                module=str(self), reason=msg)
+
+        base_path = os.path.join(
+            CONF.instances_path, CONF.image_cache_subdirectory_name,
+            lv_imagecache.get_cache_fname({'image_id': image_id}, 'image_id'))
+        peers = self._get_peers(context.elevated(), image_id)
+        if not peers:
+            msg = (_('No peer runs an instance of image %s') % image_id)
+            raise exception.ImageDownloadModuleUnavailableError(
+                module=str(self), reason=msg)
+
+        peers = peers[:CONF.image_peer.max_peers]
+        # Ask all the peers at once rather than one after the other
+        pool = eventlet.GreenPool()
+        sizes = list(pool.imap(self._get_size, peers,
+                               [base_path] * len(peers)))
+        for peer, size in zip(peers, sizes):
+            if size is None or metadata.get('size') not in (None, size):
+                LOG.debug('Image %(image_id)s is not available from '
+                          '%(peer)s', {'image_id': image_id, 'peer': peer})
+                continue
+            try:
+                lv_utils.copy_image(base_path, dst_path, host=peer,
+                                    receive=True)
+            except processutils.ProcessExecutionError:
+                LOG.warning(_LW('Failed to copy image %(image_id)s from '
+                                '%(peer)s'),
+                            {'image_id': image_id, 'peer': peer})
+                fileutils.delete_if_exists(dst_path)
+                continue
+
+            if self._verify(dst_path, metadata):
+                LOG.info(_LI('Copied image %(image_id)s from %(peer)s'),
+                         {'image_id': image_id, 'peer': peer})
+                return
+
+            LOG.warning(_LW('The copy of image %(image_id)s from %(peer)s '
+                            'does not match its checksum'),
+                        {'image_id': image_id, 'peer': peer})
+            fileutils.delete_if_exists(dst_path)
+
+        msg = (_('No peer could provide image %s') % image_id)
+        raise exception.ImageDownloadModuleUnavailableError(reason=msg,
+                                                            module=str(self))
+
+
+def get_download_handler(**kwargs):
+    return PeerTransfer()
+
+
+def get_schemes():
+    return ['peer']
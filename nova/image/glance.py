@@ -19,10 +19,14 @@ from __future__ import absolute_import
 
 import copy
 import itertools
+import os
 import random
 import sys
 import time
 
+from eventlet import greenthread
+from eventlet import queue
+from eventlet import tpool
 import glanceclient
 import glanceclient.exc
 from oslo_config import cfg
@@ -65,7 +69,7 @@ glance_opts = [
                 default=[],
                 help='A list of url scheme that can be downloaded directly '
                      'via the direct_url.  Currently supported schemes: '
-                     '[file].'),
+                     '[file, peer].'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -331,7 +335,17 @@ class GlanceImageService(object):
         """Calls out to Glance for data and writes data."""
         if CONF.glance.allowed_direct_url_schemes and dst_path is not None:
             image = self.show(context, image_id, include_locations=True)
-            for entry in image.get('locations', []):
+            locations = image.get('locations', [])
+            if 'peer' in CONF.glance.allowed_direct_url_schemes:
+                # Copying the image from another compute node is tried first
+                # so as not to load Glance with the downloads.
+                locations.insert(0, {'url': 'peer://%s' % image_id,
+                                     'metadata': {
+                                         'checksum': image.get('checksum'),
+                                         'size': image.get('size'),
+                                         'disk_format':
+                                             image.get('disk_format')}})
+            for entry in locations:
                 loc_url = entry['url']
                 loc_meta = entry['metadata']
                 o = urlparse.urlparse(loc_url)
@@ -343,6 +357,8 @@ class GlanceImageService(object):
                                 "using %s") % o.scheme
                         LOG.info(msg)
                         return
+                    except exception.ImageDownloadModuleUnavailableError as e:
+                        LOG.info(e.format_message())
                     except Exception:
                         LOG.exception(_LE("Download image error"))
 
@@ -351,20 +367,17 @@ class GlanceImageService(object):
         except Exception:
             _reraise_translated_image_exception(image_id)
 
-        close_file = False
         if data is None and dst_path:
             data = open(dst_path, 'wb')
-            close_file = True
-
-        if data is None:
-            return image_chunks
-        else:
             try:
-                for chunk in image_chunks:
-                    data.write(chunk)
+                _write_image_chunks(image_chunks, data)
             finally:
-                if close_file:
-                    data.close()
+                data.close()
+        elif data is None:
+            return image_chunks
+        else:
+            for chunk in image_chunks:
+                data.write(chunk)
 
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
@@ -416,6 +429,58 @@ class GlanceImageService(object):
         return True
 
 
+# The number of chunks received ahead of the ones being written.
+_WRITE_QUEUE_SIZE = 16
+
+
+def _image_chunk_writer(chunks, image_file, failures):
+    offset = 0
+    sparse_end = False
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            break
+        if failures:
+            # NOTE: Keep draining, the receiver must never block on a full
+            # queue.
+            continue
+        try:
+            if chunk.count('\0') == len(chunk):
+                image_file.seek(len(chunk), os.SEEK_CUR)
+                sparse_end = True
+            else:
+                tpool.execute(image_file.write, chunk)
+                sparse_end = False
+            offset += len(chunk)
+        except Exception:
+            failures.append(sys.exc_info())
+    if sparse_end and not failures:
+        image_file.truncate(offset)
+
+
+def _write_image_chunks(image_chunks, image_file):
+    """Write the chunks of an image to a new file as they are received.
+
+    The writes are done by a native thread, so that the next chunks are
+    received while the previous ones reach the disk, and the chunks full of
+    zeros are skipped, leaving holes in the file.
+    """
+    chunks = queue.LightQueue(_WRITE_QUEUE_SIZE)
+    failures = []
+    writer = greenthread.spawn(_image_chunk_writer, chunks, image_file,
+                               failures)
+    try:
+        for chunk in image_chunks:
+            if failures:
+                break
+            chunks.put(chunk)
+    finally:
+        chunks.put(None)
+        writer.wait()
+    if failures:
+        six.reraise(*failures[0])
+
+
 def _extract_query_params(params):
     _params = {}
     accepted_params = ('filters', 'marker', 'limit',
@@ -19,6 +19,8 @@ import contextlib
 import copy
 import datetime
 import functools
+import sys
+import threading
 import traceback
 
 import netaddr
@@ -34,11 +36,15 @@ from nova.i18n import _, _LE
 from nova import objects
 from nova.objects import fields as obj_fields
 from nova.openstack.common import versionutils
+from nova import rpc
 from nova import utils
 
 
 LOG = logging.getLogger('object')
 
+# Marks the fields without a value when serializing the objects
+_UNSET = object()
+
 
 def get_attrname(name):
     """Return the mangled name of the attribute's underlying storage."""
@@ -96,6 +102,41 @@ def make_class_properties(cls):
 
         setattr(cls, name, property(getter, setter, deleter))
 
+    # NOTE: Precompute, in a stable order, the storage of each field and
+    # whether its values need converting to and from their primitive
+    # form, so that the (de)serialization of the objects skips the calls
+    # to the fields which leave the values untouched.
+    cls._obj_primitive_fields = tuple(
+        (name, get_attrname(name), field,
+         _field_is_plain(field, 'to_primitive'),
+         _field_is_plain(field, 'from_primitive'))
+        for name, field in sorted(cls.fields.items()))
+
+
+def _field_is_plain(field, method):
+    """Tell if a field returns the values unchanged from its method."""
+    def _function(cls):
+        method_fn = getattr(cls, method)
+        return getattr(method_fn, '__func__', method_fn)
+
+    return (_function(type(field)) is _function(obj_fields.Field) and
+            _function(type(field._type)) is
+            _function(obj_fields.FieldType))
+
+
+def _compact_slots(bases, dict_):
+    """Return the slots storing the fields of a compact object class."""
+    names = set(dict_.get('fields', {}))
+    slotted = set()
+    for base in bases:
+        for cls in base.mro():
+            names.update(getattr(cls, 'fields', {}))
+            slotted.update(cls.__dict__.get('__slots__', ()))
+    attrs = set(get_attrname(name) for name in names)
+    attrs.update(['_changed_fields', '_context'])
+    return tuple(sorted(attr for attr in attrs - slotted
+                        if attr not in dict_))
+
 
 class NovaObjectMetaclass(type):
     """Metaclass that allows tracking of object classes."""
@@ -104,6 +145,19 @@ class NovaObjectMetaclass(type):
     # remoted. If this is not None, use it to remote things over RPC.
     indirection_api = None
 
+    def __new__(mcs, name, bases, dict_):
+        # NOTE: The objects of the classes asking for a compact storage
+        # keep their field values in slots rather than in their __dict__,
+        # which only holds the other attributes of the object then. The
+        # fields are accessed the same way, through get_attrname().
+        compact = dict_.get('obj_compact_storage',
+                            any(getattr(base, 'obj_compact_storage', False)
+                                for base in bases))
+        if compact and '__slots__' not in dict_:
+            dict_['__slots__'] = _compact_slots(bases, dict_)
+        return super(NovaObjectMetaclass, mcs).__new__(mcs, name, bases,
+                                                       dict_)
+
     def __init__(cls, names, bases, dict_):
         if not hasattr(cls, '_obj_classes'):
             # This means this is a base class using the metaclass. I.e.,
@@ -142,6 +196,103 @@ class NovaObjectMetaclass(type):
                 setattr(objects, obj_name, cls)
 
 
+# The save() calls deferred by batched_saves() in the current thread
+_batched_saves = threading.local()
+
+
+@contextlib.contextmanager
+def batched_saves():
+    """Send the save() calls of the remotable objects made in this block to
+    the indirection service at once, when the block ends.
+
+    Only the save() calls without arguments are deferred, as the callers of
+    the other ones expect them to fail right away, for instance on an
+    unexpected task state. Any other remotable call sends the pending saves
+    first, so that the calls reach the indirection service in order. The
+    objects keep their changes until their saves are sent.
+
+    Every pending save is made even if some of them fail, and the error of
+    the first failed one is raised once the others are applied. When the
+    block raises, its pending saves are still sent, and its error is raised
+    rather than theirs.
+    """
+    if getattr(_batched_saves, 'objects', None) is not None:
+        # The outermost block sends the saves
+        yield
+        return
+
+    _batched_saves.objects = []
+    try:
+        try:
+            yield
+        except Exception:
+            exc_info = sys.exc_info()
+            try:
+                _send_batched_saves()
+            except Exception:
+                LOG.exception(_LE('Failed to save the objects of a block '
+                                  'which raised'))
+            six.reraise(*exc_info)
+        _send_batched_saves()
+    finally:
+        _batched_saves.objects = None
+
+
+def _send_batched_saves():
+    """Send the pending saves to the indirection service in one call."""
+    objs = getattr(_batched_saves, 'objects', None)
+    if not objs:
+        return
+    pending = objs[:]
+    del objs[:]
+    results = NovaObject.indirection_api.object_actions(
+        pending[0]._context, [(obj, 'save', (), {}) for obj in pending])
+    error = None
+    for obj, result in zip(pending, results):
+        if isinstance(result, six.string_types):
+            # The save failed, this is its serialized exception
+            if error is None:
+                error = rpc.deserialize_remote_exception(result)
+            continue
+        updates, _result = result
+        _apply_remote_updates(obj, updates)
+    if error is not None:
+        raise error
+
+
+def _defer_save(obj, method, args, kwargs):
+    """Defer a remotable call when batching the saves.
+
+    :returns: True if the call was deferred, False if it must be made now
+    """
+    objs = getattr(_batched_saves, 'objects', None)
+    if objs is None:
+        return False
+    deferrable = method == 'save' and not args and not kwargs
+    if (not deferrable or any(pending is obj for pending in objs) or
+            (objs and objs[0]._context is not obj._context)):
+        _send_batched_saves()
+    if deferrable:
+        objs.append(obj)
+    return deferrable
+
+
+def _apply_remote_updates(obj, updates):
+    """Apply to an object the changes made by a remote call on it."""
+    for key, value in updates.iteritems():
+        if key in obj.fields:
+            field = obj.fields[key]
+            # NOTE(ndipanov): Since NovaObjectSerializer will have
+            # deserialized any object fields into objects already,
+            # we do not try to deserialize them again here.
+            if isinstance(value, NovaObject):
+                setattr(obj, key, value)
+            else:
+                setattr(obj, key, field.from_primitive(obj, key, value))
+    obj.obj_reset_changes()
+    obj._changed_fields = set(updates.get('obj_what_changed', []))
+
+
 # These are decorators that mark an object's method as remotable.
 # If the metaclass is configured to forward object methods to an
 # indirection service, these will result in making an RPC call
@@ -153,6 +304,7 @@ def remotable_classmethod(fn):
     @functools.wraps(fn)
     def wrapper(cls, context, *args, **kwargs):
         if NovaObject.indirection_api:
+            _send_batched_saves()
             result = NovaObject.indirection_api.object_class_action(
                 context, cls.obj_name(), fn.__name__, cls.VERSION,
                 args, kwargs)
@@ -185,21 +337,11 @@ def remotable(fn):
             raise exception.OrphanedObjectError(method=fn.__name__,
                                                 objtype=self.obj_name())
         if NovaObject.indirection_api:
+            if _defer_save(self, fn.__name__, args, kwargs):
+                return
             updates, result = NovaObject.indirection_api.object_action(
                 self._context, self, fn.__name__, args, kwargs)
-            for key, value in updates.iteritems():
-                if key in self.fields:
-                    field = self.fields[key]
-                    # NOTE(ndipanov): Since NovaObjectSerializer will have
-                    # deserialized any object fields into objects already,
-                    # we do not try to deserialize them again here.
-                    if isinstance(value, NovaObject):
-                        setattr(self, key, value)
-                    else:
-                        setattr(self, key,
-                                field.from_primitive(self, key, value))
-            self.obj_reset_changes()
-            self._changed_fields = set(updates.get('obj_what_changed', []))
+            _apply_remote_updates(self, updates)
             return result
         else:
             return fn(self, *args, **kwargs)
@@ -268,6 +410,11 @@ class NovaObject(object):
     #   since they were not added until version 1.2.
     obj_relationships = {}
 
+    # Whether the objects store their field values in slots. This saves
+    # memory for the classes whose objects are held by the thousands,
+    # and is inherited by the subclasses.
+    obj_compact_storage = False
+
     def __init__(self, context=None, **kwargs):
         self._changed_fields = set()
         self._context = context
@@ -327,10 +474,13 @@ class NovaObject(object):
         self.VERSION = objver
         objdata = primitive['nova_object.data']
         changes = primitive.get('nova_object.changes', [])
-        for name, field in self.fields.items():
+        for name, _attr, field, _plain_to, plain_from in (
+                cls._obj_primitive_fields):
             if name in objdata:
-                setattr(self, name, field.from_primitive(self, name,
-                                                         objdata[name]))
+                value = objdata[name]
+                if not plain_from:
+                    value = field.from_primitive(self, name, value)
+                setattr(self, name, value)
         self._changed_fields = set([x for x in changes if x in self.fields])
         return self
 
@@ -490,18 +640,24 @@ class NovaObject(object):
         This calls to_primitive() for each item in fields.
         """
         primitive = dict()
-        for name, field in self.fields.items():
-            if self.obj_attr_is_set(name):
-                primitive[name] = field.to_primitive(self, name,
-                                                     getattr(self, name))
-        if target_version:
+        for name, attrname, field, plain_to, _plain_from in (
+                self._obj_primitive_fields):
+            value = getattr(self, attrname, _UNSET)
+            if value is _UNSET:
+                continue
+            if not plain_to:
+                value = field.to_primitive(self, name, value)
+            primitive[name] = value
+        # NOTE: There is nothing to backport for the version we are at
+        if target_version and target_version != self.VERSION:
             self.obj_make_compatible(primitive, target_version)
         obj = {'nova_object.name': self.obj_name(),
                'nova_object.namespace': 'nova',
                'nova_object.version': target_version or self.VERSION,
                'nova_object.data': primitive}
-        if self.obj_what_changed():
-            obj['nova_object.changes'] = list(self.obj_what_changed())
+        changes = self.obj_what_changed()
+        if changes:
+            obj['nova_object.changes'] = list(changes)
         return obj
 
     def obj_set_defaults(self, *attrs):
@@ -538,11 +694,11 @@ class NovaObject(object):
     def obj_what_changed(self):
         """Returns a set of fields that have been modified."""
         changes = set(self._changed_fields)
-        for field in self.fields:
-            if (self.obj_attr_is_set(field) and
-                    isinstance(getattr(self, field), NovaObject) and
-                    getattr(self, field).obj_what_changed()):
-                changes.add(field)
+        for name, attrname, _field, _plain_to, _plain_from in (
+                self._obj_primitive_fields):
+            value = getattr(self, attrname, None)
+            if isinstance(value, NovaObject) and value.obj_what_changed():
+                changes.add(name)
         return changes
 
     def obj_get_changes(self):
@@ -602,7 +758,8 @@ class NovaObject(object):
         False if not. Raises AttributeError if attrname is not
         a valid attribute for this object.
         """
-        if attrname not in self.obj_fields:
+        if (attrname not in self.fields and
+                attrname not in self.obj_extra_fields):
             raise AttributeError(
                 _("%(objname)s object has no attribute '%(attrname)s'") %
                 {'objname': self.obj_name(), 'attrname': attrname})
@@ -803,7 +960,9 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
             return iterable([action_fn(context, value) for value in values])
 
     def serialize_entity(self, context, entity):
-        if isinstance(entity, (tuple, list, set, dict)):
+        if isinstance(entity, NovaObject):
+            entity = entity.obj_to_primitive()
+        elif isinstance(entity, (tuple, list, set, dict)):
             entity = self._process_iterable(context, self.serialize_entity,
                                             entity)
         elif (hasattr(entity, 'obj_to_primitive') and
@@ -23,6 +23,7 @@ from nova.i18n import _
 from nova import objects
 from nova.objects import base
 from nova.objects import fields
+from nova import utils
 
 
 LOG = logging.getLogger(__name__)
@@ -50,7 +51,8 @@ class BlockDeviceMapping(base.NovaPersistentObject, base.NovaObject,
     # Version 1.7: Add update_or_create method
     # Version 1.8: Instance version 1.19
     # Version 1.9: Instance version 1.20
-    VERSION = '1.9'
+    # Version 1.10: Instance version 1.21
+    VERSION = '1.10'
 
     fields = {
         'id': fields.IntegerField(),
@@ -75,9 +77,16 @@ class BlockDeviceMapping(base.NovaPersistentObject, base.NovaObject,
     obj_relationships = {
         'instance': [('1.0', '1.13'), ('1.2', '1.14'), ('1.3', '1.15'),
                      ('1.4', '1.16'), ('1.5', '1.17'), ('1.6', '1.18'),
-                     ('1.8', '1.19'), ('1.9', '1.20')],
+                     ('1.8', '1.19'), ('1.9', '1.20'), ('1.10', '1.21')],
     }
 
+    def obj_make_compatible(self, primitive, target_version):
+        super(BlockDeviceMapping, self).obj_make_compatible(primitive,
+                                                            target_version)
+        target_version = utils.convert_version_to_tuple(target_version)
+        if target_version < (1, 10) and primitive.get('instance'):
+            primitive['instance'].pop('nova_object.deferred_fields', None)
+
     @staticmethod
     def _from_db_object(context, block_device_obj,
                         db_block_device, expected_attrs=None):
@@ -242,7 +251,9 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
     # Version 1.8: BlockDeviceMapping <= version 1.7
     # Version 1.9: BlockDeviceMapping <= version 1.8
     # Version 1.10: BlockDeviceMapping <= version 1.9
-    VERSION = '1.10'
+    # Version 1.11: Added get_by_instance_uuids()
+    # Version 1.12: BlockDeviceMapping <= version 1.10
+    VERSION = '1.12'
 
     fields = {
         'objects': fields.ListOfObjectsField('BlockDeviceMapping'),
@@ -259,6 +270,8 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         '1.8': '1.7',
         '1.9': '1.8',
         '1.10': '1.9',
+        '1.11': '1.9',
+        '1.12': '1.10',
     }
 
     @base.remotable_classmethod
@@ -268,6 +281,32 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(
                 context, cls(), objects.BlockDeviceMapping, db_bdms or [])
 
+    @base.remotable_classmethod
+    def get_by_instance_uuids(cls, context, instance_uuids, use_slave=False):
+        db_bdms = db.block_device_mapping_get_all_by_instance_uuids(
+                context, instance_uuids, use_slave=use_slave)
+        return base.obj_make_list(
+                context, cls(), objects.BlockDeviceMapping, db_bdms or [])
+
+    @classmethod
+    def bdms_by_instance_uuid(cls, context, instance_uuids, use_slave=False):
+        """Get the mappings of several instances in a single query.
+
+        :returns: a dict of BlockDeviceMappingList by instance uuid, with an
+                  entry for each of instance_uuids
+        """
+        if not instance_uuids:
+            return {}
+        bdms_by_uuid = {uuid: cls(context=context, objects=[])
+                        for uuid in instance_uuids}
+        bdms = cls.get_by_instance_uuids(context, instance_uuids,
+                                         use_slave=use_slave)
+        for bdm in bdms:
+            bdms_by_uuid[bdm.instance_uuid].objects.append(bdm)
+        for bdm_list in bdms_by_uuid.values():
+            bdm_list.obj_reset_changes()
+        return bdms_by_uuid
+
     def root_bdm(self):
         try:
             return (bdm_obj for bdm_obj in self if bdm_obj.is_root).next()
@@ -13,6 +13,7 @@
 #    under the License.
 
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 
 from nova import db
 from nova import exception
@@ -38,7 +39,9 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject,
     # Version 1.9: Added pci_device_pools
     # Version 1.10: Added get_first_node_by_host_for_old_compat()
     # Version 1.11: PciDevicePoolList version 1.1
-    VERSION = '1.11'
+    # Version 1.12: Added generation field and claim_resources()
+    VERSION = '1.12'
+    obj_compact_storage = True
 
     fields = {
         'id': fields.IntegerField(read_only=True),
@@ -70,6 +73,7 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject,
         # pci_stats field in the database
         'pci_device_pools': fields.ObjectField('PciDevicePoolList',
                                                nullable=True),
+        'generation': fields.IntegerField(nullable=True),
         }
 
     obj_relationships = {
@@ -80,6 +84,8 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject,
     def obj_make_compatible(self, primitive, target_version):
         super(ComputeNode, self).obj_make_compatible(primitive, target_version)
         target_version = utils.convert_version_to_tuple(target_version)
+        if target_version < (1, 12) and 'generation' in primitive:
+            del primitive['generation']
         if target_version < (1, 7) and 'host' in primitive:
             del primitive['host']
         if target_version < (1, 5) and 'numa_topology' in primitive:
@@ -126,11 +132,14 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject,
             'supported_hv_specs',
             'host',
             'pci_device_pools',
+            'generation',
             ])
         fields = set(compute.fields) - special_cases
         for key in fields:
             compute[key] = db_compute[key]
 
+        compute['generation'] = db_compute.get('generation')
+
         stats = db_compute['stats']
         if stats:
             compute['stats'] = jsonutils.loads(stats)
@@ -206,6 +215,18 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject,
         # Arbitrarily returning the first node.
         return computes[0]
 
+    @base.remotable_classmethod
+    def claim_resources(cls, context, compute_id, generation, vcpus,
+                        memory_mb, local_gb):
+        """Consumes resources on the compute node, unless it was updated
+        since its given generation was read.
+
+        :returns: True if the resources were consumed, False otherwise
+        """
+        return db.compute_node_claim_resources(context, compute_id,
+                                               generation, vcpus, memory_mb,
+                                               local_gb)
+
     @staticmethod
     def _convert_stats_to_db_format(updates):
         stats = updates.pop('stats', None)
@@ -285,7 +306,9 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
     # Version 1.9 ComputeNode version 1.9
     # Version 1.10 ComputeNode version 1.10
     # Version 1.11 ComputeNode version 1.11
-    VERSION = '1.11'
+    # Version 1.12 Added get_all_changed_since()
+    # Version 1.13 ComputeNode version 1.12
+    VERSION = '1.13'
     fields = {
         'objects': fields.ListOfObjectsField('ComputeNode'),
         }
@@ -303,6 +326,8 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
         '1.9': '1.9',
         '1.10': '1.10',
         '1.11': '1.11',
+        '1.12': '1.11',
+        '1.13': '1.12',
         }
 
     @base.remotable_classmethod
@@ -311,6 +336,31 @@ class ComputeNodeList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.ComputeNode,
                                   db_computes)
 
+    @base.remotable_classmethod
+    def _get_all_changed_since(cls, context, changes_since):
+        # The timestamp is passed as a string over RPC, so convert it back
+        # to the naive UTC datetime object the DB stores.
+        changes_since = timeutils.normalize_time(
+            timeutils.parse_isotime(changes_since))
+        db_computes = db.compute_node_get_all_changed_since(context,
+                                                            changes_since)
+        return base.obj_make_list(context, cls(context), objects.ComputeNode,
+                                  db_computes)
+
+    @classmethod
+    def get_all_changed_since(cls, context, changes_since):
+        """Get the compute nodes created, updated or deleted since a time.
+
+        Soft-deleted compute nodes are part of the result so that callers
+        keeping a local copy of the compute nodes can drop them.
+
+        :param:context: nova request context
+        :param:changes_since: datetime from which changes are returned
+        :returns: ComputeNodeList
+        """
+        changes_since = timeutils.isotime(changes_since)
+        return cls._get_all_changed_since(context, changes_since)
+
     @base.remotable_classmethod
     def get_by_hypervisor(cls, context, hypervisor_match):
         db_computes = db.compute_node_search_by_hypervisor(context,
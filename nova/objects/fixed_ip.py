@@ -40,7 +40,8 @@ class FixedIP(obj_base.NovaPersistentObject, obj_base.NovaObject,
     # Version 1.8: Instance 1.18
     # Version 1.9: Instance 1.19
     # Version 1.10: Instance 1.20
-    VERSION = '1.10'
+    # Version 1.11: Instance 1.21
+    VERSION = '1.11'
 
     fields = {
         'id': fields.IntegerField(),
@@ -66,7 +67,7 @@ class FixedIP(obj_base.NovaPersistentObject, obj_base.NovaObject,
     obj_relationships = {
         'instance': [('1.0', '1.13'), ('1.2', '1.14'), ('1.3', '1.15'),
                      ('1.6', '1.16'), ('1.7', '1.17'), ('1.8', '1.18'),
-                     ('1.9', '1.19'), ('1.10', '1.20')],
+                     ('1.9', '1.19'), ('1.10', '1.20'), ('1.11', '1.21')],
         'network': [('1.0', '1.2')],
         'virtual_interface': [('1.1', '1.0')],
         'floating_ips': [('1.5', '1.7')],
@@ -77,6 +78,8 @@ class FixedIP(obj_base.NovaPersistentObject, obj_base.NovaObject,
         target_version = utils.convert_version_to_tuple(target_version)
         if target_version < (1, 4) and 'default_route' in primitive:
             del primitive['default_route']
+        if target_version < (1, 11) and primitive.get('instance'):
+            primitive['instance'].pop('nova_object.deferred_fields', None)
 
     @staticmethod
     def _from_db_object(context, fixedip, db_fixedip, expected_attrs=None):
@@ -215,7 +218,8 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
     # Version 1.8: FixedIP <= version 1.8
     # Version 1.9: FixedIP <= version 1.9
     # Version 1.10: FixedIP <= version 1.10
-    VERSION = '1.10'
+    # Version 1.11: FixedIP <= version 1.11
+    VERSION = '1.11'
 
     fields = {
         'objects': fields.ListOfObjectsField('FixedIP'),
@@ -232,6 +236,7 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
         '1.8': '1.8',
         '1.9': '1.9',
         '1.10': '1.10',
+        '1.11': '1.11',
         }
 
     @obj_base.remotable_classmethod
@@ -14,6 +14,7 @@
 
 import contextlib
 import copy
+import re
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -95,6 +96,21 @@ def _expected_cols(expected_attrs):
     return simple_cols + complex_cols
 
 
+def _expected_columns(expected_fields):
+    """Return the instance columns to load for the given fields.
+
+    The fields used by the instance name template are added, so that the
+    name of the instances does not change when the other fields are left
+    out.
+    """
+    if expected_fields is None:
+        return None
+    template_fields = [field for field in
+                       re.findall(r'%\((\w+)\)', CONF.instance_name_template)
+                       if field in Instance.fields]
+    return sorted(set(expected_fields) | set(template_fields))
+
+
 def compat_instance(instance):
     """Create a dict-like instance structure from an objects.Instance.
 
@@ -156,7 +172,9 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
     # Version 1.18: Added flavor, old_flavor, new_flavor
     # Version 1.19: Added vcpu_model
     # Version 1.20: Added ec2_ids
-    VERSION = '1.20'
+    # Version 1.21: Added the deferred fields to the primitive
+    VERSION = '1.21'
+    obj_compact_storage = True
 
     fields = {
         'id': fields.IntegerField(),
@@ -274,6 +292,9 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
     def __init__(self, *args, **kwargs):
         super(Instance, self).__init__(*args, **kwargs)
         self._reset_metadata_tracking()
+        # NOTE: The column fields left out when loading us, which are the
+        # only column fields we lazy-load
+        self._deferred_fields = set()
 
     def _reset_metadata_tracking(self, fields=None):
         if fields is None or 'system_metadata' in fields:
@@ -301,8 +322,25 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         self = super(Instance, cls)._obj_from_primitive(context, objver,
                                                         primitive)
         self._reset_metadata_tracking()
+        self._deferred_fields = set(
+            primitive.get('nova_object.deferred_fields', []))
         return self
 
+    def obj_to_primitive(self, target_version=None):
+        primitive = super(Instance, self).obj_to_primitive(
+            target_version=target_version)
+        if self._deferred_fields and (
+                target_version is None or
+                utils.convert_version_to_tuple(target_version) >= (1, 21)):
+            primitive['nova_object.deferred_fields'] = sorted(
+                self._deferred_fields)
+        return primitive
+
+    def __deepcopy__(self, memo):
+        nobj = super(Instance, self).__deepcopy__(memo)
+        nobj._deferred_fields = set(self._deferred_fields)
+        return nobj
+
     def obj_make_compatible(self, primitive, target_version):
         super(Instance, self).obj_make_compatible(primitive, target_version)
         target_version = utils.convert_version_to_tuple(target_version)
@@ -474,18 +512,25 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         return migrated_flavor
 
     @staticmethod
-    def _from_db_object(context, instance, db_inst, expected_attrs=None):
+    def _from_db_object(context, instance, db_inst, expected_attrs=None,
+                        expected_fields=None):
         """Method to help with migration to objects.
 
-        Converts a database entity to a formal object.
+        Converts a database entity to a formal object. If expected_fields
+        is given, the database entity may only have those columns, and the
+        other fields are loaded on access.
         """
         instance._context = context
         if expected_attrs is None:
             expected_attrs = []
+        instance._deferred_fields = set()
         # Most of the field names match right now, so be quick
         for field in instance.fields:
             if field in INSTANCE_OPTIONAL_ATTRS:
                 continue
+            elif expected_fields is not None and field not in db_inst:
+                instance._deferred_fields.add(field)
+                continue
             elif field == 'deleted':
                 instance.deleted = db_inst['deleted'] == db_inst['id']
             elif field == 'cleaned':
@@ -911,6 +956,19 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 action='obj_load_attr',
                 reason='loading %s requires recursion' % attrname)
 
+    def _load_deferred_fields(self):
+        """Load at once the column fields left out when querying us."""
+        instance = self.__class__.get_by_uuid(self._context, uuid=self.uuid,
+                                              expected_attrs=[])
+        loaded = [field for field in self.fields
+                  if field not in INSTANCE_OPTIONAL_ATTRS and
+                  not self.obj_attr_is_set(field) and
+                  instance.obj_attr_is_set(field)]
+        for field in loaded:
+            self[field] = instance[field]
+        self.obj_reset_changes(loaded)
+        self._deferred_fields = set()
+
     def _load_fault(self):
         self.fault = objects.InstanceFault.get_latest_for_instance(
             self._context, self.uuid)
@@ -983,7 +1041,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         self.ec2_ids = objects.EC2Ids.get_by_instance(self._context, self)
 
     def obj_load_attr(self, attrname):
-        if attrname not in INSTANCE_OPTIONAL_ATTRS:
+        deferred = attrname in self._deferred_fields
+        if attrname not in INSTANCE_OPTIONAL_ATTRS and not deferred:
             raise exception.ObjectActionError(
                 action='obj_load_attr',
                 reason='attribute %s not lazy-loadable' % attrname)
@@ -1010,7 +1069,10 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
 
         # NOTE(danms): We handle some fields differently here so that we
         # can be more efficient
-        if attrname == 'fault':
+        if deferred:
+            self._load_deferred_fields()
+            return
+        elif attrname == 'fault':
             self._load_fault()
         elif attrname == 'numa_topology':
             self._load_numa_topology()
@@ -1118,7 +1180,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             self._normalize_cell_name()
 
 
-def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
+def _make_instance_list(context, inst_list, db_inst_list, expected_attrs,
+                        expected_fields=None):
     get_fault = expected_attrs and 'fault' in expected_attrs
     inst_faults = {}
     if get_fault:
@@ -1135,7 +1198,8 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
     for db_inst in db_inst_list:
         inst_obj = objects.Instance._from_db_object(
                 context, objects.Instance(context), db_inst,
-                expected_attrs=expected_attrs)
+                expected_attrs=expected_attrs,
+                expected_fields=expected_fields)
         if get_fault:
             inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
         inst_list.objects.append(inst_obj)
@@ -1163,7 +1227,10 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     # Version 1.15: Instance <= version 1.19
     # Version 1.16: Added get_all() method
     # Version 1.17: Instance <= version 1.20
-    VERSION = '1.17'
+    # Version 1.18: Added get_by_hosts() method
+    # Version 1.19: Added expected_fields to get_by_filters and get_by_host
+    # Version 1.20: Instance <= version 1.21
+    VERSION = '1.20'
 
     fields = {
         'objects': fields.ListOfObjectsField('Instance'),
@@ -1187,30 +1254,74 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         '1.15': '1.19',
         '1.16': '1.19',
         '1.17': '1.20',
+        '1.18': '1.20',
+        '1.19': '1.20',
+        '1.20': '1.21',
         }
 
+    def obj_make_compatible(self, primitive, target_version):
+        super(InstanceList, self).obj_make_compatible(primitive,
+                                                      target_version)
+        child_target_version = utils.convert_version_to_tuple(
+            self.child_versions.get(target_version, '1.0'))
+        if child_target_version < (1, 21):
+            # NOTE: The deferred fields are kept outside of the data of the
+            # instances, which Instance.obj_make_compatible() does not see
+            for child in primitive['objects']:
+                child.pop('nova_object.deferred_fields', None)
+
     @base.remotable_classmethod
     def get_by_filters(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
                        marker=None, expected_attrs=None, use_slave=False,
-                       sort_keys=None, sort_dirs=None):
+                       sort_keys=None, sort_dirs=None, expected_fields=None):
+        """Returns the instances matching the filters.
+
+        If expected_fields is given, only those column fields are loaded
+        with the instances, along with id and uuid. The others are loaded
+        on access.
+        """
+        columns = _expected_columns(expected_fields)
+        kwargs = {}
+        if columns is not None:
+            kwargs['columns'] = columns
         if sort_keys or sort_dirs:
             db_inst_list = db.instance_get_all_by_filters_sort(
                 context, filters, limit=limit, marker=marker,
                 columns_to_join=_expected_cols(expected_attrs),
-                use_slave=use_slave, sort_keys=sort_keys, sort_dirs=sort_dirs)
+                use_slave=use_slave, sort_keys=sort_keys, sort_dirs=sort_dirs,
+                **kwargs)
         else:
             db_inst_list = db.instance_get_all_by_filters(
                 context, filters, sort_key, sort_dir, limit=limit,
                 marker=marker, columns_to_join=_expected_cols(expected_attrs),
-                use_slave=use_slave)
+                use_slave=use_slave, **kwargs)
         return _make_instance_list(context, cls(), db_inst_list,
-                                   expected_attrs)
+                                   expected_attrs, expected_fields=columns)
 
     @base.remotable_classmethod
-    def get_by_host(cls, context, host, expected_attrs=None, use_slave=False):
+    def get_by_host(cls, context, host, expected_attrs=None, use_slave=False,
+                    expected_fields=None):
+        """Returns the instances on the host.
+
+        See get_by_filters() for expected_fields.
+        """
+        columns = _expected_columns(expected_fields)
+        kwargs = {}
+        if columns is not None:
+            kwargs['columns'] = columns
         db_inst_list = db.instance_get_all_by_host(
             context, host, columns_to_join=_expected_cols(expected_attrs),
+            use_slave=use_slave, **kwargs)
+        return _make_instance_list(context, cls(), db_inst_list,
+                                   expected_attrs, expected_fields=columns)
+
+    @base.remotable_classmethod
+    def get_by_hosts(cls, context, hosts, expected_attrs=None,
+                     use_slave=False):
+        """Returns the instances on any of the given hosts."""
+        db_inst_list = db.instance_get_all_by_hosts(
+            context, hosts, columns_to_join=_expected_cols(expected_attrs),
             use_slave=use_slave)
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
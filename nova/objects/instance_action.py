@@ -130,6 +130,10 @@ class InstanceActionEvent(base.NovaPersistentObject, base.NovaObject,
     @staticmethod
     def _from_db_object(context, event, db_event):
         for field in event.fields:
+            # NOTE: An event buffered for a bulk write has no id yet, nor
+            # the other columns when only its finish is buffered.
+            if field not in db_event:
+                continue
             event[field] = db_event[field]
         event._context = context
         event.obj_reset_changes()
@@ -50,6 +50,9 @@ class InstanceFault(base.NovaPersistentObject, base.NovaObject,
     def _from_db_object(context, fault, db_fault):
         # NOTE(danms): These are identical right now
         for key in fault.fields:
+            # NOTE: A fault buffered for a bulk write has no id yet.
+            if key == 'id' and 'id' not in db_fault:
+                continue
             fault[key] = db_fault[key]
         fault._context = context
         fault.obj_reset_changes()
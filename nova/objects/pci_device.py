@@ -88,6 +88,7 @@ class PciDevice(base.NovaPersistentObject, base.NovaObject,
     # Version 1.2: added request_id field
     # Version 1.3: Added field to represent PCI device NUMA node
     VERSION = '1.3'
+    obj_compact_storage = True
 
     fields = {
         'id': fields.IntegerField(),
@@ -95,7 +95,10 @@ quota_opts = [
                     'passed since the last reservation'),
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
-               help='Default driver to use for quota checks'),
+               help='Default driver to use for quota checks. '
+                    'nova.quota.OptimisticDbQuotaDriver avoids locking the '
+                    'quota usages of a project while reserving, for '
+                    'projects making many concurrent requests'),
     ]
 
 CONF = cfg.CONF
@@ -577,9 +580,15 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
+        return self._quota_reserve(context, resources, quotas, user_quotas,
+                                   deltas, expire,
+                                   CONF.until_refresh, CONF.max_age,
+                                   project_id=project_id, user_id=user_id)
+
+    def _quota_reserve(self, context, resources, quotas, user_quotas, deltas,
+                       expire, until_refresh, max_age, project_id, user_id):
         return db.quota_reserve(context, resources, quotas, user_quotas,
-                                deltas, expire,
-                                CONF.until_refresh, CONF.max_age,
+                                deltas, expire, until_refresh, max_age,
                                 project_id=project_id, user_id=user_id)
 
     def commit(self, context, reservations, project_id=None, user_id=None):
@@ -690,6 +699,56 @@ class DbQuotaDriver(object):
         db.reservation_expire(context)
 
 
+class OptimisticDbQuotaDriver(DbQuotaDriver):
+    """Driver to perform the quota reservations without locking the quota
+    usages of the project.
+
+    The DbQuotaDriver locks all the quota usages of the project for the
+    whole reservation, so that the concurrent requests of a project
+    serialize on them.  This driver reads the usages without a lock and
+    updates each of them with a single UPDATE, which only applies while the
+    usage still fits the quota.  The project quota, which spans the usages
+    of all the users of the project, is checked once the reservation is
+    visible to the concurrent ones, and the reservation is rolled back if
+    it went over.  The reservations needing a new usage or a refresh of the
+    usage are made with the locking DbQuotaDriver logic.
+    """
+
+    def _quota_reserve(self, context, resources, quotas, user_quotas, deltas,
+                       expire, until_refresh, max_age, project_id, user_id):
+        return db.quota_reserve_optimistic(context, resources, quotas,
+                                           user_quotas, deltas, expire,
+                                           until_refresh, max_age,
+                                           project_id=project_id,
+                                           user_id=user_id)
+
+    def commit(self, context, reservations, project_id=None, user_id=None):
+        """Commit reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, the usages are found from the
+                           reservations.
+        :param user_id: Unused, the usages are found from the
+                        reservations.
+        """
+        db.reservation_commit_optimistic(context, reservations)
+
+    def rollback(self, context, reservations, project_id=None, user_id=None):
+        """Roll back reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, the usages are found from the
+                           reservations.
+        :param user_id: Unused, the usages are found from the
+                        reservations.
+        """
+        db.reservation_rollback_optimistic(context, reservations)
+
+
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
     for all resources are unlimited.  This can be used if you do not
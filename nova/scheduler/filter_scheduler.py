@@ -20,14 +20,17 @@ Weighing Functions.
 """
 
 import random
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
 
 from nova import exception
-from nova.i18n import _
+from nova.i18n import _, _LI
+from nova import objects
 from nova import rpc
 from nova.scheduler import driver
+from nova.scheduler import hash_ring
 from nova.scheduler import scheduler_options
 
 
@@ -44,10 +47,56 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_batch_placement',
+                default=False,
+                help='When several instances are requested at once, only '
+                     'run the filters again on the host chosen for the '
+                     'previous instance, as it is the only one which '
+                     'consumed resources. This assumes that the filters '
+                     'base their decision for a host on that host only, '
+                     'which is the case of the filters included with nova.'),
+    cfg.BoolOpt('scheduler_host_partitioning',
+                default=False,
+                help='When running several schedulers, partition the '
+                     'compute hosts among the schedulers which are up with '
+                     'a consistent hash ring. Each scheduler places the '
+                     'instances on its own compute hosts first, and only '
+                     'looks at the other compute hosts when its own ones '
+                     'cannot fit all the requested instances. This reduces '
+                     'the chances of several schedulers choosing the same '
+                     'host at once.'),
+    cfg.BoolOpt('scheduler_claim_resources',
+                default=False,
+                help='Claim the resources of the instances on the chosen '
+                     'compute nodes in the database before returning them, '
+                     'provided that the compute nodes were not updated since '
+                     'the scheduler read them. When a compute node was '
+                     'updated meanwhile, for instance by another scheduler, '
+                     'it is read again and only kept if it still passes the '
+                     'filters, otherwise the next best host is chosen, '
+                     'rather than failing the claim later on the compute '
+                     'node and rescheduling the instance. The claimed '
+                     'resources are part of the usage of the compute node '
+                     'until its resource tracker next reports its own '
+                     'usage. It must also be set for the compute nodes and '
+                     'the conductors, which otherwise do not maintain the '
+                     'generation of the compute nodes and only write the '
+                     'usage which changed.'),
+    cfg.BoolOpt('scheduler_tracing',
+                default=False,
+                help='Record the time taken to load the host states and by '
+                     'each filter and weigher, along with the number of '
+                     'hosts they were given and returned, for each request. '
+                     'The trace of a request is sent in a '
+                     'scheduler.select_destinations.trace notification, and '
+                     'the totals per filter and weigher are logged each '
+                     'time the periodic tasks of the scheduler run.'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
+CONF.import_opt('host', 'nova.netconf')
+CONF.import_opt('scheduler_topic', 'nova.scheduler.rpcapi')
 
 
 class FilterScheduler(driver.Scheduler):
@@ -56,6 +105,24 @@ class FilterScheduler(driver.Scheduler):
         super(FilterScheduler, self).__init__(*args, **kwargs)
         self.options = scheduler_options.SchedulerOptions()
         self.notifier = rpc.get_notifier('scheduler')
+        self.hash_ring = None
+        self.trace_stats = {}
+
+    def run_periodic_tasks(self, context):
+        """Called from a periodic task in the manager."""
+        if CONF.scheduler_host_partitioning:
+            self._update_hash_ring(context.elevated())
+        if CONF.scheduler_tracing:
+            self._log_trace_stats()
+
+    def _update_hash_ring(self, context):
+        """Rebuilds the hash ring if the schedulers which are up changed."""
+        schedulers = frozenset(self.hosts_up(context, CONF.scheduler_topic))
+        if self.hash_ring is not None and self.hash_ring.members == schedulers:
+            return
+        LOG.info(_LI("Partitioning the compute hosts among the schedulers: "
+                     "%s"), ', '.join(sorted(schedulers)))
+        self.hash_ring = hash_ring.HashRing(schedulers)
 
     def select_destinations(self, context, request_spec, filter_properties):
         """Selects a filtered set of hosts and nodes."""
@@ -63,8 +130,12 @@ class FilterScheduler(driver.Scheduler):
                            dict(request_spec=request_spec))
 
         num_instances = request_spec['num_instances']
-        selected_hosts = self._schedule(context, request_spec,
-                                        filter_properties)
+        if CONF.scheduler_tracing:
+            selected_hosts = self._traced_schedule(context, request_spec,
+                                                   filter_properties)
+        else:
+            selected_hosts = self._schedule(context, request_spec,
+                                            filter_properties)
 
         # Couldn't fulfill the request_spec
         if len(selected_hosts) < num_instances:
@@ -86,6 +157,55 @@ class FilterScheduler(driver.Scheduler):
                            dict(request_spec=request_spec))
         return dests
 
+    def _traced_schedule(self, context, request_spec, filter_properties):
+        """Runs _schedule while tracing the time spent in each step of the
+        request, then sends the trace in a notification and adds it to the
+        totals of this scheduler.
+        """
+        trace = []
+        filter_properties['scheduler_trace'] = trace
+        start = time.time()
+        selected_hosts = []
+        try:
+            selected_hosts = self._schedule(context, request_spec,
+                                            filter_properties)
+        finally:
+            elapsed = time.time() - start
+            del filter_properties['scheduler_trace']
+            self._add_trace_stats(trace)
+            self.notifier.info(context, 'scheduler.select_destinations.trace',
+                               dict(request_spec=request_spec,
+                                    num_selected=len(selected_hosts),
+                                    elapsed=elapsed,
+                                    trace=trace))
+        return selected_hosts
+
+    def _add_trace_stats(self, trace):
+        """Adds the steps of a request trace to the totals per step."""
+        for step in trace:
+            kind = next(kind for kind in ('filter', 'weigher', 'host_states')
+                        if kind in step)
+            key = (kind, step[kind])
+            stats = self.trace_stats.setdefault(
+                key, {'count': 0, 'elapsed': 0.0, 'hosts_in': 0,
+                      'hosts_out': 0})
+            stats['count'] += 1
+            stats['elapsed'] += step['elapsed']
+            stats['hosts_in'] += step.get('hosts_in', 0)
+            # Weighers don't remove any host
+            stats['hosts_out'] += step.get('hosts_out',
+                                           step.get('hosts_in', 0))
+
+    def _log_trace_stats(self):
+        """Logs and resets the totals per step since the previous call."""
+        trace_stats, self.trace_stats = self.trace_stats, {}
+        for (kind, name), stats in sorted(
+                trace_stats.items(), key=lambda item: -item[1]['elapsed']):
+            LOG.info(_LI("Scheduler %(kind)s %(name)s ran %(count)d times in "
+                         "%(elapsed).3f seconds, for %(hosts_in)d hosts in "
+                         "and %(hosts_out)d hosts out"),
+                     dict(stats, kind=kind, name=name))
+
     def _get_configuration_options(self):
         """Fetch options dictionary. Broken out for testing."""
         return self.options.get_configuration()
@@ -108,8 +228,6 @@ class FilterScheduler(driver.Scheduler):
         instance_properties = request_spec['instance_properties']
         instance_type = request_spec.get("instance_type", None)
 
-        update_group_hosts = filter_properties.get('group_updated', False)
-
         config_options = self._get_configuration_options()
 
         filter_properties.update({'context': context,
@@ -128,14 +246,73 @@ class FilterScheduler(driver.Scheduler):
         # Note: remember, we are using an iterator here. So only
         # traverse this list once. This can bite you if the hosts
         # are being scanned in a filter or weighing function.
+        trace = filter_properties.get('scheduler_trace')
+        start = time.time()
         hosts = self._get_all_host_states(elevated)
+        if trace is not None:
+            hosts = list(hosts)
+            trace.append({'host_states': self.__class__.__name__,
+                          'hosts_out': len(hosts),
+                          'elapsed': time.time() - start})
 
-        selected_hosts = []
         num_instances = request_spec.get('num_instances', 1)
+        if not self._is_partitioned():
+            return self._select_hosts(elevated, hosts, instance_properties,
+                                      filter_properties, num_instances)
+
+        own_hosts, other_hosts = self._partition_hosts(hosts)
+        selected_hosts = self._select_hosts(elevated, own_hosts,
+                                            instance_properties,
+                                            filter_properties, num_instances)
+        if len(selected_hosts) < num_instances and other_hosts:
+            LOG.debug("Only %(selected)d of %(num_instances)d instances fit "
+                      "on the hosts of this scheduler, looking at the hosts "
+                      "of the other schedulers.",
+                      {'selected': len(selected_hosts),
+                       'num_instances': num_instances})
+            selected_hosts += self._select_hosts(
+                elevated, other_hosts, instance_properties, filter_properties,
+                num_instances - len(selected_hosts))
+        return selected_hosts
+
+    def _is_partitioned(self):
+        """Returns True if this scheduler owns a partition of the hosts."""
+        return (CONF.scheduler_host_partitioning and
+                self.hash_ring is not None and
+                CONF.host in self.hash_ring.members)
+
+    def _partition_hosts(self, hosts):
+        """Splits the hosts into the ones owned by this scheduler and the
+        ones owned by the other schedulers.
+
+        All the nodes of a compute host belong to the same scheduler.
+        """
+        own_hosts = []
+        other_hosts = []
+        for host_state in hosts:
+            if self.hash_ring.get_member(host_state.host) == CONF.host:
+                own_hosts.append(host_state)
+            else:
+                other_hosts.append(host_state)
+        return own_hosts, other_hosts
+
+    def _select_hosts(self, context, hosts, instance_properties,
+                      filter_properties, num_instances):
+        """Chooses a host for each instance, or less hosts if the
+        instances cannot all fit on the given hosts.
+        """
+        update_group_hosts = filter_properties.get('group_updated', False)
+
+        selected_hosts = []
+        chosen_host = None
         for num in xrange(num_instances):
             # Filter local hosts based on requirements ...
-            hosts = self.host_manager.get_filtered_hosts(hosts,
-                    filter_properties, index=num)
+            if self._can_filter_chosen_host_only(num, update_group_hosts):
+                hosts = self._filter_chosen_host(hosts, chosen_host.obj,
+                                                 filter_properties, num)
+            else:
+                hosts = self.host_manager.get_filtered_hosts(hosts,
+                        filter_properties, index=num)
             if not hosts:
                 # Can't get any more locally.
                 break
@@ -147,15 +324,15 @@ class FilterScheduler(driver.Scheduler):
 
             LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
 
-            scheduler_host_subset_size = CONF.scheduler_host_subset_size
-            if scheduler_host_subset_size > len(weighed_hosts):
-                scheduler_host_subset_size = len(weighed_hosts)
-            if scheduler_host_subset_size < 1:
-                scheduler_host_subset_size = 1
-
-            chosen_host = random.choice(
-                weighed_hosts[0:scheduler_host_subset_size])
-            LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+            chosen_host = self._choose_host(context, weighed_hosts,
+                                            instance_properties,
+                                            filter_properties, num,
+                                            selected_hosts)
+            if len(weighed_hosts) < len(hosts):
+                # Forget the hosts which changed since they were read
+                hosts = [weighed_host.obj for weighed_host in weighed_hosts]
+            if chosen_host is None:
+                break
             selected_hosts.append(chosen_host)
 
             # Now consume the resources so the filter/weights
@@ -171,6 +348,111 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].add(chosen_host.obj.host)
         return selected_hosts
 
+    def _choose_host(self, context, weighed_hosts, instance_properties,
+                     filter_properties, index, selected_hosts):
+        """Chooses randomly one of the best weighed hosts.
+
+        The resources of the instance are claimed on the chosen host. If that
+        fails because the host changed since it was read, the host is read
+        again and claimed again if it still passes the filters, otherwise it
+        is removed from weighed_hosts and another one is chosen. Returns None
+        when no host is left.
+        """
+        refreshed_hosts = set()
+        while weighed_hosts:
+            scheduler_host_subset_size = CONF.scheduler_host_subset_size
+            if scheduler_host_subset_size > len(weighed_hosts):
+                scheduler_host_subset_size = len(weighed_hosts)
+            if scheduler_host_subset_size < 1:
+                scheduler_host_subset_size = 1
+
+            chosen_host = random.choice(
+                weighed_hosts[0:scheduler_host_subset_size])
+            if self._claim_resources(context, chosen_host.obj,
+                                     instance_properties):
+                LOG.debug("Selected host: %(host)s", {'host': chosen_host})
+                return chosen_host
+
+            host_state = chosen_host.obj
+            # The hosts already selected for this request hold local usage
+            # which reading them again would lose
+            if (host_state not in refreshed_hosts and
+                    all(selected_host.obj is not host_state
+                        for selected_host in selected_hosts)):
+                refreshed_hosts.add(host_state)
+                if self._refresh_host_state(context, host_state,
+                                            filter_properties, index):
+                    LOG.debug("Host %(host)s changed since it was read but "
+                              "still passes the filters.",
+                              {'host': chosen_host})
+                    continue
+
+            LOG.debug("Host %(host)s changed since it was read, choosing "
+                      "another host.", {'host': chosen_host})
+            weighed_hosts.remove(chosen_host)
+        return None
+
+    def _refresh_host_state(self, context, host_state, filter_properties,
+                            index):
+        """Reads again the compute node of a host state and returns True if
+        the host still passes the filters.
+        """
+        try:
+            compute = objects.ComputeNode.get_by_id(
+                context, host_state.compute_node_id)
+        except exception.ComputeHostNotFound:
+            return False
+        # The compute node is newer than the host state, even when the host
+        # state was consumed from locally after the compute node was updated
+        host_state.updated = None
+        host_state.update_from_compute_node(compute)
+        return bool(self.host_manager.get_filtered_hosts(
+            [host_state], filter_properties, index=index))
+
+    def _claim_resources(self, context, host_state, instance_properties):
+        """Claims the resources of the instance on the compute node in the
+        database, unless it was updated since the host state was read.
+
+        Returns True if the resources were claimed or don't need to be.
+        """
+        if not CONF.scheduler_claim_resources or host_state.generation is None:
+            return True
+        local_gb = (instance_properties['root_gb'] +
+                    instance_properties['ephemeral_gb'])
+        claimed = objects.ComputeNode.claim_resources(
+            context, host_state.compute_node_id, host_state.generation,
+            instance_properties['vcpus'], instance_properties['memory_mb'],
+            local_gb)
+        if claimed:
+            # Only this claim changed the compute node, so the resources of
+            # the next instances can be claimed on top of it
+            host_state.generation += 1
+        return claimed
+
+    def _can_filter_chosen_host_only(self, index, update_group_hosts):
+        """Returns True if only the previously chosen host must be filtered.
+
+        The other hosts did not change since they passed the filters for the
+        previous instance, so they still pass them unless a filter which did
+        not run for the previous instance has to run for this one. Updating
+        the group hosts changes the result of the (anti-)affinity filters for
+        all the hosts, so they all have to be filtered again in that case.
+        """
+        if (not CONF.scheduler_batch_placement or index == 0 or
+                update_group_hosts is True):
+            return False
+        return all(host_filter.run_filter_for_index(index - 1)
+                   for host_filter in self.host_manager.default_filters
+                   if host_filter.run_filter_for_index(index))
+
+    def _filter_chosen_host(self, hosts, chosen_host, filter_properties,
+                            index):
+        """Filters the chosen host again and returns the remaining hosts."""
+        if self.host_manager.get_filtered_hosts([chosen_host],
+                filter_properties, index=index):
+            return hosts
+        return [host for host in hosts if host is not chosen_host]
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
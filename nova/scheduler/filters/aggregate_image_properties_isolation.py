@@ -64,3 +64,32 @@ class AggregateImagePropertiesIsolation(filters.BaseHostFilter):
                            'options': options})
                 return False
         return True
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts whose aggregates match the image properties.
+
+        The hosts having a different value for an image property are looked
+        up once in the aggregate index when the host manager provides it.
+        """
+        index = filter_properties.get('aggregate_index')
+        if index is None:
+            return super(AggregateImagePropertiesIsolation, self).filter_all(
+                filter_obj_list, filter_properties)
+
+        cfg_namespace = CONF.aggregate_image_properties_isolation_namespace
+        cfg_separator = CONF.aggregate_image_properties_isolation_separator
+
+        spec = filter_properties.get('request_spec', {})
+        image_props = spec.get('image', {}).get('properties', {})
+
+        failing_hosts = set()
+        for key in index.keys():
+            if (cfg_namespace and
+                    not key.startswith(cfg_namespace + cfg_separator)):
+                continue
+            prop = image_props.get(key)
+            if prop:
+                failing_hosts.update(index.get_hosts_with_key(key) -
+                                     index.get_hosts(key, prop))
+        return (host_state for host_state in filter_obj_list
+                if host_state.host not in failing_hosts)
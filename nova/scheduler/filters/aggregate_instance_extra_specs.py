@@ -32,6 +32,19 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
     # Aggregate data and instance type does not change within a request
     run_filter_once_per_request = True
 
+    @staticmethod
+    def _scoped_extra_specs(instance_type):
+        """Yield the extra specs to match against the aggregate metadata."""
+        for key, req in instance_type['extra_specs'].iteritems():
+            # Either not scope format, or aggregate_instance_extra_specs scope
+            scope = key.split(':', 1)
+            if len(scope) > 1:
+                if scope[0] != _SCOPE:
+                    continue
+                else:
+                    del scope[0]
+            yield scope[0], req
+
     def host_passes(self, host_state, filter_properties):
         """Return a list of hosts that can create instance_type
 
@@ -44,15 +57,7 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
 
         metadata = utils.aggregate_metadata_get_by_host(host_state)
 
-        for key, req in instance_type['extra_specs'].iteritems():
-            # Either not scope format, or aggregate_instance_extra_specs scope
-            scope = key.split(':', 1)
-            if len(scope) > 1:
-                if scope[0] != _SCOPE:
-                    continue
-                else:
-                    del scope[0]
-            key = scope[0]
+        for key, req in self._scoped_extra_specs(instance_type):
             aggregate_vals = metadata.get(key, None)
             if not aggregate_vals:
                 LOG.debug("%(host_state)s fails instance_type extra_specs "
@@ -70,3 +75,30 @@ class AggregateInstanceExtraSpecsFilter(filters.BaseHostFilter):
                            'aggregate_vals': aggregate_vals})
                 return False
         return True
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts whose aggregates match the extra specs.
+
+        The hosts matching each extra spec are looked up once in the
+        aggregate index when the host manager provides it.
+        """
+        index = filter_properties.get('aggregate_index')
+        instance_type = filter_properties.get('instance_type')
+        if index is None or 'extra_specs' not in instance_type:
+            return super(AggregateInstanceExtraSpecsFilter, self).filter_all(
+                filter_obj_list, filter_properties)
+
+        matching_hosts = None
+        for key, req in self._scoped_extra_specs(instance_type):
+            key_hosts = set()
+            for value, hosts in index.get_hosts_by_value(key).iteritems():
+                if extra_specs_ops.match(value, req):
+                    key_hosts.update(hosts)
+            if matching_hosts is None:
+                matching_hosts = key_hosts
+            else:
+                matching_hosts &= key_hosts
+        if matching_hosts is None:
+            return filter_obj_list
+        return (host_state for host_state in filter_obj_list
+                if host_state.host in matching_hosts)
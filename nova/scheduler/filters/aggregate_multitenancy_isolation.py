@@ -48,3 +48,24 @@ class AggregateMultiTenancyIsolation(filters.BaseHostFilter):
                 LOG.debug("%s fails tenant id on aggregate", host_state)
                 return False
         return True
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts which are not isolated to other tenants.
+
+        The isolated hosts are looked up once in the aggregate index when the
+        host manager provides it.
+        """
+        index = filter_properties.get('aggregate_index')
+        if index is None:
+            return super(AggregateMultiTenancyIsolation, self).filter_all(
+                filter_obj_list, filter_properties)
+
+        spec = filter_properties.get('request_spec', {})
+        props = spec.get('instance_properties', {})
+        tenant_id = props.get('project_id')
+
+        tenant_hosts = index.get_hosts('filter_tenant_id', tenant_id)
+        isolated_hosts = index.get_hosts_with_key('filter_tenant_id')
+        return (host_state for host_state in filter_obj_list
+                if host_state.host in tenant_hosts or
+                host_state.host not in isolated_hosts)
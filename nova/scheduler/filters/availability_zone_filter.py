@@ -62,3 +62,28 @@ class AvailabilityZoneFilter(filters.BaseHostFilter):
                        'host_az': host_az})
 
         return hosts_passes
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts in the requested availability zone.
+
+        The hosts of the availability zone are looked up once in the
+        aggregate index when the host manager provides it.
+        """
+        index = filter_properties.get('aggregate_index')
+        spec = filter_properties.get('request_spec', {})
+        props = spec.get('instance_properties', {})
+        availability_zone = props.get('availability_zone')
+
+        if index is None or not availability_zone:
+            return super(AvailabilityZoneFilter, self).filter_all(
+                filter_obj_list, filter_properties)
+
+        az_hosts = index.get_hosts('availability_zone', availability_zone)
+        if availability_zone != CONF.default_availability_zone:
+            return (host_state for host_state in filter_obj_list
+                    if host_state.host in az_hosts)
+        # Hosts which are not in any availability zone are in the default one
+        hosts_with_az = index.get_hosts_with_key('availability_zone')
+        return (host_state for host_state in filter_obj_list
+                if host_state.host in az_hosts or
+                host_state.host not in hosts_with_az)
@@ -40,20 +40,12 @@ class BaseCoreFilter(filters.BaseHostFilter):
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         raise NotImplementedError
 
-    def host_passes(self, host_state, filter_properties):
-        """Return True if host has sufficient CPU cores."""
-        instance_type = filter_properties.get('instance_type')
-        if not instance_type:
-            return True
-
+    def _host_passes(self, host_state, instance_vcpus, cpu_allocation_ratio):
         if not host_state.vcpus_total:
             # Fail safe
             LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
             return True
 
-        instance_vcpus = instance_type['vcpus']
-        cpu_allocation_ratio = self._get_cpu_allocation_ratio(host_state,
-                                                          filter_properties)
         vcpus_total = host_state.vcpus_total * cpu_allocation_ratio
 
         # Only provide a VCPU limit to compute if the virt driver is reporting
@@ -73,6 +65,17 @@ class BaseCoreFilter(filters.BaseHostFilter):
 
         return True
 
+    def host_passes(self, host_state, filter_properties):
+        """Return True if host has sufficient CPU cores."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return True
+
+        cpu_allocation_ratio = self._get_cpu_allocation_ratio(host_state,
+                                                          filter_properties)
+        return self._host_passes(host_state, instance_type['vcpus'],
+                                 cpu_allocation_ratio)
+
 
 class CoreFilter(BaseCoreFilter):
     """CoreFilter filters based on CPU core utilization."""
@@ -80,6 +83,35 @@ class CoreFilter(BaseCoreFilter):
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         return CONF.cpu_allocation_ratio
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with sufficient CPU cores.
+
+        The allocation ratio doesn't depend on the host, so it is only looked
+        up once for all the hosts, unless a subclass looks it up per host
+        or checks the hosts itself.
+        """
+        if utils.method_overridden(self, CoreFilter,
+                                   '_get_cpu_allocation_ratio',
+                                   'host_passes'):
+            for host_state in super(CoreFilter, self).filter_all(
+                    filter_obj_list, filter_properties):
+                yield host_state
+            return
+
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            for host_state in filter_obj_list:
+                yield host_state
+            return
+
+        instance_vcpus = instance_type['vcpus']
+        cpu_allocation_ratio = self._get_cpu_allocation_ratio(
+            None, filter_properties)
+        for host_state in filter_obj_list:
+            if self._host_passes(host_state, instance_vcpus,
+                                 cpu_allocation_ratio):
+                yield host_state
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
@@ -35,19 +35,17 @@ class DiskFilter(filters.BaseHostFilter):
     def _get_disk_allocation_ratio(self, host_state, filter_properties):
         return CONF.disk_allocation_ratio
 
-    def host_passes(self, host_state, filter_properties):
-        """Filter based on disk usage."""
+    @staticmethod
+    def _requested_disk(filter_properties):
         instance_type = filter_properties.get('instance_type')
-        requested_disk = (1024 * (instance_type['root_gb'] +
-                                 instance_type['ephemeral_gb']) +
-                         instance_type['swap'])
+        return (1024 * (instance_type['root_gb'] +
+                        instance_type['ephemeral_gb']) +
+                instance_type['swap'])
 
+    def _host_passes(self, host_state, requested_disk, disk_allocation_ratio):
         free_disk_mb = host_state.free_disk_mb
         total_usable_disk_mb = host_state.total_usable_disk_gb * 1024
 
-        disk_allocation_ratio = self._get_disk_allocation_ratio(
-            host_state, filter_properties)
-
         disk_mb_limit = total_usable_disk_mb * disk_allocation_ratio
         used_disk_mb = total_usable_disk_mb - free_disk_mb
         usable_disk_mb = disk_mb_limit - used_disk_mb
@@ -64,6 +62,37 @@ class DiskFilter(filters.BaseHostFilter):
         host_state.limits['disk_gb'] = disk_gb_limit
         return True
 
+    def host_passes(self, host_state, filter_properties):
+        """Filter based on disk usage."""
+        disk_allocation_ratio = self._get_disk_allocation_ratio(
+            host_state, filter_properties)
+        return self._host_passes(host_state,
+                                 self._requested_disk(filter_properties),
+                                 disk_allocation_ratio)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with sufficient disk space.
+
+        The allocation ratio doesn't depend on the host, so it is only looked
+        up once for all the hosts, unless a subclass looks it up per host
+        or checks the hosts itself.
+        """
+        if utils.method_overridden(self, DiskFilter,
+                                   '_get_disk_allocation_ratio',
+                                   'host_passes'):
+            for host_state in super(DiskFilter, self).filter_all(
+                    filter_obj_list, filter_properties):
+                yield host_state
+            return
+
+        requested_disk = self._requested_disk(filter_properties)
+        disk_allocation_ratio = self._get_disk_allocation_ratio(
+            None, filter_properties)
+        for host_state in filter_obj_list:
+            if self._host_passes(host_state, requested_disk,
+                                 disk_allocation_ratio):
+                yield host_state
+
 
 class AggregateDiskFilter(DiskFilter):
     """AggregateDiskFilter with per-aggregate disk allocation ratio flag.
@@ -39,14 +39,8 @@ class IoOpsFilter(filters.BaseHostFilter):
     def _get_max_io_ops_per_host(self, host_state, filter_properties):
         return CONF.max_io_ops_per_host
 
-    def host_passes(self, host_state, filter_properties):
-        """Use information about current vm and task states collected from
-        compute node statistics to decide whether to filter.
-        """
-        num_io_ops = host_state.num_io_ops
-        max_io_ops = self._get_max_io_ops_per_host(
-            host_state, filter_properties)
-        passes = num_io_ops < max_io_ops
+    def _host_passes(self, host_state, max_io_ops):
+        passes = host_state.num_io_ops < max_io_ops
         if not passes:
             LOG.debug("%(host_state)s fails I/O ops check: Max IOs per host "
                         "is set to %(max_io_ops)s",
@@ -54,6 +48,34 @@ class IoOpsFilter(filters.BaseHostFilter):
                          'max_io_ops': max_io_ops})
         return passes
 
+    def host_passes(self, host_state, filter_properties):
+        """Use information about current vm and task states collected from
+        compute node statistics to decide whether to filter.
+        """
+        max_io_ops = self._get_max_io_ops_per_host(
+            host_state, filter_properties)
+        return self._host_passes(host_state, max_io_ops)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with less I/O operations than the maximum.
+
+        The maximum doesn't depend on the host, so it is only looked up once
+        for all the hosts, unless a subclass looks it up per host or
+        checks the hosts itself.
+        """
+        if utils.method_overridden(self, IoOpsFilter,
+                                   '_get_max_io_ops_per_host',
+                                   'host_passes'):
+            for host_state in super(IoOpsFilter, self).filter_all(
+                    filter_obj_list, filter_properties):
+                yield host_state
+            return
+
+        max_io_ops = self._get_max_io_ops_per_host(None, filter_properties)
+        for host_state in filter_obj_list:
+            if self._host_passes(host_state, max_io_ops):
+                yield host_state
+
 
 class AggregateIoOpsFilter(IoOpsFilter):
     """AggregateIoOpsFilter with per-aggregate the max io operations.
@@ -36,11 +36,8 @@ class NumInstancesFilter(filters.BaseHostFilter):
     def _get_max_instances_per_host(self, host_state, filter_properties):
         return CONF.max_instances_per_host
 
-    def host_passes(self, host_state, filter_properties):
-        num_instances = host_state.num_instances
-        max_instances = self._get_max_instances_per_host(
-            host_state, filter_properties)
-        passes = num_instances < max_instances
+    def _host_passes(self, host_state, max_instances):
+        passes = host_state.num_instances < max_instances
         if not passes:
             LOG.debug("%(host_state)s fails num_instances check: Max "
                         "instances per host is set to %(max_instances)s",
@@ -48,6 +45,32 @@ class NumInstancesFilter(filters.BaseHostFilter):
                          'max_instances': max_instances})
         return passes
 
+    def host_passes(self, host_state, filter_properties):
+        max_instances = self._get_max_instances_per_host(
+            host_state, filter_properties)
+        return self._host_passes(host_state, max_instances)
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts with less instances than the maximum.
+
+        The maximum doesn't depend on the host, so it is only looked up once
+        for all the hosts, unless a subclass looks it up per host or
+        checks the hosts itself.
+        """
+        if utils.method_overridden(self, NumInstancesFilter,
+                                   '_get_max_instances_per_host',
+                                   'host_passes'):
+            for host_state in super(NumInstancesFilter, self).filter_all(
+                    filter_obj_list, filter_properties):
+                yield host_state
+            return
+
+        max_instances = self._get_max_instances_per_host(None,
+                                                         filter_properties)
+        for host_state in filter_obj_list:
+            if self._host_passes(host_state, max_instances):
+                yield host_state
+
 
 class AggregateNumInstancesFilter(NumInstancesFilter):
     """AggregateNumInstancesFilter with per-aggregate the max num instances.
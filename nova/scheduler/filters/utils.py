@@ -48,6 +48,54 @@ def aggregate_metadata_get_by_host(host_state, key=None):
     return metadata
 
 
+class AggregateMetadataIndex(object):
+    """Inverted index of the aggregate metadata.
+
+    Maps each metadata key and value to the names of the hosts belonging to
+    an aggregate with that metadata, so that the filters can look up the
+    hosts matching a request once instead of going through the aggregates
+    of every host. The values are split and stripped the same way as by
+    aggregate_metadata_get_by_host(). The returned sets must not be
+    modified.
+    """
+
+    def __init__(self, aggregates=()):
+        self.rebuild(aggregates)
+
+    def rebuild(self, aggregates):
+        """Replaces the content of the index with the given aggregates."""
+        hosts_by_metadata = {}
+        hosts_by_key = {}
+        for aggr in aggregates:
+            # The metadata of an aggregate may be unset or None
+            if not aggr.obj_attr_is_set('metadata') or not aggr.metadata:
+                continue
+            for k, v in aggr.metadata.iteritems():
+                hosts_by_value = hosts_by_metadata.setdefault(k, {})
+                for value in v.split(','):
+                    hosts_by_value.setdefault(value.strip(), set()).update(
+                        aggr.hosts)
+                hosts_by_key.setdefault(k, set()).update(aggr.hosts)
+        self._hosts_by_metadata = hosts_by_metadata
+        self._hosts_by_key = hosts_by_key
+
+    def get_hosts_by_value(self, key):
+        """Returns a dict of the hosts having the key, keyed by value."""
+        return self._hosts_by_metadata.get(key, {})
+
+    def get_hosts(self, key, value):
+        """Returns the hosts having the value for the key."""
+        return self.get_hosts_by_value(key).get(value, frozenset())
+
+    def get_hosts_with_key(self, key):
+        """Returns the hosts having any value for the key."""
+        return self._hosts_by_key.get(key, frozenset())
+
+    def keys(self):
+        """Returns the metadata keys set on the aggregates."""
+        return self._hosts_by_key.keys()
+
+
 def validate_num_values(vals, default=None, cast_to=int, based_on=min):
     """Returns a correctly casted value based on a set of values.
 
@@ -94,3 +142,14 @@ def other_types_on_host(host_state, instance_type_id):
     host_types = set([inst.instance_type_id for inst in host_instances])
     inst_set = set([instance_type_id])
     return bool(host_types - inst_set)
+
+
+def method_overridden(obj, cls, *names):
+    """Tests whether the class of obj overrides any of the methods of cls.
+
+    Returns True if obj gets any of the methods named from a subclass of cls
+    rather than from cls itself.
+    """
+    return any(six.get_unbound_function(getattr(type(obj), name)) is not
+               six.get_unbound_function(getattr(cls, name))
+               for name in names)
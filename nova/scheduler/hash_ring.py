@@ -0,0 +1,54 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Consistent hash ring used to partition the compute hosts among the
+schedulers.
+"""
+
+import bisect
+import hashlib
+
+import six
+
+
+class HashRing(object):
+    """Maps keys onto a set of members.
+
+    Each member is placed several times on the ring so that the keys are
+    evenly spread among the members, and only the keys of a member are
+    moved to the other members when it leaves the ring.
+    """
+
+    def __init__(self, members, replicas=100):
+        self.members = frozenset(members)
+        ring = sorted((self._hash('%s-%d' % (member, replica)), member)
+                      for member in self.members
+                      for replica in xrange(replicas))
+        self._hashes = [key_hash for key_hash, _member in ring]
+        self._ring_members = [member for _key_hash, member in ring]
+
+    @staticmethod
+    def _hash(key):
+        if isinstance(key, six.text_type):
+            key = key.encode('utf-8')
+        return int(hashlib.md5(key).hexdigest(), 16)
+
+    def get_member(self, key):
+        """Returns the member owning the key, or None if the ring is empty."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key))
+        return self._ring_members[index % len(self._hashes)]
@@ -35,6 +35,7 @@ from nova.i18n import _, _LI, _LW
 from nova import objects
 from nova.pci import stats as pci_stats
 from nova.scheduler import filters
+from nova.scheduler.filters import utils as filters_utils
 from nova.scheduler import weights
 from nova import utils
 from nova.virt import hardware
@@ -66,6 +67,14 @@ host_manager_opts = [
                default=True,
                help='Determines if the Scheduler tracks changes to instances '
                     'to help with its filtering decisions.'),
+    cfg.IntOpt('scheduler_host_state_refresh_interval',
+               default=0,
+               help='Interval in seconds between two full reloads of the '
+                    'compute nodes by the Scheduler. In between, only the '
+                    'compute nodes which were created, updated or deleted '
+                    'since the previous request are fetched from the '
+                    'database and applied to the cached host states. Set to '
+                    '0 to reload all the compute nodes on every request.'),
 ]
 
 CONF = cfg.CONF
@@ -73,6 +82,8 @@ CONF.register_opts(host_manager_opts)
 
 LOG = logging.getLogger(__name__)
 HOST_INSTANCE_SEMAPHORE = "host_instance"
+# Number of hosts whose instances are loaded with a single DB query
+INSTANCE_BATCH_SIZE = 100
 
 
 class ReadOnlyDict(UserDict.IterableUserDict):
@@ -152,6 +163,10 @@ class HostState(object):
         # Instances on this host
         self.instances = {}
 
+        # ID and generation of the compute node, used for claiming resources
+        self.compute_node_id = None
+        self.generation = None
+
         self.updated = None
         if compute:
             self.update_from_compute_node(compute)
@@ -211,6 +226,12 @@ class HostState(object):
         self.vcpus_total = compute.vcpus
         self.vcpus_used = compute.vcpus_used
         self.updated = compute.updated_at
+        # The compute nodes sent by older conductors have no generation, and
+        # it is None until the node is updated after an upgrade. No resources
+        # are claimed by the scheduler in both cases.
+        if compute.obj_attr_is_set('generation'):
+            self.compute_node_id = compute.id
+            self.generation = compute.generation
         self.numa_topology = compute.numa_topology
         self.pci_stats = pci_stats.PciDeviceStats(
             compute.pci_device_pools)
@@ -325,7 +346,16 @@ class HostManager(object):
         # Dict of set of aggregate IDs keyed by the name of the host belonging
         # to those aggregates
         self.host_aggregates_map = collections.defaultdict(set)
+        # Inverted index of the aggregate metadata, used by the filters
+        self.aggregate_index = filters_utils.AggregateMetadataIndex()
         self._init_aggregates()
+        # Dict of ComputeNode objects keyed by (host, nodename), only kept
+        # when the compute nodes are incrementally refreshed
+        self._compute_nodes = {}
+        # Most recent compute node timestamp seen in the DB, used for
+        # fetching the compute nodes changed since the previous refresh
+        self._compute_nodes_generation = None
+        self._last_full_refresh = None
         self.tracks_instance_changes = CONF.scheduler_tracks_instance_changes
         # Dict of instances and status, keyed by host
         self._instance_info = {}
@@ -342,6 +372,7 @@ class HostManager(object):
             self.aggs_by_id[agg.id] = agg
             for host in agg.hosts:
                 self.host_aggregates_map[host].add(agg.id)
+        self.aggregate_index.rebuild(self.aggs_by_id.values())
 
     def update_aggregates(self, aggregates):
         """Updates internal HostManager information about aggregates."""
@@ -350,6 +381,7 @@ class HostManager(object):
                 self._update_aggregate(agg)
         else:
             self._update_aggregate(aggregates)
+        self.aggregate_index.rebuild(self.aggs_by_id.values())
 
     def _update_aggregate(self, aggregate):
         self.aggs_by_id[aggregate.id] = aggregate
@@ -370,6 +402,7 @@ class HostManager(object):
         for host in aggregate.hosts:
             if aggregate.id in self.host_aggregates_map[host]:
                 self.host_aggregates_map[host].remove(aggregate.id)
+        self.aggregate_index.rebuild(self.aggs_by_id.values())
 
     def _init_instance_info(self):
         """Creates the initial view of instances for all hosts.
@@ -386,36 +419,38 @@ class HostManager(object):
             self._instance_info = {}
             compute_nodes = objects.ComputeNodeList.get_all(context).objects
             LOG.debug("Total number of compute nodes: %s", len(compute_nodes))
-            # Break the queries into batches of 10 to reduce the total number
-            # of calls to the DB.
-            batch_size = 10
-            start_node = 0
-            end_node = batch_size
-            while start_node <= len(compute_nodes):
-                curr_nodes = compute_nodes[start_node:end_node]
-                start_node += batch_size
-                end_node += batch_size
-                filters = {"host": [curr_node.host
-                                    for curr_node in curr_nodes]}
-                result = objects.InstanceList.get_by_filters(context,
-                                                             filters)
-                instances = result.objects
-                LOG.debug("Adding %s instances for hosts %s-%s",
-                          len(instances), start_node, end_node)
-                for instance in instances:
-                    host = instance.host
-                    if host not in self._instance_info:
-                        self._instance_info[host] = {"instances": {},
-                                                     "updated": False}
-                    inst_dict = self._instance_info[host]
-                    inst_dict["instances"][instance.uuid] = instance
-                # Call sleep() to cooperatively yield
-                time.sleep(0)
+            instances_by_host = self._get_instances_by_host(
+                context, [compute.host for compute in compute_nodes])
+            for host, instances in instances_by_host.iteritems():
+                if host not in self._instance_info:
+                    self._instance_info[host] = {"instances": {},
+                                                 "updated": False}
+                self._instance_info[host]["instances"].update(instances)
             LOG.debug("END:_async_init_instance_info")
 
         # Run this async so that we don't block the scheduler start-up
         utils.spawn_n(_async_init_instance_info)
 
+    def _get_instances_by_host(self, context, hosts):
+        """Returns the instances of the hosts as dicts keyed by uuid, keyed
+        by host.
+
+        The instances of INSTANCE_BATCH_SIZE hosts are loaded with a single
+        DB query, instead of one query per host.
+        """
+        hosts = sorted(set(hosts))
+        instances_by_host = {host: {} for host in hosts}
+        for start in xrange(0, len(hosts), INSTANCE_BATCH_SIZE):
+            batch = hosts[start:start + INSTANCE_BATCH_SIZE]
+            instances = objects.InstanceList.get_by_hosts(context, batch)
+            LOG.debug("Adding %s instances for hosts %s-%s",
+                      len(instances), start, start + len(batch))
+            for instance in instances:
+                instances_by_host[instance.host][instance.uuid] = instance
+            # Call sleep() to cooperatively yield
+            time.sleep(0)
+        return instances_by_host
+
     def _choose_host_filters(self, filter_cls_names):
         """Since the caller may specify which filters to use we need
         to have an authoritative list of what is permissible. This
@@ -491,6 +526,7 @@ class HostManager(object):
             filters = self.default_filters
         else:
             filters = self._choose_host_filters(filter_class_names)
+        filter_properties['aggregate_index'] = self.aggregate_index
         ignore_hosts = filter_properties.get('ignore_hosts', [])
         force_hosts = filter_properties.get('force_hosts', [])
         force_nodes = filter_properties.get('force_nodes', [])
@@ -532,7 +568,13 @@ class HostManager(object):
                         for service in objects.ServiceList.get_by_binary(
                             context, 'nova-compute')}
         # Get resource usage across the available compute nodes:
-        compute_nodes = objects.ComputeNodeList.get_all(context)
+        compute_nodes, changed_nodes = self._get_compute_nodes(context)
+        # Load at once the instances of the hosts which don't send updates
+        # about their instances, rather than host by host
+        instances_by_host = self._get_instances_by_host(
+            context, [compute.host for compute in compute_nodes
+                      if compute.host in service_refs and
+                      not self._has_instance_updates(compute.host)])
         seen_nodes = set()
         for compute in compute_nodes:
             service = service_refs.get(compute.host)
@@ -547,7 +589,8 @@ class HostManager(object):
             state_key = (host, node)
             host_state = self.host_state_map.get(state_key)
             if host_state:
-                host_state.update_from_compute_node(compute)
+                if changed_nodes is None or state_key in changed_nodes:
+                    host_state.update_from_compute_node(compute)
             else:
                 host_state = self.host_state_cls(host, node, compute=compute)
                 self.host_state_map[state_key] = host_state
@@ -558,7 +601,8 @@ class HostManager(object):
                                      self.host_aggregates_map[
                                          host_state.host]]
             host_state.update_service(dict(service.iteritems()))
-            self._add_instance_info(context, compute, host_state)
+            self._add_instance_info(context, compute, host_state,
+                                    instances_by_host)
             seen_nodes.add(state_key)
 
         # remove compute nodes from host_state_map if they are not active
@@ -571,7 +615,59 @@ class HostManager(object):
 
         return self.host_state_map.itervalues()
 
-    def _add_instance_info(self, context, compute, host_state):
+    def _get_compute_nodes(self, context):
+        """Returns the compute nodes and the keys of those which changed.
+
+        Unless scheduler_host_state_refresh_interval is set, all the compute
+        nodes are loaded from the DB and considered as changed, which is
+        flagged by returning None as the set of changed (host, node) keys.
+        Otherwise, the compute nodes are only fully reloaded once per
+        interval, and in between only the ones created, updated or deleted
+        since the previous refresh are fetched and merged in the local copy.
+        """
+        interval = CONF.scheduler_host_state_refresh_interval
+        if interval <= 0:
+            return objects.ComputeNodeList.get_all(context), None
+
+        if (self._compute_nodes_generation is None or
+                timeutils.is_older_than(self._last_full_refresh, interval)):
+            self._last_full_refresh = timeutils.utcnow()
+            compute_nodes = objects.ComputeNodeList.get_all(context)
+            self._compute_nodes = {}
+            changed_nodes = None
+        else:
+            # The most recent rows are fetched again as changes are looked
+            # up inclusively, which is harmless as applying a compute node
+            # to a HostState is idempotent.
+            compute_nodes = objects.ComputeNodeList.get_all_changed_since(
+                context, self._compute_nodes_generation)
+            changed_nodes = set()
+
+        for compute in compute_nodes:
+            state_key = (compute.host, compute.hypervisor_hostname)
+            if compute.deleted:
+                self._compute_nodes.pop(state_key, None)
+            else:
+                self._compute_nodes[state_key] = compute
+                if changed_nodes is not None:
+                    changed_nodes.add(state_key)
+            for field in ('created_at', 'updated_at', 'deleted_at'):
+                timestamp = compute[field]
+                if timestamp and (self._compute_nodes_generation is None or
+                                  timestamp > self._compute_nodes_generation):
+                    self._compute_nodes_generation = timestamp
+        LOG.debug("Refreshed %(changed)d compute nodes out of %(total)d",
+                  {'changed': len(compute_nodes),
+                   'total': len(self._compute_nodes)})
+        return self._compute_nodes.values(), changed_nodes
+
+    def _has_instance_updates(self, host_name):
+        """Returns True if the host keeps its instance info up to date."""
+        host_info = self._instance_info.get(host_name)
+        return bool(host_info and host_info.get("updated"))
+
+    def _add_instance_info(self, context, compute, host_state,
+                           instances_by_host=None):
         """Adds the host instance info to the host_state object.
 
         Some older compute nodes may not be sending instance change updates to
@@ -579,12 +675,14 @@ class HostManager(object):
         reasons. In either of these cases, there will either be no information
         for the host, or the 'updated' value for that host dict will be False.
         In those cases, we need to grab the current InstanceList instead of
-        relying on the version in _instance_info.
+        relying on the version in _instance_info, unless it was already
+        loaded in instances_by_host.
         """
         host_name = compute.host
-        host_info = self._instance_info.get(host_name)
-        if host_info and host_info.get("updated"):
-            inst_dict = host_info["instances"]
+        if self._has_instance_updates(host_name):
+            inst_dict = self._instance_info[host_name]["instances"]
+        elif instances_by_host and host_name in instances_by_host:
+            inst_dict = instances_by_host[host_name]
         else:
             # Host is running old version, or updates aren't flowing.
             inst_list = objects.InstanceList.get_by_host(context, host_name)
@@ -23,6 +23,7 @@ default.
 
 from oslo_config import cfg
 
+from nova.scheduler.filters import utils
 from nova.scheduler import weights
 
 io_ops_weight_opts = [
@@ -49,3 +50,16 @@ class IoOpsWeigher(weights.BaseHostWeigher):
         to be the default.
         """
         return host_state.num_io_ops
+
+    def weigh_objects(self, weighed_obj_list, weight_properties):
+        """Weigh all the hosts at once, without a call per host.
+
+        A subclass which weighs the hosts itself is called per host.
+        """
+        if utils.method_overridden(self, IoOpsWeigher, '_weigh_object'):
+            return super(IoOpsWeigher, self).weigh_objects(
+                weighed_obj_list, weight_properties)
+
+        weights = [obj.obj.num_io_ops for obj in weighed_obj_list]
+        self._record_min_max(weights)
+        return weights
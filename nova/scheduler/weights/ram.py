@@ -22,6 +22,7 @@ number and the weighing has the opposite effect of the default.
 
 from oslo_config import cfg
 
+from nova.scheduler.filters import utils
 from nova.scheduler import weights
 
 ram_weight_opts = [
@@ -45,3 +46,16 @@ class RAMWeigher(weights.BaseHostWeigher):
     def _weigh_object(self, host_state, weight_properties):
         """Higher weights win.  We want spreading to be the default."""
         return host_state.free_ram_mb
+
+    def weigh_objects(self, weighed_obj_list, weight_properties):
+        """Weigh all the hosts at once, without a call per host.
+
+        A subclass which weighs the hosts itself is called per host.
+        """
+        if utils.method_overridden(self, RAMWeigher, '_weigh_object'):
+            return super(RAMWeigher, self).weigh_objects(
+                weighed_obj_list, weight_properties)
+
+        weights = [obj.obj.free_ram_mb for obj in weighed_obj_list]
+        self._record_min_max(weights)
+        return weights
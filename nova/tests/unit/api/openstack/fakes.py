@@ -679,6 +679,14 @@ def stub_bdm_get_all_by_instance(context, instance_uuid, use_slave=False):
             'volume_id': 'volume_id2', 'instance_uuid': instance_uuid})]
 
 
+def stub_bdm_get_all_by_instance_uuids(context, instance_uuids,
+                                       use_slave=False):
+    bdms = []
+    for instance_uuid in set(instance_uuids):
+        bdms.extend(stub_bdm_get_all_by_instance(context, instance_uuid))
+    return bdms
+
+
 def fake_get_available_languages():
     existing_translations = ['en_GB', 'en_AU', 'de', 'zh_CN', 'en_US']
     return existing_translations
@@ -6171,9 +6171,11 @@ class ComputeTestCase(BaseTestCase):
                 'get_nw_info': 0, 'expected_instance': None}
 
         def fake_instance_get_all_by_host(context, host,
-                                          columns_to_join, use_slave=False):
+                                          columns_to_join, use_slave=False,
+                                          columns=None):
             call_info['get_all_by_host'] += 1
             self.assertEqual([], columns_to_join)
+            self.assertEqual(['host', 'task_state', 'vm_state'], columns)
             return instances[:]
 
         def fake_instance_get_by_uuid(context, instance_uuid,
@@ -6321,8 +6323,9 @@ class ComputeTestCase(BaseTestCase):
                    'task_state': [
                        task_states.REBOOTING, task_states.REBOOT_STARTED,
                        task_states.REBOOT_PENDING]}
-        get.assert_called_once_with(ctxt, filters,
-                                    expected_attrs=[], use_slave=True)
+        get.assert_called_once_with(
+            ctxt, filters, expected_attrs=[], use_slave=True,
+            expected_fields=['host', 'task_state', 'updated_at'])
 
     def test_poll_unconfirmed_resizes(self):
         instances = [
@@ -6483,7 +6486,8 @@ class ComputeTestCase(BaseTestCase):
                                             marker=None,
                                             columns_to_join=[],
                                             use_slave=True,
-                                            limit=None)
+                                            limit=None,
+                                            columns=None)
             self.assertThat(conductor_instance_update.mock_calls,
                             testtools_matchers.HasLength(len(old_instances)))
             self.assertThat(node_is_available.mock_calls,
@@ -6831,7 +6835,7 @@ class ComputeTestCase(BaseTestCase):
                                  'get_by_filters')
         self.mox.StubOutWithMock(self.compute, '_deleted_old_enough')
         self.mox.StubOutWithMock(objects.BlockDeviceMappingList,
-                                 'get_by_instance_uuid')
+                                 'bdms_by_instance_uuid')
         self.mox.StubOutWithMock(self.compute, '_delete_instance')
 
         objects.InstanceList.get_by_filters(
@@ -6840,18 +6844,18 @@ class ComputeTestCase(BaseTestCase):
             use_slave=True
             ).AndReturn(instances)
 
-        # The first instance delete fails.
         self.compute._deleted_old_enough(instance1, 3600).AndReturn(True)
-        objects.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, instance1.uuid).AndReturn([])
+        self.compute._deleted_old_enough(instance2, 3600).AndReturn(True)
+        objects.BlockDeviceMappingList.bdms_by_instance_uuid(
+                ctxt, [instance1.uuid, instance2.uuid]).AndReturn(
+                    {instance1.uuid: [], instance2.uuid: []})
+
+        # The first instance delete fails.
         self.compute._delete_instance(ctxt, instance1,
                                       [], self.none_quotas).AndRaise(
                                               test.TestingException)
 
         # The second instance delete that follows.
-        self.compute._deleted_old_enough(instance2, 3600).AndReturn(True)
-        objects.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, instance2.uuid).AndReturn([])
         self.compute._delete_instance(ctxt, instance2,
                                       [], self.none_quotas)
 
@@ -2491,7 +2491,7 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
         self.compute._sync_scheduler_instance_info(self.context)
         mock_get_by_host.assert_called_once_with(
                 fake_elevated, self.compute.host, expected_attrs=[],
-                use_slave=True)
+                use_slave=True, expected_fields=[])
         mock_sync.assert_called_once_with(fake_elevated, self.compute.host,
                                           exp_uuids)
 
@@ -604,6 +604,7 @@ class BaseTrackerTestCase(BaseTestCase):
     def _fake_compute_node_update(self, ctx, compute_node_id, values,
             prune_stats=False):
         self.update_call_count += 1
+        self.update_values = values
         self.updated = True
         self.compute.update(values)
         return self.compute
@@ -736,8 +737,8 @@ class SchedulerClientTrackerTestCase(BaseTrackerTestCase):
         values = {'stats': {}, 'foo': 'bar', 'baz_count': 0}
         self.tracker._update(self.context, values)
 
-        expected = {'stats': '{}', 'foo': 'bar', 'baz_count': 0,
-                    'id': 1}
+        # The stats did not change since the tracker was set up
+        expected = {'foo': 'bar', 'baz_count': 0, 'id': 1}
         self.tracker.scheduler_client.update_resource_stats.\
             assert_called_once_with(self.context,
                                     ("fakehost", "fakenode"),
@@ -1342,6 +1343,17 @@ class TrackerPeriodicTestCase(BaseTrackerTestCase):
         self.tracker.update_available_resource(self.context)
         self.assertEqual(2, self.update_call_count)
 
+    def test_periodic_status_update_claim_resources(self):
+        self.flags(scheduler_claim_resources=True)
+        self.assertEqual(1, self.update_call_count)
+
+        # verify only the usage is updated if no change to resources, since
+        # the scheduler may have claimed resources meanwhile
+        self.tracker.update_available_resource(self.context)
+        self.assertEqual(2, self.update_call_count)
+        self.assertEqual(set(resource_tracker.USAGE_KEYS),
+                         set(self.update_values) - set(['id']))
+
     def test_update_available_resource_calls_locked_inner(self):
         @mock.patch.object(self.tracker, 'driver')
         @mock.patch.object(self.tracker,
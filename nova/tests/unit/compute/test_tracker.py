@@ -772,6 +772,77 @@ class TestUpdateAvailableResources(BaseTestCase):
         update_mock.assert_called_once_with(mock.sentinel.ctx,
                 expected_resources)
 
+    @mock.patch('nova.objects.Service.get_by_compute_host')
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_full_audit_interval(self, get_mock, migr_mock, get_cn_mock,
+                                 service_mock):
+        self.flags(reserved_host_disk_mb=0,
+                   reserved_host_memory_mb=0,
+                   resource_tracker_full_audit_interval=2)
+        self._setup_rt()
+
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        service_mock.return_value = _SERVICE_FIXTURE
+
+        self._update_available_resources()
+        self.assertEqual(1, get_mock.call_count)
+        self.assertEqual(1, migr_mock.call_count)
+
+        # Emulate the claim of an instance since the audit
+        self.rt.compute_node.update({'memory_mb_used': 128,
+                                     'local_gb_used': 1,
+                                     'running_vms': 1,
+                                     'current_workload': 1})
+        update_mock = self._update_available_resources()
+        self.assertEqual(1, get_mock.call_count)
+        self.assertEqual(1, migr_mock.call_count)
+        resources = update_mock.call_args[0][1]
+        self.assertEqual(128, resources['memory_mb_used'])
+        self.assertEqual(384, resources['free_ram_mb'])
+        self.assertEqual(1, resources['local_gb_used'])
+        self.assertEqual(5, resources['free_disk_gb'])
+        self.assertEqual(1, resources['running_vms'])
+        self.assertEqual(1, resources['current_workload'])
+        self.assertEqual([], resources['pci_device_pools'])
+
+        update_mock = self._update_available_resources()
+        self.assertEqual(2, get_mock.call_count)
+        self.assertEqual(2, migr_mock.call_count)
+        resources = update_mock.call_args[0][1]
+        self.assertEqual(0, resources['memory_mb_used'])
+        self.assertEqual(0, resources['running_vms'])
+
+    @mock.patch('nova.objects.Service.get_by_compute_host')
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename')
+    @mock.patch('nova.objects.MigrationList.get_in_progress_by_host_and_node')
+    @mock.patch('nova.objects.InstanceList.get_by_host_and_node')
+    def test_full_audit_no_change(self, get_mock, migr_mock, get_cn_mock,
+                                  service_mock):
+        self.flags(reserved_host_disk_mb=0,
+                   reserved_host_memory_mb=0,
+                   resource_tracker_full_audit_interval=2)
+        self._setup_rt()
+
+        get_mock.return_value = []
+        migr_mock.return_value = []
+        get_cn_mock.return_value = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+        service_mock.return_value = _SERVICE_FIXTURE
+        urs_mock = self.sched_client_mock.update_resource_stats
+
+        self.rt.update_available_resource(mock.sentinel.ctx)
+        self.assertTrue(urs_mock.called)
+
+        # Neither the run in between nor the next audit write anything
+        # when nothing changed
+        urs_mock.reset_mock()
+        self.rt.update_available_resource(mock.sentinel.ctx)
+        self.rt.update_available_resource(mock.sentinel.ctx)
+        self.assertFalse(urs_mock.called)
+
 
 class TestInitComputeNode(BaseTestCase):
 
@@ -1001,6 +1072,33 @@ class TestUpdateComputeNode(BaseTestCase):
                                          ('fake-host', 'fake-node'),
                                          expected_resources)
 
+    @mock.patch('nova.objects.Service.get_by_compute_host')
+    def test_existing_compute_node_updated_changed_resources(self,
+                                                             service_mock):
+        self._setup_rt()
+        self.rt.compute_node = copy.deepcopy(_COMPUTE_NODE_FIXTURES[0])
+
+        resources = {
+            'host': 'fake-host',
+            'free_ram_mb': 512,
+            'memory_mb_used': 0,
+            'memory_mb': 512,
+            'numa_topology': None,
+        }
+        self.rt._update(mock.sentinel.ctx, copy.deepcopy(resources))
+
+        # Only the values which changed since the previous update are sent
+        self.sched_client_mock.reset_mock()
+        urs_mock = self.sched_client_mock.update_resource_stats
+        resources.update({'free_ram_mb': 384, 'memory_mb_used': 128})
+        self.rt._update(mock.sentinel.ctx, resources)
+        urs_mock.assert_called_once_with(mock.sentinel.ctx,
+                                         ('fake-host', 'fake-node'),
+                                         {'id': 1,
+                                          'free_ram_mb': 384,
+                                          'memory_mb_used': 128})
+        self.assertEqual(128, self.rt.compute_node['memory_mb_used'])
+
 
 class TestInstanceClaim(BaseTestCase):
 
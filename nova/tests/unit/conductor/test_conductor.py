@@ -238,6 +238,20 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         self.conductor = conductor_manager.ConductorManager()
         self.conductor_manager = self.conductor
 
+    @mock.patch.object(db, 'instance_event_writes_flush')
+    def test_flush_instance_event_writes(self, mock_flush):
+        self.conductor._flush_instance_event_writes(self.context)
+        self.assertFalse(mock_flush.called)
+        self.flags(instance_event_write_buffer_size=100)
+        self.conductor._flush_instance_event_writes(self.context)
+        mock_flush.assert_called_once_with(self.context)
+
+    @mock.patch.object(db, 'instance_event_writes_flush')
+    def test_cleanup_host_flushes_instance_event_writes(self, mock_flush):
+        self.flags(instance_event_write_buffer_size=100)
+        self.conductor.cleanup_host()
+        self.assertTrue(mock_flush.called)
+
     def test_instance_get_by_uuid(self):
         orig_instance = self._create_fake_instance()
         copy_instance = self.conductor.instance_get_by_uuid(
@@ -467,6 +481,47 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         self.assertIn('dict', updates)
         self.assertEqual({'foo': 'bar'}, updates['dict'])
 
+    def test_object_actions(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField()}
+
+            def increment(self, step=1):
+                self.foo += step
+                return self.foo
+
+        obj1 = TestObject(foo=1)
+        obj2 = TestObject(foo=2)
+        obj1.obj_reset_changes()
+        obj2.obj_reset_changes()
+        results = self.conductor.object_actions(
+            self.context, [(obj1, 'increment', [], {}),
+                           (obj2, 'increment', [], {'step': 3})])
+        self.assertEqual([2, 5], [result for updates, result in results])
+        self.assertEqual([{'foo': 2, 'obj_what_changed': set(['foo'])},
+                          {'foo': 5, 'obj_what_changed': set(['foo'])}],
+                         [updates for updates, result in results])
+
+    def test_object_actions_failure(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField()}
+
+            def increment(self, step=1):
+                if self.foo < 0:
+                    raise exc.ObjectActionError(action='increment',
+                                                reason='negative')
+                self.foo += step
+                return self.foo
+
+        obj1 = TestObject(foo=-1)
+        obj2 = TestObject(foo=2)
+        results = self.conductor.object_actions(
+            self.context, [(obj1, 'increment', [], {}),
+                           (obj2, 'increment', [], {})])
+        # The failure of the first action does not stop the second one
+        self.assertIsInstance(rpc.deserialize_remote_exception(results[0]),
+                              exc.ObjectActionError)
+        self.assertEqual(3, results[1][1])
+
     def _test_expected_exceptions(self, db_method, conductor_method, errors,
                                   *args, **kwargs):
         # Tests that expected exceptions are handled properly.
@@ -777,6 +832,31 @@ class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
         self.conductor_manager = self.conductor_service.manager
         self.conductor = conductor_rpcapi.ConductorAPI()
 
+    def test_object_actions_old_conductor(self):
+        with mock.patch.object(self.conductor.client, 'can_send_version',
+                               return_value=False):
+            with mock.patch.object(self.conductor, 'object_action',
+                                   return_value=({}, None)) as mock_action:
+                results = self.conductor.object_actions(
+                    self.context, [(mock.sentinel.obj, 'save', (), {})])
+        self.assertEqual([({}, None)], results)
+        mock_action.assert_called_once_with(self.context, mock.sentinel.obj,
+                                            'save', (), {})
+
+    def test_object_actions_old_conductor_failure(self):
+        with mock.patch.object(self.conductor.client, 'can_send_version',
+                               return_value=False):
+            with mock.patch.object(self.conductor, 'object_action',
+                                   side_effect=[exc.InstanceNotFound(
+                                                    instance_id='fake'),
+                                                ({}, None)]):
+                results = self.conductor.object_actions(
+                    self.context, [(mock.sentinel.obj1, 'save', (), {}),
+                                   (mock.sentinel.obj2, 'save', (), {})])
+        self.assertIsInstance(rpc.deserialize_remote_exception(results[0]),
+                              exc.InstanceNotFound)
+        self.assertEqual(({}, None), results[1])
+
 
 class ConductorAPITestCase(_BaseTestCase, test.TestCase):
     """Conductor API Tests."""
@@ -20,6 +20,7 @@
 
 import copy
 import datetime
+import time
 import types
 import uuid as stdlib_uuid
 
@@ -180,6 +181,9 @@ class DecoratorTestCase(test.TestCase):
         self._test_decorator_wraps_helper(
             oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True))
 
+    def test_allow_slave_read_decorator_wraps_functions_properly(self):
+        self._test_decorator_wraps_helper(sqlalchemy_api.allow_slave_read)
+
 
 def _get_fake_aggr_values():
     return {'name': 'fake_aggregate'}
@@ -502,6 +506,72 @@ class ModelQueryTestCase(DbTestCase):
         self.assertFalse(mock_get_session.called)
 
 
+class AllowSlaveReadTestCase(test.TestCase):
+    def setUp(self):
+        super(AllowSlaveReadTestCase, self).setUp()
+        self.flags(use_slave_for_reads=True)
+        self.addCleanup(sqlalchemy_api._RECENT_WRITES.clear)
+
+    def _read_use_slave(self, ctxt):
+        @sqlalchemy_api.allow_slave_read
+        def read(context):
+            sqlalchemy_api.get_session()
+
+        with mock.patch.object(sqlalchemy_api,
+                               '_create_facade_lazily') as mock_facade:
+            read(ctxt)
+        get_session = mock_facade.return_value.get_session
+        get_session.assert_called_once_with(use_slave=mock.ANY)
+        return get_session.call_args[1]['use_slave']
+
+    def test_read_from_slave(self):
+        ctxt = context.get_admin_context()
+        self.assertTrue(self._read_use_slave(ctxt))
+        # Only within the decorated call.
+        with mock.patch.object(sqlalchemy_api,
+                               '_create_facade_lazily') as mock_facade:
+            sqlalchemy_api.get_session()
+        mock_facade.return_value.get_session.assert_called_once_with(
+            use_slave=False)
+
+    def test_read_from_slave_disabled(self):
+        self.flags(use_slave_for_reads=False)
+        self.assertFalse(self._read_use_slave(context.get_admin_context()))
+
+    def test_read_your_writes(self):
+        ctxt = context.RequestContext('fake', 'fake')
+        other_ctxt = context.RequestContext('fake', 'fake', overwrite=False)
+        db.instance_create(ctxt, {})
+        self.assertFalse(self._read_use_slave(ctxt))
+        self.assertFalse(self._read_use_slave(ctxt.elevated()))
+        self.assertTrue(self._read_use_slave(other_ctxt))
+
+        later = time.time() + CONF.slave_read_after_write_delay
+        with mock.patch.object(time, 'time', return_value=later):
+            self.assertTrue(self._read_use_slave(ctxt))
+
+    def test_read_after_read(self):
+        ctxt = context.RequestContext('fake', 'fake')
+        db.flavor_get_all(ctxt.elevated())
+        self.assertTrue(self._read_use_slave(ctxt))
+
+    def test_read_from_main(self):
+        # The services, compute nodes and instance listings feed the
+        # service liveness, the scheduler claims and the server groups,
+        # which need fresh data.
+        ctxt = context.get_admin_context()
+        with mock.patch.object(sqlalchemy_api,
+                               '_create_facade_lazily') as mock_facade:
+            db.service_get_all(ctxt)
+            db.service_get_all_by_topic(ctxt, 'compute')
+            db.compute_node_get_all(ctxt)
+            db.instance_get_all_by_filters(ctxt, {}, 'created_at', 'desc')
+        calls = mock_facade.return_value.get_session.call_args_list
+        self.assertEqual(4, len(calls))
+        for call in calls:
+            self.assertFalse(call[1]['use_slave'])
+
+
 class AggregateDBApiTestCase(test.TestCase):
     def setUp(self):
         super(AggregateDBApiTestCase, self).setUp()
@@ -1000,6 +1070,16 @@ class SqlAlchemyDbApiTestCase(DbTestCase):
         result = sqlalchemy_api._instance_get_all_uuids_by_host(ctxt, 'host1')
         self.assertEqual(2, len(result))
 
+    def test_instance_get_all_by_hosts(self):
+        ctxt = context.get_admin_context()
+        instance1 = self.create_instance_with_args()
+        instance2 = self.create_instance_with_args(host='host2')
+        self.create_instance_with_args(host='host3')
+        result = db.instance_get_all_by_hosts(ctxt, ['host1', 'host2'])
+        self.assertEqual(set([instance1['uuid'], instance2['uuid']]),
+                         set(instance['uuid'] for instance in result))
+        self.assertEqual([], db.instance_get_all_by_hosts(ctxt, []))
+
     def test_instance_get_all_uuids_by_host(self):
         ctxt = context.get_admin_context()
         self.create_instance_with_args()
@@ -1088,7 +1168,8 @@ class SqlAlchemyDbApiTestCase(DbTestCase):
             columns_to_join='columns', use_slave=True)
         mock_get_all_filters_sort.assert_called_once_with(ctxt, {'foo': 'bar'},
             limit=100, marker='uuid', columns_to_join='columns',
-            use_slave=True, sort_keys=['sort_key'], sort_dirs=['sort_dir'])
+            use_slave=True, sort_keys=['sort_key'], sort_dirs=['sort_dir'],
+            columns=None)
 
     def test_instance_get_all_by_filters_sort_key_invalid(self):
         '''InvalidSortKey raised if an invalid key is given.'''
@@ -1479,6 +1560,31 @@ class ReservationTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
                                             self.ctxt, 'project1', 'user1'))
 
+    def test_reservation_commit_optimistic(self):
+        db.reservation_commit_optimistic(self.ctxt, self.reservations)
+        # Committing again must not apply the reservations twice.
+        db.reservation_commit_optimistic(self.ctxt, self.reservations)
+        self.assertRaises(exception.ReservationNotFound,
+            _reservation_get, self.ctxt, self.reservations[0])
+        expected = {'project_id': 'project1', 'user_id': 'user1',
+                'resource0': {'reserved': 0, 'in_use': 0},
+                'resource1': {'reserved': 0, 'in_use': 2},
+                'fixed_ips': {'reserved': 0, 'in_use': 4}}
+        self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
+                                            self.ctxt, 'project1', 'user1'))
+
+    def test_reservation_rollback_optimistic(self):
+        db.reservation_rollback_optimistic(self.ctxt, self.reservations)
+        db.reservation_commit_optimistic(self.ctxt, self.reservations)
+        self.assertRaises(exception.ReservationNotFound,
+            _reservation_get, self.ctxt, self.reservations[0])
+        expected = {'project_id': 'project1', 'user_id': 'user1',
+                'resource0': {'reserved': 0, 'in_use': 0},
+                'resource1': {'reserved': 0, 'in_use': 1},
+                'fixed_ips': {'reserved': 0, 'in_use': 2}}
+        self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
+                                            self.ctxt, 'project1', 'user1'))
+
     def test_reservation_expire(self):
         db.reservation_expire(self.ctxt)
 
@@ -1490,6 +1596,98 @@ class ReservationTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                             self.ctxt, 'project1', 'user1'))
 
 
+class QuotaReserveOptimisticTestCase(test.TestCase):
+
+    """Tests for db.api.quota_reserve_optimistic."""
+
+    def setUp(self):
+        super(QuotaReserveOptimisticTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.resources = {
+            'instances': quota.ReservableResource('instances',
+                                                  '_sync_instances',
+                                                  'quota_instances')}
+        self.quotas = {'instances': 5}
+        self.expire = timeutils.utcnow() + datetime.timedelta(days=1)
+
+    def _reserve(self, delta, user_id='user1'):
+        return db.quota_reserve_optimistic(
+            self.ctxt, self.resources, self.quotas, self.quotas,
+            {'instances': delta}, self.expire, 0, 0,
+            project_id='project1', user_id=user_id)
+
+    def _get_usage(self, user_id='user1'):
+        return db.quota_usage_get_all_by_project_and_user(
+            self.ctxt, 'project1', user_id)['instances']
+
+    def test_reserve(self):
+        # The first reservation creates the usage, under the lock.
+        self._reserve(2)
+        with mock.patch.object(sqlalchemy_api, 'quota_reserve') as reserve:
+            reservations = self._reserve(2)
+        self.assertFalse(reserve.called)
+        self.assertEqual({'in_use': 0, 'reserved': 4}, self._get_usage())
+        self.assertEqual('instances',
+                         _reservation_get(self.ctxt, reservations[0]).resource)
+        self.assertRaises(exception.OverQuota, self._reserve, 2)
+        self.assertEqual({'in_use': 0, 'reserved': 4}, self._get_usage())
+
+    def test_reserve_needs_refresh(self):
+        self._reserve(2)
+        db.quota_usage_update(self.ctxt, 'project1', 'user1', 'instances',
+                              in_use=-1)
+        with mock.patch.object(sqlalchemy_api, 'quota_reserve',
+                               return_value=[]) as reserve:
+            self._reserve(2)
+        self.assertTrue(reserve.called)
+
+    @mock.patch.object(sqlalchemy_api, '_calculate_overquota',
+                       return_value=[])
+    def test_reserve_over_user_quota_concurrently(self, mock_calculate):
+        # The usages read tell there is room, but a concurrent
+        # reservation took it before the update.
+        self._reserve(4)
+        self.assertRaises(exception.OverQuota, self._reserve, 2)
+        self.assertEqual({'in_use': 0, 'reserved': 4}, self._get_usage())
+
+    @mock.patch.object(sqlalchemy_api, '_calculate_overquota',
+                       return_value=[])
+    def test_reserve_over_project_quota_concurrently(self, mock_calculate):
+        self._reserve(3, user_id='user2')
+        self._reserve(1)
+        self.assertRaises(exception.OverQuota, self._reserve, 2)
+        self.assertEqual({'in_use': 0, 'reserved': 1}, self._get_usage())
+        self.assertEqual({'in_use': 0, 'reserved': 3},
+                         self._get_usage(user_id='user2'))
+
+    def test_reserve_over_project_quota_retried(self):
+        self._reserve(3, user_id='user2')
+        self._reserve(1)
+        real_get_usages = sqlalchemy_api._get_project_user_quota_usages
+        calls = []
+
+        def fake_get_usages(*args, **kwargs):
+            # A racing reservation of user2 is there for the check of the
+            # project quota, and rolled back before the retry.
+            calls.append(args)
+            if len(calls) == 2:
+                db.quota_usage_update(self.ctxt, 'project1', 'user2',
+                                      'instances', reserved=4)
+            elif len(calls) == 3:
+                db.quota_usage_update(self.ctxt, 'project1', 'user2',
+                                      'instances', reserved=3)
+            return real_get_usages(*args, **kwargs)
+
+        with mock.patch.object(sqlalchemy_api,
+                               '_get_project_user_quota_usages',
+                               side_effect=fake_get_usages):
+            self._reserve(1)
+        self.assertEqual(4, len(calls))
+        self.assertEqual({'in_use': 0, 'reserved': 2}, self._get_usage())
+        self.assertEqual({'in_use': 0, 'reserved': 3},
+                         self._get_usage(user_id='user2'))
+
+
 class SecurityGroupRuleTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
         super(SecurityGroupRuleTestCase, self).setUp()
@@ -2040,6 +2238,41 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
             sys_meta = utils.metadata_to_dict(inst['system_metadata'])
             self.assertEqual(sys_meta, {})
 
+    def test_instance_get_all_by_filters_columns(self):
+        instance = self.create_instance_with_args(host='host1')
+        result = db.instance_get_all_by_filters(self.ctxt, {},
+                                                columns_to_join=['metadata'],
+                                                columns=['host', 'vm_state'])
+        self.assertEqual(1, len(result))
+        self.assertEqual(set(['id', 'uuid', 'host', 'vm_state', 'metadata',
+                              'system_metadata']), set(result[0]))
+        self.assertEqual(instance['uuid'], result[0]['uuid'])
+        self.assertEqual('host1', result[0]['host'])
+        meta = utils.metadata_to_dict(result[0]['metadata'])
+        self.assertEqual(self.sample_data['metadata'], meta)
+
+    def test_instance_get_all_by_filters_columns_joined(self):
+        self.create_instance_with_args()
+        result = db.instance_get_all_by_filters(
+            self.ctxt, {}, columns_to_join=['info_cache'], columns=['host'])
+        self.assertIn('info_cache', result[0])
+        self.assertNotIn('vm_state', result[0])
+
+    def test_instance_get_all_by_filters_columns_invalid(self):
+        self.assertRaises(exception.InvalidInput,
+                          db.instance_get_all_by_filters,
+                          self.ctxt, {}, columns=['host', 'metadata'])
+
+    def test_instance_get_all_by_host_columns(self):
+        self.create_instance_with_args(host='host1')
+        self.create_instance_with_args(host='host2')
+        result = db.instance_get_all_by_host(self.ctxt, 'host1',
+                                             columns_to_join=[],
+                                             columns=['host'])
+        self.assertEqual(1, len(result))
+        self.assertEqual('host1', result[0]['host'])
+        self.assertNotIn('vm_state', result[0])
+
     def test_instance_get_all_by_filters(self):
         instances = [self.create_instance_with_args() for i in range(3)]
         filtered_instances = db.instance_get_all_by_filters(self.ctxt, {})
@@ -2212,6 +2445,43 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                           'deleted', 'deleted_at', 'info_cache',
                           'pci_devices', 'extra'])
 
+    def test_instance_get_all_by_filters_sort_marker_same_created_at(self):
+        created_at = timeutils.utcnow()
+        instances = [self.create_instance_with_args(created_at=created_at)
+                     for i in range(3)]
+        uuids = []
+        marker = None
+        for i in range(4):
+            result = db.instance_get_all_by_filters_sort(
+                self.ctxt, {}, limit=1, marker=marker,
+                sort_keys=['created_at', 'id'], sort_dirs=['desc', 'desc'])
+            if not result:
+                break
+            marker = result[0]['uuid']
+            uuids.append(marker)
+        self.assertEqual([inst['uuid'] for inst in reversed(instances)],
+                         uuids)
+
+    def test_instance_get_all_by_filters_sort_marker_deleted(self):
+        inst1 = self.create_instance_with_args()
+        inst2 = self.create_instance_with_args()
+        db.instance_destroy(self.ctxt, inst1['uuid'])
+        db.instance_destroy(self.ctxt, inst2['uuid'])
+        result = db.instance_get_all_by_filters_sort(
+            self.ctxt, {'deleted': True}, marker=inst2['uuid'])
+        self.assertEqual([inst1['uuid']], [inst['uuid'] for inst in result])
+        self.assertRaises(exception.MarkerNotFound,
+                          db.instance_get_all_by_filters_sort,
+                          self.ctxt, {'deleted': False},
+                          marker=inst2['uuid'])
+
+    def test_instance_get_all_by_filters_sort_marker_invalid_sort_key(self):
+        inst = self.create_instance_with_args()
+        self.assertRaises(exception.InvalidSortKey,
+                          db.instance_get_all_by_filters_sort,
+                          self.ctxt, {}, marker=inst['uuid'],
+                          sort_keys=['foo'])
+
     def test_instance_get_all_by_filters_deleted_and_soft_deleted(self):
         inst1 = self.create_instance_with_args()
         inst2 = self.create_instance_with_args(vm_state=vm_states.SOFT_DELETED)
@@ -3344,6 +3614,211 @@ class InstanceFaultTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual({}, faults)
 
 
+class InstanceEventWriteBufferTestCase(test.TestCase):
+    def setUp(self):
+        super(InstanceEventWriteBufferTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.flags(instance_event_write_buffer_size=10,
+                   instance_event_write_buffer_interval=60)
+        self.addCleanup(self._clear_buffer)
+        self.uuid = str(stdlib_uuid.uuid4())
+        db.instance_create(self.ctxt, {'uuid': self.uuid})
+
+    def _clear_buffer(self):
+        del sqlalchemy_api._BUFFERED_FAULTS[:]
+        sqlalchemy_api._BUFFERED_EVENTS.clear()
+        sqlalchemy_api._BUFFERED_EVENT_FINISHES.clear()
+        sqlalchemy_api._BUFFERED_FAILED_ACTIONS.clear()
+        sqlalchemy_api._BUFFERED_SINCE[0] = None
+
+    def _create_fault(self, code=404):
+        return db.instance_fault_create(self.ctxt,
+                                        {'instance_uuid': self.uuid,
+                                         'code': code,
+                                         'message': 'message',
+                                         'details': 'details',
+                                         'host': 'localhost'})
+
+    def _written_faults(self):
+        return sqlalchemy_api.model_query(self.ctxt,
+                                          models.InstanceFault).all()
+
+    def _written_events(self, action_id):
+        return sqlalchemy_api.action_events_get(self.ctxt, action_id)
+
+    def _start_action(self):
+        return db.action_start(self.ctxt,
+                               {'action': 'run_instance',
+                                'instance_uuid': self.uuid,
+                                'request_id': self.ctxt.request_id,
+                                'start_time': timeutils.utcnow()})
+
+    def _event_values(self, result=None):
+        values = {'event': 'schedule',
+                  'instance_uuid': self.uuid,
+                  'request_id': self.ctxt.request_id}
+        if result is None:
+            values['start_time'] = timeutils.utcnow()
+        else:
+            values['finish_time'] = timeutils.utcnow()
+            values['result'] = result
+        return values
+
+    def test_fault_create_buffered(self):
+        fault = self._create_fault()
+        self.assertNotIn('id', fault)
+        self.assertEqual(404, fault['code'])
+        self.assertEqual([], self._written_faults())
+
+        db.instance_event_writes_flush(self.ctxt)
+
+        written = self._written_faults()
+        self.assertEqual(1, len(written))
+        self.assertEqual(404, written[0]['code'])
+        self.assertEqual([], sqlalchemy_api._BUFFERED_FAULTS)
+
+    def test_fault_get_merges_buffer(self):
+        self._create_fault(code=404)
+        db.instance_event_writes_flush(self.ctxt)
+        self._create_fault(code=500)
+        self._create_fault(code=503)
+
+        faults = db.instance_fault_get_by_instance_uuids(self.ctxt,
+                                                         [self.uuid])
+        self.assertEqual([503, 500, 404],
+                         [fault['code'] for fault in faults[self.uuid]])
+
+    def test_fault_get_not_buffering(self):
+        self.flags(instance_event_write_buffer_size=0)
+        self._create_fault()
+        self.assertEqual(1, len(self._written_faults()))
+        faults = db.instance_fault_get_by_instance_uuids(self.ctxt,
+                                                         [self.uuid])
+        self.assertEqual(1, len(faults[self.uuid]))
+
+    def test_flush_on_size(self):
+        self.flags(instance_event_write_buffer_size=2)
+        self._create_fault()
+        self.assertEqual([], self._written_faults())
+        self._create_fault()
+        self.assertEqual(2, len(self._written_faults()))
+
+    @mock.patch('time.time')
+    def test_flush_on_interval(self, mock_time):
+        mock_time.return_value = 100
+        self._create_fault()
+        mock_time.return_value = 159
+        self._create_fault()
+        self.assertEqual([], self._written_faults())
+        mock_time.return_value = 160
+        self._create_fault()
+        self.assertEqual(3, len(self._written_faults()))
+
+    def test_flush_failure_keeps_buffer(self):
+        self._create_fault()
+        with mock.patch.object(sqlalchemy_api, 'get_session',
+                               side_effect=db_exc.DBConnectionError()):
+            db.instance_event_writes_flush(self.ctxt)
+        self.assertEqual(1, len(sqlalchemy_api._BUFFERED_FAULTS))
+        db.instance_event_writes_flush(self.ctxt)
+        self.assertEqual(1, len(self._written_faults()))
+
+    def test_flush_failure_drops_bad_rows(self):
+        action = self._start_action()
+        self._create_fault(code=404)
+        bad_row = dict(sqlalchemy_api._BUFFERED_FAULTS[0], code=object())
+        sqlalchemy_api._BUFFERED_FAULTS.append(bad_row)
+        self._create_fault(code=500)
+        db.action_event_start(self.ctxt, self._event_values())
+        db.action_event_finish(self.ctxt, self._event_values(result='Error'))
+
+        db.instance_event_writes_flush(self.ctxt)
+
+        self.assertEqual([404, 500],
+                         sorted(fault['code']
+                                for fault in self._written_faults()))
+        self.assertEqual(1, len(self._written_events(action['id'])))
+        action = db.action_get_by_request_id(self.ctxt, self.uuid,
+                                             self.ctxt.request_id)
+        self.assertEqual('Error', action['message'])
+        self.assertEqual([], sqlalchemy_api._BUFFERED_FAULTS)
+        self.assertEqual({}, sqlalchemy_api._BUFFERED_EVENTS)
+        self.assertEqual(set(), sqlalchemy_api._BUFFERED_FAILED_ACTIONS)
+
+    def test_flush_failure_trims_buffer(self):
+        self.flags(instance_event_write_buffer_size=1)
+        self.stubs.Set(sqlalchemy_api, '_BUFFER_MAX_SIZE_FACTOR', 2)
+        with mock.patch.object(sqlalchemy_api, 'get_session',
+                               side_effect=db_exc.DBConnectionError()):
+            for code in (400, 401, 402, 403):
+                self._create_fault(code=code)
+        self.assertEqual([402, 403],
+                         [fault['code']
+                          for fault in sqlalchemy_api._BUFFERED_FAULTS])
+
+    def test_event_finish_coalesced(self):
+        action = self._start_action()
+        db.action_event_start(self.ctxt, self._event_values())
+        event = db.action_event_finish(self.ctxt,
+                                       self._event_values(result='Error'))
+        self.assertEqual('Error', event['result'])
+        self.assertIsNotNone(event['start_time'])
+        self.assertEqual([], self._written_events(action['id']))
+
+        db.instance_event_writes_flush(self.ctxt)
+
+        events = self._written_events(action['id'])
+        self.assertEqual(1, len(events))
+        self.assertIsNotNone(events[0]['start_time'])
+        self.assertEqual('Error', events[0]['result'])
+        action = db.action_get_by_request_id(self.ctxt, self.uuid,
+                                             self.ctxt.request_id)
+        self.assertEqual('Error', action['message'])
+
+    def test_event_finish_written_start(self):
+        action = self._start_action()
+        db.action_event_start(self.ctxt, self._event_values())
+        db.instance_event_writes_flush(self.ctxt)
+
+        db.action_event_finish(self.ctxt,
+                               self._event_values(result='Success'))
+
+        events = self._written_events(action['id'])
+        self.assertEqual('Success', events[0]['result'])
+        self.assertEqual({}, sqlalchemy_api._BUFFERED_EVENT_FINISHES)
+
+    def test_event_finish_start_buffered_elsewhere(self):
+        action = self._start_action()
+        db.action_event_finish(self.ctxt,
+                               self._event_values(result='Success'))
+        self.assertEqual(1, len(sqlalchemy_api._BUFFERED_EVENT_FINISHES))
+
+        # The start is written by another process.
+        self.flags(instance_event_write_buffer_size=0)
+        db.action_event_start(self.ctxt, self._event_values())
+        self.flags(instance_event_write_buffer_size=10)
+        db.instance_event_writes_flush(self.ctxt)
+
+        events = self._written_events(action['id'])
+        self.assertEqual('Success', events[0]['result'])
+        self.assertEqual({}, sqlalchemy_api._BUFFERED_EVENT_FINISHES)
+
+    def test_event_finish_never_started(self):
+        self._start_action()
+        db.action_event_finish(self.ctxt,
+                               self._event_values(result='Success'))
+        for i in range(sqlalchemy_api._EVENT_FINISH_RETRIES + 1):
+            self.assertEqual(1, len(sqlalchemy_api._BUFFERED_EVENT_FINISHES))
+            db.instance_event_writes_flush(self.ctxt)
+        self.assertEqual({}, sqlalchemy_api._BUFFERED_EVENT_FINISHES)
+
+    def test_event_start_no_action(self):
+        self.assertRaises(exception.InstanceActionNotFound,
+                          db.action_event_start, self.ctxt,
+                          self._event_values())
+        self.assertEqual({}, sqlalchemy_api._BUFFERED_EVENTS)
+
+
 class InstanceTypeTestCase(BaseInstanceTypeTestCase):
 
     def test_flavor_create(self):
@@ -5446,6 +5921,30 @@ class BlockDeviceMappingTestCase(test.TestCase):
         bmd = db.block_device_mapping_get_all_by_instance(self.ctxt, uuid2)
         self.assertEqual(len(bmd), 2)
 
+    def test_block_device_mapping_get_all_by_instance_uuids(self):
+        uuid1 = self.instance['uuid']
+        uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        uuid3 = db.instance_create(self.ctxt, {})['uuid']
+
+        bmds_values = [{'instance_uuid': uuid1,
+                        'device_name': '/dev/vda'},
+                       {'instance_uuid': uuid2,
+                        'device_name': '/dev/vdb'},
+                       {'instance_uuid': uuid3,
+                        'device_name': '/dev/vdc'}]
+
+        for bdm in bmds_values:
+            self._create_bdm(bdm)
+
+        bmd = db.block_device_mapping_get_all_by_instance_uuids(
+            self.ctxt, [uuid1, uuid2])
+        self.assertEqual(['/dev/vda', '/dev/vdb'],
+                         sorted(bdm['device_name'] for bdm in bmd))
+
+        bmd = db.block_device_mapping_get_all_by_instance_uuids(self.ctxt,
+                                                                [])
+        self.assertEqual([], bmd)
+
     def test_block_device_mapping_destroy(self):
         bdm = self._create_bdm({})
         db.block_device_mapping_destroy(self.ctxt, bdm['id'])
@@ -6527,7 +7026,8 @@ class S3ImageTestCase(test.TestCase):
 
 class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
 
-    _ignored_keys = ['id', 'deleted', 'deleted_at', 'created_at', 'updated_at']
+    _ignored_keys = ['id', 'deleted', 'deleted_at', 'created_at', 'updated_at',
+                     'generation']
 
     def setUp(self):
         super(ComputeNodeTestCase, self).setUp()
@@ -6611,6 +7111,33 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
             # Clean up the service
             db.service_destroy(self.ctxt, service['id'])
 
+    def test_compute_node_get_all_changed_since(self):
+        past = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, past)
+        self.assertEqual([self.item['id']], [node['id'] for node in nodes])
+
+        future = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, future)
+        self.assertEqual([], nodes)
+
+    def test_compute_node_get_all_changed_since_updated(self):
+        since = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(since + datetime.timedelta(minutes=1))
+        db.compute_node_update(self.ctxt, self.item['id'], {'vcpus_used': 1})
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual(1, len(nodes))
+        self.assertEqual(1, nodes[0]['vcpus_used'])
+
+    def test_compute_node_get_all_changed_since_deleted(self):
+        since = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        self.useFixture(test.TimeOverride())
+        timeutils.set_time_override(since + datetime.timedelta(minutes=1))
+        db.compute_node_delete(self.ctxt, self.item['id'])
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual(1, len(nodes))
+        self.assertTrue(nodes[0]['deleted'])
+
     def test_compute_node_get_all_mult_compute_nodes_one_service_entry(self):
         service_data = self.service_dict.copy()
         service_data['host'] = 'host2'
@@ -6744,6 +7271,40 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual(4, item_updated['vcpus'])
         new_stats = jsonutils.loads(item_updated['stats'])
         self.assertEqual(stats, new_stats)
+        self.assertEqual(self.item['generation'], item_updated['generation'])
+
+    def test_compute_node_update_generation(self):
+        self.flags(scheduler_claim_resources=True)
+        item_updated = db.compute_node_update(self.ctxt, self.item['id'],
+                                              {'vcpus': 4})
+        self.assertEqual(self.item['generation'] + 1,
+                         item_updated['generation'])
+
+    def test_compute_node_claim_resources(self):
+        compute_node_id = self.item['id']
+        generation = self.item['generation']
+        self.assertTrue(db.compute_node_claim_resources(
+            self.ctxt, compute_node_id, generation, 1, 512, 10))
+        node = db.compute_node_get(self.ctxt, compute_node_id)
+        self.assertEqual(generation + 1, node['generation'])
+        self.assertEqual(self.item['vcpus_used'] + 1, node['vcpus_used'])
+        self.assertEqual(self.item['memory_mb_used'] + 512,
+                         node['memory_mb_used'])
+        self.assertEqual(self.item['free_ram_mb'] - 512, node['free_ram_mb'])
+        self.assertEqual(self.item['local_gb_used'] + 10,
+                         node['local_gb_used'])
+        self.assertEqual(self.item['free_disk_gb'] - 10,
+                         node['free_disk_gb'])
+
+    def test_compute_node_claim_resources_changed(self):
+        self.flags(scheduler_claim_resources=True)
+        compute_node_id = self.item['id']
+        generation = self.item['generation']
+        db.compute_node_update(self.ctxt, compute_node_id, {'vcpus': 4})
+        self.assertFalse(db.compute_node_claim_resources(
+            self.ctxt, compute_node_id, generation, 1, 512, 10))
+        node = db.compute_node_get(self.ctxt, compute_node_id)
+        self.assertEqual(self.item['memory_mb_used'], node['memory_mb_used'])
 
     def test_compute_node_delete(self):
         compute_node_id = self.item['id']
@@ -8024,6 +8585,55 @@ class ArchiveTestCase(test.TestCase):
             'shadow_instance_id_mappings'
         )
 
+    def test_archive_deleted_rows_batch(self):
+        ids = []
+        for uuidstr in self.uuidstrs:
+            ins_stmt = self.instance_id_mappings.insert().values(uuid=uuidstr)
+            ids.append(self.conn.execute(ins_stmt).inserted_primary_key[0])
+        update_statement = self.instance_id_mappings.update().\
+                where(self.instance_id_mappings.c.uuid.in_(self.uuidstrs[1:]))\
+                .values(deleted=1)
+        self.conn.execute(update_statement)
+        qsiim = sql.select([self.shadow_instance_id_mappings.c.id]).\
+                where(self.shadow_instance_id_mappings.c.uuid.in_(
+                                                            self.uuidstrs))
+
+        num, marker = db.archive_deleted_rows_batch(
+            self.context, 'instance_id_mappings', 2)
+        self.assertEqual((2, ids[2]), (num, marker))
+        # A row deleted behind the marker is left for the next pass.
+        update_statement = self.instance_id_mappings.update().\
+                where(self.instance_id_mappings.c.uuid == self.uuidstrs[0])\
+                .values(deleted=1)
+        self.conn.execute(update_statement)
+        num, marker = db.archive_deleted_rows_batch(
+            self.context, 'instance_id_mappings', 2, marker=marker)
+        self.assertEqual((2, ids[4]), (num, marker))
+        num, marker = db.archive_deleted_rows_batch(
+            self.context, 'instance_id_mappings', 2, marker=marker)
+        self.assertEqual((1, ids[5]), (num, marker))
+        num, marker = db.archive_deleted_rows_batch(
+            self.context, 'instance_id_mappings', 2, marker=marker)
+        self.assertEqual((0, ids[5]), (num, marker))
+        rows = self.conn.execute(qsiim).fetchall()
+        self.assertEqual(ids[1:], sorted(row[0] for row in rows))
+
+        num, marker = db.archive_deleted_rows_batch(
+            self.context, 'instance_id_mappings', 2)
+        self.assertEqual((1, ids[0]), (num, marker))
+        self._assert_shadow_tables_empty_except(
+            'shadow_instance_id_mappings')
+
+    def test_archive_table_names(self):
+        tablenames = db.archive_table_names()
+        self.assertNotIn('shadow_instances', tablenames)
+        for child, parent in [('instance_info_caches', 'instances'),
+                              ('instance_extra', 'instances'),
+                              ('block_device_mapping', 'instances'),
+                              ('consoles', 'console_pools')]:
+            self.assertLess(tablenames.index(child),
+                            tablenames.index(parent))
+
 
 class InstanceGroupDBApiTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
@@ -680,6 +680,23 @@ class NovaMigrationsCheckers(test_migrations.ModelsMigrationsSync,
         self.assertTableNotExists(engine, 'shadow_iscsi_targets')
         self.assertTableNotExists(engine, 'shadow_volumes')
 
+    def _check_293(self, engine, data):
+        self.assertColumnExists(engine, 'compute_nodes', 'generation')
+        self.assertColumnExists(engine, 'shadow_compute_nodes', 'generation')
+
+        compute_nodes = oslodbutils.get_table(engine, 'compute_nodes')
+        self.assertIsInstance(compute_nodes.c.generation.type,
+                              sqlalchemy.types.Integer)
+        self.assertTrue(compute_nodes.c.generation.nullable)
+
+    def _check_294(self, engine, data):
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_project_id_deleted_created_at_idx',
+                                ['project_id', 'deleted', 'created_at', 'id'])
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_updated_at_idx',
+                                ['updated_at'])
+
 
 class TestNovaMigrationsSQLite(NovaMigrationsCheckers,
                                test_base.DbTestCase,
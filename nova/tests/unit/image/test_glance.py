@@ -15,7 +15,9 @@
 
 
 import datetime
+import os
 
+import fixtures
 import glanceclient.exc
 import mock
 from oslo_config import cfg
@@ -449,7 +451,7 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
     @mock.patch('nova.image.glance.GlanceImageService.show')
     def test_download_no_data_dest_path(self, show_mock, open_mock):
         client = mock.MagicMock()
-        client.call.return_value = [1, 2, 3]
+        client.call.return_value = ['a', 'b', 'c']
         ctx = mock.sentinel.ctx
         writer = mock.MagicMock()
         open_mock.return_value = writer
@@ -464,13 +466,40 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
         self.assertIsNone(res)
         writer.write.assert_has_calls(
                 [
-                    mock.call(1),
-                    mock.call(2),
-                    mock.call(3)
+                    mock.call('a'),
+                    mock.call('b'),
+                    mock.call('c')
                 ]
         )
         writer.close.assert_called_once_with()
 
+    def test_download_dest_path_sparse(self):
+        chunks = ['a' * 512, '\0' * 1024, 'b' * 512, '\0' * 1024]
+        client = mock.MagicMock()
+        client.call.return_value = chunks
+        dst_path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                'image')
+        service = glance.GlanceImageService(client)
+        service.download(mock.sentinel.ctx, mock.sentinel.image_id,
+                         dst_path=dst_path)
+
+        with open(dst_path, 'rb') as image_file:
+            self.assertEqual(''.join(chunks), image_file.read())
+
+    @mock.patch('__builtin__.open')
+    def test_download_dest_path_write_error(self, open_mock):
+        client = mock.MagicMock()
+        client.call.return_value = ['a', 'b', 'c']
+        writer = mock.MagicMock()
+        writer.write.side_effect = IOError
+        open_mock.return_value = writer
+        service = glance.GlanceImageService(client)
+        self.assertRaises(IOError, service.download, mock.sentinel.ctx,
+                          mock.sentinel.image_id,
+                          dst_path=mock.sentinel.dst_path)
+        writer.write.assert_called_once_with('a')
+        writer.close.assert_called_once_with()
+
     @mock.patch('__builtin__.open')
     @mock.patch('nova.image.glance.GlanceImageService.show')
     def test_download_data_dest_path(self, show_mock, open_mock):
@@ -530,6 +559,52 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
                                                   mock.sentinel.dst_path,
                                                   mock.sentinel.loc_meta)
 
+    @mock.patch.object(glance, 'LOG')
+    @mock.patch('nova.image.glance.GlanceImageService._get_transfer_module')
+    @mock.patch('nova.image.glance.GlanceImageService.show')
+    def test_download_direct_peer_first(self, show_mock, get_tran_mock,
+                                        mock_log):
+        self.flags(allowed_direct_url_schemes=['file', 'peer'],
+                   group='glance')
+        show_mock.return_value = {
+            'checksum': mock.sentinel.checksum,
+            'size': mock.sentinel.size,
+            'disk_format': mock.sentinel.disk_format,
+            'locations': [
+                {
+                    'url': 'file:///files/image',
+                    'metadata': mock.sentinel.loc_meta
+                }
+            ]
+        }
+        peer_mod = mock.MagicMock()
+        peer_mod.download.side_effect = (
+            exception.ImageDownloadModuleUnavailableError(module='peer',
+                                                          reason=''))
+        file_mod = mock.MagicMock()
+        get_tran_mock.side_effect = lambda scheme: {'peer': peer_mod,
+                                                    'file': file_mod}[scheme]
+        client = mock.MagicMock()
+        ctx = mock.sentinel.ctx
+        service = glance.GlanceImageService(client)
+        res = service.download(ctx, 'fake-image',
+                               dst_path=mock.sentinel.dst_path)
+
+        self.assertIsNone(res)
+        self.assertFalse(client.call.called)
+        self.assertEqual([mock.call('peer'), mock.call('file')],
+                         get_tran_mock.call_args_list)
+        peer_mod.download.assert_called_once_with(
+            ctx, mock.ANY, mock.sentinel.dst_path,
+            {'checksum': mock.sentinel.checksum, 'size': mock.sentinel.size,
+             'disk_format': mock.sentinel.disk_format})
+        self.assertFalse(mock_log.exception.called)
+        self.assertEqual('fake-image',
+                         peer_mod.download.call_args[0][1].netloc)
+        file_mod.download.assert_called_once_with(ctx, mock.ANY,
+                                                  mock.sentinel.dst_path,
+                                                  mock.sentinel.loc_meta)
+
     @mock.patch('__builtin__.open')
     @mock.patch('nova.image.glance.GlanceImageService._get_transfer_module')
     @mock.patch('nova.image.glance.GlanceImageService.show')
@@ -552,7 +627,7 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
         tran_mod.download.side_effect = Exception
         get_tran_mock.return_value = tran_mod
         client = mock.MagicMock()
-        client.call.return_value = [1, 2, 3]
+        client.call.return_value = ['a', 'b', 'c']
         ctx = mock.sentinel.ctx
         writer = mock.MagicMock()
         open_mock.return_value = writer
@@ -577,9 +652,9 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
         self.assertIsNone(res)
         writer.write.assert_has_calls(
                 [
-                    mock.call(1),
-                    mock.call(2),
-                    mock.call(3)
+                    mock.call('a'),
+                    mock.call('b'),
+                    mock.call('c')
                 ]
         )
 
@@ -603,7 +678,7 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
         }
         get_tran_mock.return_value = None
         client = mock.MagicMock()
-        client.call.return_value = [1, 2, 3]
+        client.call.return_value = ['a', 'b', 'c']
         ctx = mock.sentinel.ctx
         writer = mock.MagicMock()
         open_mock.return_value = writer
@@ -625,9 +700,9 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
         self.assertIsNone(res)
         writer.write.assert_has_calls(
                 [
-                    mock.call(1),
-                    mock.call(2),
-                    mock.call(3)
+                    mock.call('a'),
+                    mock.call('b'),
+                    mock.call('c')
                 ]
         )
         writer.close.assert_called_once_with()
@@ -12,12 +12,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import os
+import shutil
 import urlparse
 
+import fixtures
 import mock
+from oslo_concurrency import processutils
 
+from nova import context
 from nova import exception
 from nova.image.download import file as tm_file
+from nova.image.download import peer as tm_peer
+from nova import objects
 from nova import test
 
 
@@ -99,3 +107,186 @@ class TestFileTransferModule(test.NoDBTestCase):
                           tm.download, mock.sentinel.ctx, url_parts,
                           dst_file, loc_meta)
         self.assertFalse(copy_mock.called)
+
+
+class TestPeerTransferModule(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestPeerTransferModule, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(host='node0', instances_path='/instances')
+        self.image_id = 'fake-image'
+        self.data = 'image data'
+        self.metadata = {'checksum': hashlib.md5(self.data).hexdigest(),
+                         'size': len(self.data),
+                         'disk_format': 'raw'}
+        self.url_parts = urlparse.urlparse('peer://%s' % self.image_id)
+        self.dst_path = os.path.join(self.tmpdir, 'image.part')
+        self.ctx = context.get_admin_context()
+        # Every stand-in compute node keeps its instances_path in a directory
+        # of its own, named after the node.
+        self.nodes = ['node0', 'node1', 'node2', 'node3']
+        self.up = set(self.nodes)
+        self.image_nodes = list(self.nodes)
+        self.copies = []
+
+        services = objects.ServiceList(objects=[
+            objects.Service(host=node) for node in self.nodes])
+        compute_nodes = objects.ComputeNodeList(objects=[
+            objects.ComputeNode(host=node, host_ip='10.0.0.%d' % i)
+            for i, node in enumerate(self.nodes)])
+        for patcher in (
+                mock.patch.object(objects.InstanceList, 'get_by_filters',
+                                  side_effect=self._fake_get_by_filters),
+                mock.patch.object(objects.ServiceList, 'get_by_binary',
+                                  return_value=services),
+                mock.patch.object(objects.ComputeNodeList, 'get_all',
+                                  return_value=compute_nodes),
+                mock.patch.object(tm_peer.lv_utils, 'copy_image',
+                                  side_effect=self._fake_copy_image),
+                mock.patch.object(tm_peer.utils, 'ssh_execute',
+                                  side_effect=self._fake_ssh_execute),
+                mock.patch.object(tm_peer.random, 'shuffle')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.tm = tm_peer.PeerTransfer()
+        self.tm.servicegroup_api = mock.Mock()
+        self.tm.servicegroup_api.service_is_up.side_effect = (
+            lambda service: service.host in self.up)
+
+    def _fake_get_by_filters(self, context, filters, expected_attrs=None,
+                             expected_fields=None):
+        self.assertEqual(self.image_id, filters['image_ref'])
+        self.assertEqual(['host'], expected_fields)
+        return objects.InstanceList(objects=[
+            objects.Instance(host=node) for node in self.image_nodes])
+
+    def _node_path(self, host, path):
+        node = self.nodes[int(host.rsplit('.', 1)[1])]
+        return os.path.join(self.tmpdir, node,
+                            os.path.relpath(path, '/instances'))
+
+    def _fake_ssh_execute(self, host, *cmd):
+        self.assertEqual(('stat', '-c', '%s'), cmd[:-1])
+        path = self._node_path(host, cmd[-1])
+        if not os.path.exists(path):
+            raise processutils.ProcessExecutionError()
+        return '%d\n' % os.path.getsize(path), ''
+
+    def _fake_copy_image(self, src, dest, host=None, receive=False):
+        self.assertTrue(receive)
+        self.copies.append(host)
+        path = self._node_path(host, src)
+        if not os.path.exists(path):
+            raise processutils.ProcessExecutionError()
+        shutil.copyfile(path, dest)
+
+    def _cache_image(self, node, data):
+        base_dir = os.path.join(self.tmpdir, node, '_base')
+        if not os.path.exists(base_dir):
+            os.makedirs(base_dir)
+        with open(os.path.join(base_dir, hashlib.sha1(
+                self.image_id).hexdigest()), 'wb') as base_file:
+            base_file.write(data)
+
+    def _download(self):
+        self.tm.download(self.ctx, self.url_parts, self.dst_path,
+                         self.metadata)
+
+    def test_download_from_peer(self):
+        self._cache_image('node2', self.data)
+
+        self._download()
+
+        self.assertEqual(['10.0.0.2'], self.copies)
+        # The sizes of all the peers are asked for at once.
+        self.assertEqual(3, tm_peer.utils.ssh_execute.call_count)
+        with open(self.dst_path) as dst_file:
+            self.assertEqual(self.data, dst_file.read())
+
+    def test_download_skips_mismatched_copies(self):
+        self._cache_image('node1', 'image dat')
+        self._cache_image('node2', 'image dota')
+        self._cache_image('node3', self.data)
+
+        self._download()
+
+        # The size of the base image of node1 is wrong, it is not copied.
+        self.assertEqual(['10.0.0.2', '10.0.0.3'], self.copies)
+        with open(self.dst_path) as dst_file:
+            self.assertEqual(self.data, dst_file.read())
+
+    def test_download_skips_down_peers(self):
+        self._cache_image('node1', self.data)
+        self._cache_image('node2', self.data)
+        self.up.discard('node1')
+
+        self._download()
+
+        self.assertEqual(['10.0.0.2'], self.copies)
+
+    def test_download_max_peers(self):
+        self.flags(max_peers=2, group='image_peer')
+        self._cache_image('node3', self.data)
+
+        self.assertRaises(exception.ImageDownloadModuleUnavailableError,
+                          self._download)
+        self.assertEqual([], self.copies)
+        self.assertEqual(2, tm_peer.utils.ssh_execute.call_count)
+        self.assertFalse(os.path.exists(self.dst_path))
+
+    def test_download_no_peer_has_image(self):
+        self._cache_image('node0', self.data)
+
+        self.assertRaises(exception.ImageDownloadModuleUnavailableError,
+                          self._download)
+        self.assertEqual([], self.copies)
+        self.assertEqual(3, tm_peer.utils.ssh_execute.call_count)
+        self.assertFalse(os.path.exists(self.dst_path))
+
+    def test_download_only_from_image_peers(self):
+        self._cache_image('node1', self.data)
+        self._cache_image('node2', self.data)
+        self.image_nodes = ['node0', 'node2']
+
+        self._download()
+
+        self.assertEqual(['10.0.0.2'], self.copies)
+        self.assertEqual(1, tm_peer.utils.ssh_execute.call_count)
+
+    def test_download_no_peer_runs_image(self):
+        self._cache_image('node1', self.data)
+        self.image_nodes = ['node0']
+
+        self.assertRaises(exception.ImageDownloadModuleUnavailableError,
+                          self._download)
+        self.assertFalse(objects.ServiceList.get_by_binary.called)
+        self.assertFalse(tm_peer.utils.ssh_execute.called)
+
+    def test_download_converted_image(self):
+        self._cache_image('node1', self.data)
+        self.metadata['disk_format'] = 'qcow2'
+
+        self.assertRaises(exception.ImageDownloadModuleUnavailableError,
+                          self._download)
+        self.assertFalse(tm_peer.utils.ssh_execute.called)
+
+        self.flags(force_raw_images=False)
+        self._download()
+        self.assertEqual(['10.0.0.1'], self.copies)
+
+    def test_download_without_checksum(self):
+        self._cache_image('node1', self.data)
+        self.metadata['checksum'] = None
+
+        self.assertRaises(exception.ImageDownloadModuleMetaDataError,
+                          self._download)
+        self.assertEqual([], self.copies)
+
+    def test_peer_addresses_default_to_host(self):
+        objects.ComputeNodeList.get_all.return_value = (
+            objects.ComputeNodeList(objects=[]))
+
+        self.assertEqual(['node1', 'node2', 'node3'],
+                         self.tm._get_peers(self.ctx, self.image_id))
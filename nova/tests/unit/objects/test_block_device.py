@@ -303,6 +303,36 @@ class _TestBlockDeviceMappingListObject(object):
                     self.context, 'fake_instance_uuid'))
         self.assertEqual(0, len(bdm_list))
 
+    @mock.patch.object(db, 'block_device_mapping_get_all_by_instance_uuids')
+    def test_get_by_instance_uuids(self, get_all_by_uuids):
+        fakes = [self.fake_bdm(123), self.fake_bdm(456)]
+        get_all_by_uuids.return_value = fakes
+        bdm_list = objects.BlockDeviceMappingList.get_by_instance_uuids(
+            self.context, ['fake-instance'])
+        self.assertEqual([123, 456], [bdm.id for bdm in bdm_list])
+        get_all_by_uuids.assert_called_once_with(
+            self.context, ['fake-instance'], use_slave=False)
+
+    @mock.patch.object(db, 'block_device_mapping_get_all_by_instance_uuids')
+    def test_bdms_by_instance_uuid(self, get_all_by_uuids):
+        fakes = [self.fake_bdm(123), self.fake_bdm(456)]
+        get_all_by_uuids.return_value = fakes
+        bdms_by_uuid = objects.BlockDeviceMappingList.bdms_by_instance_uuid(
+            self.context, ['fake-instance', 'other-instance'])
+        self.assertEqual([123, 456],
+                         [bdm.id for bdm in bdms_by_uuid['fake-instance']])
+        self.assertIsInstance(bdms_by_uuid['other-instance'],
+                              objects.BlockDeviceMappingList)
+        self.assertEqual(0, len(bdms_by_uuid['other-instance']))
+        self.assertEqual(1, get_all_by_uuids.call_count)
+
+    @mock.patch.object(db, 'block_device_mapping_get_all_by_instance_uuids')
+    def test_bdms_by_instance_uuid_no_uuids(self, get_all_by_uuids):
+        self.assertEqual(
+            {}, objects.BlockDeviceMappingList.bdms_by_instance_uuid(
+                self.context, []))
+        self.assertFalse(get_all_by_uuids.called)
+
     def test_root_volume_metadata(self):
         fake_volume = {
                 'volume_image_metadata': {'vol_test_key': 'vol_test_value'}}
@@ -12,6 +12,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+import iso8601
 import mock
 from oslo_serialization import jsonutils
 from oslo_utils import timeutils
@@ -76,6 +79,7 @@ fake_compute_node = {
     'numa_topology': fake_numa_topology_db_format,
     'supported_instances': fake_supported_hv_specs_db_format,
     'pci_stats': fake_pci,
+    'generation': 3,
     }
 # FIXME(sbauza) : For compatibility checking, to be removed once we are sure
 # that all computes are running latest DB version with host field in it.
@@ -346,6 +350,30 @@ class _TestComputeNodeObject(object):
                          subs=self.subs(),
                          comparators=self.comparators())
 
+    def test_get_all_changed_since(self):
+        changes_since = datetime.datetime(2015, 1, 1, 2,
+                                          tzinfo=iso8601.iso8601.FixedOffset(
+                                              1, 0, '+01:00'))
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        db.compute_node_get_all_changed_since(
+            self.context,
+            datetime.datetime(2015, 1, 1, 1)).AndReturn([fake_compute_node])
+        self.mox.ReplayAll()
+        computes = compute_node.ComputeNodeList.get_all_changed_since(
+            self.context, changes_since)
+        self.assertEqual(1, len(computes))
+        self.compare_obj(computes[0], fake_compute_node,
+                         subs=self.subs(),
+                         comparators=self.comparators())
+
+    def test_claim_resources(self):
+        self.mox.StubOutWithMock(db, 'compute_node_claim_resources')
+        db.compute_node_claim_resources(self.context, 123, 3, 1, 512,
+                                        10).AndReturn(True)
+        self.mox.ReplayAll()
+        self.assertTrue(compute_node.ComputeNode.claim_resources(
+            self.context, 123, 3, 1, 512, 10))
+
     def test_get_by_hypervisor(self):
         self.mox.StubOutWithMock(db, 'compute_node_search_by_hypervisor')
         db.compute_node_search_by_hypervisor(self.context, 'hyper').AndReturn(
@@ -419,6 +447,11 @@ class _TestComputeNodeObject(object):
         primitive = compute.obj_to_primitive(target_version='1.6')
         self.assertNotIn('host', primitive)
 
+    def test_compat_generation(self):
+        compute = compute_node.ComputeNode(generation=3)
+        primitive = compute.obj_to_primitive(target_version='1.11')
+        self.assertNotIn('generation', primitive['nova_object.data'])
+
     def test_compat_pci_device_pools(self):
         compute = compute_node.ComputeNode()
         compute.pci_device_pools = fake_pci_device_pools.fake_pool_list
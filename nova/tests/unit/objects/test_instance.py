@@ -1118,6 +1118,53 @@ class _TestInstanceObject(object):
                                          expected_attrs=['metadata'])
         self.assertNotIn('metadata', inst.obj_what_changed())
 
+    @mock.patch.object(objects.Instance, 'get_by_uuid')
+    def test_load_deferred_fields(self, mock_get):
+        mock_get.return_value = instance.Instance(host='fake-host',
+                                                  vm_state='active',
+                                                  task_state=None)
+        inst = instance.Instance._from_db_object(
+            self.context, instance.Instance(), {'id': 1, 'uuid': 'fake-uuid'},
+            expected_attrs=[], expected_fields=['id', 'uuid'])
+        self.assertEqual('fake-host', inst.host)
+        self.assertEqual('active', inst.vm_state)
+        mock_get.assert_called_once_with(self.context, uuid='fake-uuid',
+                                         expected_attrs=[])
+        self.assertIsNone(inst.task_state)
+        self.assertEqual(set(), inst.obj_what_changed())
+
+    def test_deferred_fields_serialization(self):
+        inst = instance.Instance._from_db_object(
+            self.context, instance.Instance(), {'id': 1, 'uuid': 'fake-uuid'},
+            expected_attrs=[], expected_fields=['id', 'uuid'])
+        primitive = inst.obj_to_primitive()
+        inst2 = instance.Instance.obj_from_primitive(primitive, self.context)
+        self.assertIn('host', inst2._deferred_fields)
+        self.assertIn('host', inst.obj_clone()._deferred_fields)
+
+    def test_deferred_fields_backport(self):
+        inst = instance.Instance._from_db_object(
+            self.context, instance.Instance(), {'id': 1, 'uuid': 'fake-uuid'},
+            expected_attrs=[], expected_fields=['id', 'uuid'])
+        primitive = inst.obj_to_primitive(target_version='1.20')
+        self.assertNotIn('nova_object.deferred_fields', primitive)
+        inst_list = instance.InstanceList(objects=[inst])
+        primitive = inst_list.obj_to_primitive(target_version='1.20')
+        self.assertIn('nova_object.deferred_fields',
+                      primitive['nova_object.data']['objects'][0])
+        primitive = inst_list.obj_to_primitive(target_version='1.19')
+        self.assertNotIn('nova_object.deferred_fields',
+                         primitive['nova_object.data']['objects'][0])
+
+    def test_load_column_field_not_created(self):
+        inst = instance.Instance(context=self.context, uuid='fake-uuid')
+        self.assertRaises(exception.ObjectActionError, getattr, inst, 'host')
+
+    def test_load_column_field_not_deferred(self):
+        inst = instance.Instance(context=self.context, id=1,
+                                 uuid='fake-uuid')
+        self.assertRaises(exception.ObjectActionError, getattr, inst, 'host')
+
     @mock.patch('nova.db.instance_fault_get_by_instance_uuids')
     def test_load_fault(self, mock_get):
         fake_fault = test_instance_fault.fake_faults['fake-uuid'][0]
@@ -1442,6 +1489,50 @@ class _TestInstanceListObject(object):
         self.assertEqual(inst_list.obj_what_changed(), set())
         self.assertRemotes()
 
+    def _test_get_by_filters_expected_fields(self, columns):
+        fakes = [{'id': 1, 'uuid': 'fake-uuid', 'host': 'fake-host',
+                  'hostname': 'fake-name', 'metadata': [],
+                  'system_metadata': []}]
+        with mock.patch.object(db, 'instance_get_all_by_filters',
+                               return_value=fakes) as mock_get:
+            inst_list = instance.InstanceList.get_by_filters(
+                self.context, {'host': 'fake-host'}, expected_attrs=[],
+                expected_fields=['host'])
+            mock_get.assert_called_once_with(
+                self.context, {'host': 'fake-host'}, 'created_at', 'desc',
+                limit=None, marker=None, columns_to_join=[], use_slave=False,
+                columns=columns)
+        inst = inst_list[0]
+        self.assertEqual('fake-uuid', inst.uuid)
+        self.assertEqual('fake-host', inst.host)
+        self.assertFalse(inst.obj_attr_is_set('vm_state'))
+        self.assertEqual(set(), inst.obj_what_changed())
+        return inst
+
+    def test_get_by_filters_expected_fields(self):
+        inst = self._test_get_by_filters_expected_fields(['host'])
+        self.assertEqual('instance-00000001', inst.name)
+
+    def test_get_by_filters_expected_fields_name_template(self):
+        self.flags(instance_name_template='%(hostname)s')
+        inst = self._test_get_by_filters_expected_fields(['host', 'hostname'])
+        self.assertEqual('fake-name', inst.name)
+
+    def test_get_by_hosts(self):
+        fakes = [self.fake_instance(1),
+                 self.fake_instance(2)]
+        self.mox.StubOutWithMock(db, 'instance_get_all_by_hosts')
+        db.instance_get_all_by_hosts(self.context, ['foo', 'bar'],
+                                     columns_to_join=None,
+                                     use_slave=False).AndReturn(fakes)
+        self.mox.ReplayAll()
+        inst_list = instance.InstanceList.get_by_hosts(self.context,
+                                                       ['foo', 'bar'])
+        for i in range(0, len(fakes)):
+            self.assertIsInstance(inst_list.objects[i], instance.Instance)
+            self.assertEqual(inst_list.objects[i].uuid, fakes[i]['uuid'])
+        self.assertRemotes()
+
     def test_get_by_host_and_node(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2)]
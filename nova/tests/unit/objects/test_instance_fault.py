@@ -109,6 +109,21 @@ class _TestInstanceFault(object):
         self.flags(cell_type='compute', enable=True, group='cells')
         self._test_create(True)
 
+    @mock.patch('nova.db.instance_fault_create')
+    def test_create_buffered(self, mock_create):
+        db_fault = dict(fake_faults['fake-uuid'][1])
+        del db_fault['id']
+        mock_create.return_value = db_fault
+        fault = instance_fault.InstanceFault(context=self.context)
+        fault.instance_uuid = 'fake-uuid'
+        fault.code = 456
+        fault.message = 'msg2'
+        fault.details = 'details'
+        fault.host = 'host'
+        fault.create()
+        self.assertFalse(fault.obj_attr_is_set('id'))
+        self.assertEqual(456, fault.code)
+
     def test_create_already_created(self):
         fault = instance_fault.InstanceFault()
         fault.id = 1
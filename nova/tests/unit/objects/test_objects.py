@@ -205,6 +205,36 @@ class TestMetaclass(test.NoDBTestCase):
         self.assertRaises(exception.ObjectFieldInvalid,
                           create_class, int)
 
+    def test_compact_storage(self):
+        class CompactObj(base.NovaPersistentObject, base.NovaObject):
+            obj_compact_storage = True
+            fields = {'foo': fields.IntegerField(),
+                      'bar': fields.StringField()}
+
+        class CompactChild(CompactObj):
+            fields = {'baz': fields.IntegerField()}
+
+        self.assertEqual(('_bar', '_changed_fields', '_context',
+                          '_created_at', '_deleted', '_deleted_at',
+                          '_foo', '_updated_at'),
+                         CompactObj.__slots__)
+        self.assertEqual(('_baz',), CompactChild.__slots__)
+        self.assertNotIn('__slots__', MyObj.__dict__)
+
+        obj = CompactChild(foo=1, baz=2)
+        self.assertEqual({}, obj.__dict__)
+        self.assertEqual(1, obj.foo)
+        self.assertEqual(2, obj.baz)
+        self.assertFalse(obj.obj_attr_is_set('bar'))
+        self.assertEqual(set(['foo', 'baz']), obj.obj_what_changed())
+        obj.obj_reset_changes()
+        obj.bar = 'bar'
+        self.assertEqual(set(['bar']), obj.obj_what_changed())
+        del obj.foo
+        self.assertFalse(obj.obj_attr_is_set('foo'))
+        self.assertEqual({'bar': 'bar', 'baz': 2},
+                         obj.obj_to_primitive()['nova_object.data'])
+
 
 class TestObjToPrimitive(test.NoDBTestCase):
 
@@ -901,6 +931,33 @@ class _TestObject(object):
             obj.obj_to_primitive('1.0')
             self.assertTrue(mock_mc.called)
 
+    def test_obj_to_primitive_same_version_does_not_backport(self):
+        obj = MyObj(foo=123)
+        with mock.patch.object(obj, 'obj_make_compatible') as mock_mc:
+            primitive = obj.obj_to_primitive(obj.VERSION)
+            self.assertFalse(mock_mc.called)
+        self.assertEqual(obj.VERSION, primitive['nova_object.version'])
+        self.assertEqual({'foo': 123}, primitive['nova_object.data'])
+
+    def test_obj_primitive_fields(self):
+        plain = {name: (plain_to, plain_from)
+                 for name, _attr, _field, plain_to, plain_from
+                 in MyObj._obj_primitive_fields}
+        self.assertEqual(sorted(MyObj.fields), sorted(plain))
+        self.assertEqual((True, True), plain['foo'])
+        self.assertEqual((False, False), plain['created_at'])
+        self.assertEqual((False, False), plain['rel_object'])
+
+    def test_obj_to_primitive_skips_plain_fields(self):
+        obj = MyObj(foo=123, created_at=timeutils.utcnow())
+        with mock.patch.object(fields.Field, 'to_primitive',
+                               return_value='fake') as mock_tp:
+            primitive = obj.obj_to_primitive()
+            mock_tp.assert_called_once_with(obj, 'created_at',
+                                            obj.created_at)
+        self.assertEqual({'foo': 123, 'created_at': 'fake'},
+                         primitive['nova_object.data'])
+
     def test_delattr(self):
         obj = MyObj(bar='foo')
         del obj.bar
@@ -917,6 +974,13 @@ class _TestObject(object):
 
 
 class TestObject(_LocalTest, _TestObject):
+    def test_batched_saves_local(self):
+        obj = MyObj.query(self.context)
+        obj.bar = 'local'
+        with base.batched_saves():
+            obj.save()
+            self.assertEqual(set(), obj.obj_what_changed())
+
     def test_set_defaults(self):
         obj = MyObj()
         obj.obj_set_defaults('foo')
@@ -945,6 +1009,88 @@ class TestObject(_LocalTest, _TestObject):
 
 
 class TestRemoteObject(_RemoteTest, _TestObject):
+    def test_batched_saves(self):
+        obj1 = MyObj.query(self.context)
+        obj2 = MyObj.query(self.context)
+        self.remote_object_calls = []
+        with mock.patch.object(conductor_rpcapi.ConductorAPI,
+                               'object_action') as mock_action:
+            with base.batched_saves():
+                obj1.bar = 'one'
+                obj1.save()
+                obj2.bar = 'two'
+                obj2.save()
+                self.assertEqual(set(['bar']), obj1.obj_what_changed())
+                self.assertEqual([], self.remote_object_calls)
+        self.assertFalse(mock_action.called)
+        self.assertEqual([('one', 'save'), ('two', 'save')],
+                         [(obj.bar, method) for obj, method
+                          in self.remote_object_calls])
+        self.assertEqual(set(), obj1.obj_what_changed())
+        self.assertEqual(set(), obj2.obj_what_changed())
+
+    def test_batched_saves_failure(self):
+        obj1 = MyObj.query(self.context)
+        obj2 = MyObj.query(self.context)
+        orig_object_action = self.conductor_service.manager.object_action
+        failed = []
+
+        def fake_object_action(*args, **kwargs):
+            if kwargs['objinst'].bar == 'fail':
+                failed.append(kwargs['objinst'])
+                raise exception.InstanceNotFound(instance_id='fake')
+            return orig_object_action(*args, **kwargs)
+        self.stubs.Set(self.conductor_service.manager, 'object_action',
+                       fake_object_action)
+
+        def save_both():
+            with base.batched_saves():
+                obj1.bar = 'fail'
+                obj1.save()
+                obj2.bar = 'two'
+                obj2.save()
+
+        # The save after the failed one is still made and applied
+        self.assertRaises(exception.InstanceNotFound, save_both)
+        self.assertEqual(set(['bar']), obj1.obj_what_changed())
+        self.assertEqual(set(), obj2.obj_what_changed())
+        self.assertEqual('two', self.remote_object_calls[-1][0].bar)
+        # The failed save is not made again to get its error
+        self.assertEqual(1, len(failed))
+
+    def test_batched_saves_block_raises(self):
+        obj = MyObj.query(self.context)
+        self.remote_object_calls = []
+
+        def save_and_fail():
+            with base.batched_saves():
+                obj.bar = 'one'
+                obj.save()
+                raise test.TestingException()
+
+        # The saves made before the block raised are still sent
+        self.assertRaises(test.TestingException, save_and_fail)
+        self.assertEqual([('one', 'save')],
+                         [(saved.bar, method) for saved, method
+                          in self.remote_object_calls])
+        self.assertEqual(set(), obj.obj_what_changed())
+
+    def test_batched_saves_sent_before_other_calls(self):
+        obj = MyObj.query(self.context)
+        self.remote_object_calls = []
+        with base.batched_saves():
+            obj.save()
+            self.assertEqual('polo', obj.marco())
+            self.assertEqual(['save', 'marco'],
+                             [call[1] for call in self.remote_object_calls])
+            obj.save()
+            obj.save()
+            self.assertEqual(['save', 'marco', 'save'],
+                             [call[1] for call in self.remote_object_calls])
+            MyObj.query(self.context)
+            self.assertEqual(['save', 'marco', 'save', 'save', 'query'],
+                             [call[1] for call in self.remote_object_calls])
+
     def test_major_version_mismatch(self):
         MyObj2.VERSION = '2.0'
         self.assertRaises(exception.IncompatibleObjectVersion,
@@ -1217,25 +1363,25 @@ object_data = {
     'AggregateList': '1.2-13a2dfb67f9cb9aee815e233bc89f34c',
     'BandwidthUsage': '1.2-e7d3b3a5c3950cc67c99bc26a1075a70',
     'BandwidthUsageList': '1.2-fe73c30369dd23c41619c9c19f27a562',
-    'BlockDeviceMapping': '1.9-c87e9c7e5cfd6a402f32727aa74aca95',
-    'BlockDeviceMappingList': '1.10-44b9818d5e90a7396eb807540cbe42c0',
+    'BlockDeviceMapping': '1.10-c87e9c7e5cfd6a402f32727aa74aca95',
+    'BlockDeviceMappingList': '1.12-76073ed236d72e1f476681a8dec0a9a0',
     'CellMapping': '1.0-4b1616970814c3c819e10c7ef6b9c3d5',
-    'ComputeNode': '1.11-5f8cd6948ad98fcc0c39b79d49acc4b6',
-    'ComputeNodeList': '1.11-f09b7f64339350b4296ac85c07e3a573',
+    'ComputeNode': '1.12-25e464cdb9be04416cc5662ec017c5b0',
+    'ComputeNodeList': '1.13-549911109f036d60f66d7f59a23b4fac',
     'DNSDomain': '1.0-5bdc288d7c3b723ce86ede998fd5c9ba',
     'DNSDomainList': '1.0-bc58364180c693203ebcf5e5d5775736',
     'EC2Ids': '1.0-8e193896fa01cec598b875aea94da608',
     'EC2InstanceMapping': '1.0-e9c3257badcc3aa14089b0a62f163108',
     'EC2SnapshotMapping': '1.0-a545acd0d1519d4316b9b00f30e59b4d',
     'EC2VolumeMapping': '1.0-15710aa212b5cbfdb155fdc81cce4ede',
-    'FixedIP': '1.10-4e8060f91f6c94ae73d557708ec62f56',
-    'FixedIPList': '1.10-724a59f2446d917d0bd13d6aa33edf8a',
+    'FixedIP': '1.11-4e8060f91f6c94ae73d557708ec62f56',
+    'FixedIPList': '1.11-1ad603035cfd9c5356ebdd8c3d17bf7f',
     'Flavor': '1.1-01ed47361fbe76bf728edf667d3f45d3',
     'FlavorList': '1.1-ab3f242e0db21db87285f2ac2ddc5c72',
     'FloatingIP': '1.6-24c614d2c3d4887254a679be65c11de5',
     'FloatingIPList': '1.7-e61a470ab21d7422f6bb703f86d99b53',
     'HVSpec': '1.0-c4d8377cc4fe519930e60c1d8265a142',
-    'Instance': '1.20-0991d6bd300ebf35ec19d7d68922e69b',
+    'Instance': '1.21-0991d6bd300ebf35ec19d7d68922e69b',
     'InstanceAction': '1.1-866fb0235d45ab51cc299b8726303d9c',
     'InstanceActionEvent': '1.1-538698f30974064543134784c5da6056',
     'InstanceActionEventList': '1.0-3510dc5bc494bcf2468f54249366164f',
@@ -1246,7 +1392,7 @@ object_data = {
     'InstanceGroup': '1.9-a77a59735d62790dcaa413a21acfaa73',
     'InstanceGroupList': '1.6-4642a730448b2336dfbf0f410f9c0cab',
     'InstanceInfoCache': '1.5-ef7394dae46cff2dd560324555cb85cf',
-    'InstanceList': '1.17-d453df4d1e7e1ec3b5b8b089672a870f',
+    'InstanceList': '1.20-25a91111da795b745c77b41717c0a86f',
     'InstanceMapping': '1.0-d7cfc251f16c93df612af2b9de59e5b7',
     'InstanceMappingList': '1.0-1e388f466f8a306ab3c0a0bb26479435',
     'InstanceNUMACell': '1.2-5d2dfa36e9ecca9b63f24bf3bc958ea4',
@@ -1278,8 +1424,8 @@ object_data = {
     'SecurityGroupList': '1.0-29b93ebda887d1941ec10c8e34644356',
     'SecurityGroupRule': '1.1-38290b6f9a35e416c2bcab5f18708967',
     'SecurityGroupRuleList': '1.1-c98e038da57c3a9e47e62a588e5b3c23',
-    'Service': '1.12-1a34a387914f90aacc33c8c43d45d0b3',
-    'ServiceList': '1.10-653f472b965b6ed17235ebd683751be7',
+    'Service': '1.13-1a34a387914f90aacc33c8c43d45d0b3',
+    'ServiceList': '1.11-07cdd2931c4f7e4626e695ad4cef6e8e',
     'Tag': '1.0-521693d0515aa031dff2b8ae3f86c8e0',
     'TagList': '1.0-698b4e8bd7d818db10b71a6d3c596760',
     'TestSubclassedObject': '1.6-d0f7f126f87433003c4d2ced202d6c86',
@@ -1292,12 +1438,12 @@ object_data = {
 
 
 object_relationships = {
-    'BlockDeviceMapping': {'Instance': '1.20'},
+    'BlockDeviceMapping': {'Instance': '1.21'},
     'ComputeNode': {'HVSpec': '1.0', 'PciDevicePoolList': '1.1'},
-    'FixedIP': {'Instance': '1.20', 'Network': '1.2',
+    'FixedIP': {'Instance': '1.21', 'Network': '1.2',
                 'VirtualInterface': '1.0',
                 'FloatingIPList': '1.7'},
-    'FloatingIP': {'FixedIP': '1.10'},
+    'FloatingIP': {'FixedIP': '1.11'},
     'Instance': {'InstanceFault': '1.2',
                  'InstanceInfoCache': '1.5',
                  'InstanceNUMATopology': '1.1',
@@ -1316,7 +1462,7 @@ object_relationships = {
     'NUMACell': {'NUMAPagesTopology': '1.0'},
     'NUMATopology': {'NUMACell': '1.2'},
     'SecurityGroupRule': {'SecurityGroup': '1.1'},
-    'Service': {'ComputeNode': '1.11'},
+    'Service': {'ComputeNode': '1.12'},
     'TestSubclassedObject': {'MyOwnedObject': '1.0'},
     'VirtCPUModel': {'VirtCPUFeature': '1.0', 'VirtCPUTopology': '1.0'},
 }
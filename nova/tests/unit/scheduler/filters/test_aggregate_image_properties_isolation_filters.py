@@ -12,7 +12,9 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import aggregate_image_properties_isolation as aipi
+from nova.scheduler.filters import utils
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -105,3 +107,22 @@ class TestAggImagePropsIsolationFilter(test.NoDBTestCase):
                                                     'foo2': 'bar3'}}}}
         host = fakes.FakeHostState('host1', 'compute', {})
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+
+    def test_aggregate_image_properties_isolation_filter_all(self, agg_mock):
+        index = utils.AggregateMetadataIndex([
+            objects.Aggregate(id=1, hosts=['host1'],
+                              metadata={'foo': 'bar, bar2'}),
+            objects.Aggregate(id=2, hosts=['host2'],
+                              metadata={'foo': 'bar3', 'foo2': 'bar'})])
+        filter_properties = {'context': mock.sentinel.ctx,
+                             'aggregate_index': index,
+                             'request_spec': {
+                                 'image': {
+                                     'properties': {'foo': 'bar2',
+                                                    'foo2': 'bar'}}}}
+        hosts = [fakes.FakeHostState('host%s' % i, 'compute', {})
+                 for i in xrange(1, 4)]
+        self.assertEqual([hosts[0], hosts[2]],
+                         list(self.filt_cls.filter_all(hosts,
+                                                       filter_properties)))
+        self.assertFalse(agg_mock.called)
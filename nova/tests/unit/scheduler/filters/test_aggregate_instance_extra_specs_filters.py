@@ -12,7 +12,9 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import aggregate_instance_extra_specs as agg_specs
+from nova.scheduler.filters import utils
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -82,3 +84,23 @@ class TestAggregateInstanceExtraSpecsFilter(test.NoDBTestCase):
             'trust:trusted_host': 'true'
         }
         self._do_test_aggregate_filter_extra_specs(especs, passes=False)
+
+    def test_aggregate_filter_all(self, agg_mock):
+        index = utils.AggregateMetadataIndex([
+            objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                              metadata={'opt1': '1', 'opt2': '2'}),
+            objects.Aggregate(id=2, hosts=['host3'],
+                              metadata={'opt1': '1', 'opt2': '3'})])
+        especs = {'opt1': '1',
+                  'aggregate_instance_extra_specs:opt2': '>= 3',
+                  'trust:trusted_host': 'true'}
+        filter_properties = {'context': mock.sentinel.ctx,
+                             'aggregate_index': index,
+                             'instance_type': {'memory_mb': 1024,
+                                               'extra_specs': especs}}
+        hosts = [fakes.FakeHostState('host%s' % i, 'node1', {})
+                 for i in xrange(1, 5)]
+        self.assertEqual([hosts[2]],
+                         list(self.filt_cls.filter_all(hosts,
+                                                       filter_properties)))
+        self.assertFalse(agg_mock.called)
@@ -12,7 +12,9 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import aggregate_multitenancy_isolation as ami
+from nova.scheduler.filters import utils
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -72,3 +74,21 @@ class TestAggregateMultitenancyIsolationFilter(test.NoDBTestCase):
                                      'project_id': 'my_tenantid'}}}
         host = fakes.FakeHostState('host1', 'compute', {})
         self.assertTrue(self.filt_cls.host_passes(host, filter_properties))
+
+    def test_aggregate_multi_tenancy_isolation_filter_all(self, agg_mock):
+        index = utils.AggregateMetadataIndex([
+            objects.Aggregate(id=1, hosts=['host1'],
+                              metadata={'filter_tenant_id': 'my_tenantid'}),
+            objects.Aggregate(id=2, hosts=['host2'],
+                              metadata={'filter_tenant_id': 'other'})])
+        filter_properties = {'context': mock.sentinel.ctx,
+                             'aggregate_index': index,
+                             'request_spec': {
+                                 'instance_properties': {
+                                     'project_id': 'my_tenantid'}}}
+        hosts = [fakes.FakeHostState('host%s' % i, 'compute', {})
+                 for i in xrange(1, 4)]
+        self.assertEqual([hosts[0], hosts[2]],
+                         list(self.filt_cls.filter_all(hosts,
+                                                       filter_properties)))
+        self.assertFalse(agg_mock.called)
@@ -12,7 +12,9 @@
 
 import mock
 
+from nova import objects
 from nova.scheduler.filters import availability_zone_filter
+from nova.scheduler.filters import utils
 from nova import test
 from nova.tests.unit.scheduler import fakes
 
@@ -52,3 +54,25 @@ class TestAvailabilityZoneFilter(test.NoDBTestCase):
         request = self._make_zone_request('bad')
         host = fakes.FakeHostState('host1', 'node1', {})
         self.assertFalse(self.filt_cls.host_passes(host, request))
+
+    def _test_filter_all(self, zone):
+        request = self._make_zone_request(zone)
+        request['aggregate_index'] = utils.AggregateMetadataIndex([
+            objects.Aggregate(id=1, hosts=['host1'],
+                              metadata={'availability_zone': 'nova'}),
+            objects.Aggregate(id=2, hosts=['host2'],
+                              metadata={'availability_zone': 'az2'})])
+        hosts = [fakes.FakeHostState('host%s' % i, 'node', {})
+                 for i in xrange(1, 4)]
+        return [host.host for host in self.filt_cls.filter_all(hosts,
+                                                                request)]
+
+    def test_filter_all_with_index(self, agg_mock):
+        self.assertEqual(['host2'], self._test_filter_all('az2'))
+        self.assertFalse(agg_mock.called)
+
+    def test_filter_all_with_index_default_zone(self, agg_mock):
+        self.flags(default_availability_zone='nova')
+        # host3 isn't in any availability zone, so it is in the default one
+        self.assertEqual(['host1', 'host3'], self._test_filter_all('nova'))
+        self.assertFalse(agg_mock.called)
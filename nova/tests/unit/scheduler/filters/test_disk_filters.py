@@ -51,6 +51,33 @@ class TestDiskFilter(test.NoDBTestCase):
         self.assertTrue(filt_cls.host_passes(host, filter_properties))
         self.assertEqual(12 * 10.0, host.limits['disk_gb'])
 
+    def test_disk_filter_filter_all(self):
+        self.flags(disk_allocation_ratio=10.0)
+        filt_cls = disk_filter.DiskFilter()
+        filter_properties = {'instance_type': {'root_gb': 100,
+            'ephemeral_gb': 18, 'swap': 1024}}
+        host1 = fakes.FakeHostState('host1', 'node1',
+                {'free_disk_mb': 11 * 1024, 'total_usable_disk_gb': 12})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                {'free_disk_mb': 1024, 'total_usable_disk_gb': 12})
+        self.assertEqual([host1], list(filt_cls.filter_all(
+            [host1, host2], filter_properties)))
+        self.assertEqual(12 * 10.0, host1.limits['disk_gb'])
+
+    @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
+    def test_aggregate_disk_filter_filter_all(self, agg_mock):
+        filt_cls = disk_filter.AggregateDiskFilter()
+        filter_properties = {'context': mock.sentinel.ctx,
+                             'instance_type': {'root_gb': 12,
+                                               'ephemeral_gb': 0,
+                                               'swap': 0}}
+        host = fakes.FakeHostState('host1', 'node1',
+                {'free_disk_mb': 11 * 1024, 'total_usable_disk_gb': 12})
+        agg_mock.return_value = set(['2.0'])
+        self.assertEqual([host], list(filt_cls.filter_all(
+            [host], filter_properties)))
+        agg_mock.assert_called_once_with(host, 'disk_allocation_ratio')
+
     def test_disk_filter_oversubscribe_fail(self):
         self.flags(disk_allocation_ratio=10.0)
         filt_cls = disk_filter.DiskFilter()
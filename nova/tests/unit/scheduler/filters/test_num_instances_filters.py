@@ -35,6 +35,28 @@ class TestNumInstancesFilter(test.NoDBTestCase):
         filter_properties = {}
         self.assertFalse(self.filt_cls.host_passes(host, filter_properties))
 
+    def test_filter_num_instances_filter_all(self):
+        self.flags(max_instances_per_host=5)
+        self.filt_cls = num_instances_filter.NumInstancesFilter()
+        host1 = fakes.FakeHostState('host1', 'node1',
+                                    {'num_instances': 4})
+        host2 = fakes.FakeHostState('host2', 'node2',
+                                    {'num_instances': 5})
+        self.assertEqual([host1],
+                         list(self.filt_cls.filter_all([host1, host2], {})))
+
+    @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
+    def test_filter_aggregate_num_instances_filter_all(self, agg_mock):
+        self.flags(max_instances_per_host=4)
+        self.filt_cls = num_instances_filter.AggregateNumInstancesFilter()
+        host = fakes.FakeHostState('host1', 'node1',
+                                   {'num_instances': 5})
+        filter_properties = {'context': mock.sentinel.ctx}
+        agg_mock.return_value = set(['6'])
+        self.assertEqual([host], list(self.filt_cls.filter_all(
+            [host], filter_properties)))
+        agg_mock.assert_called_once_with(host, 'max_instances_per_host')
+
     @mock.patch('nova.scheduler.filters.utils.aggregate_values_from_key')
     def test_filter_aggregate_num_instances_value(self, agg_mock):
         self.flags(max_instances_per_host=4)
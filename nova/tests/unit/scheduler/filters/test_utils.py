@@ -39,3 +39,46 @@ class TestUtils(test.NoDBTestCase):
         host_state.instances = {inst1.uuid: inst1}
         self.assertFalse(utils.other_types_on_host(host_state, 1))
         self.assertTrue(utils.other_types_on_host(host_state, 2))
+
+    def test_method_overridden(self):
+        class Base(object):
+            def method(self):
+                pass
+
+            def other(self):
+                pass
+
+        class Same(Base):
+            pass
+
+        class Overriding(Base):
+            def method(self):
+                pass
+
+        self.assertFalse(utils.method_overridden(Base(), Base, 'method'))
+        self.assertFalse(utils.method_overridden(Same(), Base, 'method'))
+        self.assertTrue(utils.method_overridden(Overriding(), Base,
+                                                'method'))
+        self.assertTrue(utils.method_overridden(Overriding(), Base,
+                                                'other', 'method'))
+
+    def test_aggregate_metadata_index(self):
+        index = utils.AggregateMetadataIndex([
+            objects.Aggregate(id=1, hosts=['host1', 'host2'],
+                              metadata={'availability_zone': 'az1',
+                                        'opt': 'a, b'}),
+            objects.Aggregate(id=2, hosts=['host2', 'host3'],
+                              metadata={'opt': 'b'})])
+        self.assertEqual(set(['host1', 'host2']),
+                         index.get_hosts('availability_zone', 'az1'))
+        self.assertEqual(set(), index.get_hosts('availability_zone', 'az2'))
+        self.assertEqual({'a': set(['host1', 'host2']),
+                          'b': set(['host1', 'host2', 'host3'])},
+                         index.get_hosts_by_value('opt'))
+        self.assertEqual(set(['host1', 'host2', 'host3']),
+                         index.get_hosts_with_key('opt'))
+        self.assertEqual(set(), index.get_hosts_with_key('foo'))
+        self.assertEqual(set(['availability_zone', 'opt']), set(index.keys()))
+
+        index.rebuild([])
+        self.assertEqual(set(), index.get_hosts_with_key('opt'))
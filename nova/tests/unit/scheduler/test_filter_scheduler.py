@@ -16,10 +16,14 @@
 Tests For Filter Scheduler.
 """
 
+import contextlib
+
 import mock
 
 from nova import exception
+from nova import objects
 from nova.scheduler import filter_scheduler
+from nova.scheduler import filters
 from nova.scheduler import host_manager
 from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
@@ -38,7 +42,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
-    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_hosts')
     @mock.patch('nova.objects.ComputeNodeList.get_all',
                 return_value=fakes.COMPUTE_NODES)
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
@@ -117,7 +121,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
-    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_hosts')
     @mock.patch('nova.objects.ComputeNodeList.get_all',
                 return_value=fakes.COMPUTE_NODES)
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
@@ -151,7 +155,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
-    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_hosts')
     @mock.patch('nova.objects.ComputeNodeList.get_all',
                 return_value=fakes.COMPUTE_NODES)
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
@@ -184,6 +188,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         # one host should be chose
         self.assertEqual(len(hosts), 1)
 
+    @mock.patch('nova.scheduler.host_manager.HostManager.'
+                '_get_instances_by_host', return_value={})
     @mock.patch('nova.scheduler.host_manager.HostManager._add_instance_info')
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
@@ -194,7 +200,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                               'pci_requests': None})
     def test_schedule_chooses_best_host(self, mock_get_extra, mock_cn_get_all,
                                         mock_get_by_binary,
-                                        mock_add_inst_info):
+                                        mock_add_inst_info,
+                                        mock_get_instances):
         """If scheduler_host_subset_size is 1, the largest host with greatest
         weight should be returned.
         """
@@ -237,7 +244,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
     @mock.patch('nova.objects.ServiceList.get_by_binary',
                 return_value=fakes.SERVICES)
-    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_hosts')
     @mock.patch('nova.objects.ComputeNodeList.get_all',
                 return_value=fakes.COMPUTE_NODES)
     @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
@@ -301,6 +308,86 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                  dict(request_spec=request_spec))]
             self.assertEqual(expected, mock_info.call_args_list)
 
+    def test_select_destinations_trace(self):
+        self.flags(scheduler_tracing=True)
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i, {})
+                 for i in range(3)]
+        request_spec = {'instance_properties': {'project_id': 1,
+                                                'os_type': 'Linux'},
+                        'num_instances': 1}
+        filter_properties = {}
+        self.stubs.Set(fakes.FakeHostState, 'consume_from_instance',
+                       lambda _self, instance: None)
+
+        def fake_filter(hosts, filter_properties, index):
+            trace = filter_properties['scheduler_trace']
+            trace.append({'filter': 'FakeFilter', 'index': index,
+                          'hosts_in': len(hosts), 'hosts_out': 2,
+                          'elapsed': 1.0})
+            return hosts[:2]
+
+        with mock.patch.object(self.driver, '_get_all_host_states',
+                               return_value=iter(hosts)):
+            with mock.patch.object(self.driver.host_manager,
+                                   'get_filtered_hosts',
+                                   side_effect=fake_filter):
+                with mock.patch.object(self.driver.notifier,
+                                       'info') as mock_info:
+                    self.driver.select_destinations(
+                        self.context, request_spec, filter_properties)
+
+        self.assertNotIn('scheduler_trace', filter_properties)
+        self.assertEqual(3, mock_info.call_count)
+        event_type, payload = mock_info.call_args_list[1][0][1:]
+        self.assertEqual('scheduler.select_destinations.trace', event_type)
+        self.assertEqual(1, payload['num_selected'])
+        trace = payload['trace']
+        self.assertEqual('FilterScheduler', trace[0]['host_states'])
+        self.assertEqual(3, trace[0]['hosts_out'])
+        self.assertEqual('FakeFilter', trace[1]['filter'])
+        self.assertEqual(3, trace[1]['hosts_in'])
+        self.assertEqual({'count': 1, 'elapsed': 1.0, 'hosts_in': 3,
+                          'hosts_out': 2},
+                         self.driver.trace_stats[('filter', 'FakeFilter')])
+        self.assertEqual(1, self.driver.trace_stats[
+            ('host_states', 'FilterScheduler')]['count'])
+
+    def test_select_destinations_trace_no_valid_host(self):
+        self.flags(scheduler_tracing=True)
+        with mock.patch.object(self.driver, '_schedule', return_value=[]):
+            with mock.patch.object(self.driver.notifier, 'info') as mock_info:
+                self.assertRaises(exception.NoValidHost,
+                                  self.driver.select_destinations,
+                                  self.context, {'num_instances': 1}, {})
+        event_type, payload = mock_info.call_args_list[1][0][1:]
+        self.assertEqual('scheduler.select_destinations.trace', event_type)
+        self.assertEqual(0, payload['num_selected'])
+
+    def test_select_destinations_no_trace(self):
+        filter_properties = {}
+        with mock.patch.object(self.driver, '_schedule',
+                               return_value=[mock.Mock()]) as mock_schedule:
+            with mock.patch.object(self.driver.notifier, 'info') as mock_info:
+                self.driver.select_destinations(
+                    self.context, {'num_instances': 1}, filter_properties)
+        self.assertEqual(2, mock_info.call_count)
+        self.assertNotIn('scheduler_trace', mock_schedule.call_args[0][2])
+        self.assertEqual({}, self.driver.trace_stats)
+
+    @mock.patch.object(filter_scheduler.LOG, 'info')
+    def test_run_periodic_tasks_logs_trace_stats(self, mock_log):
+        self.flags(scheduler_tracing=True)
+        self.driver._add_trace_stats([
+            {'weigher': 'FakeWeigher', 'hosts_in': 3, 'elapsed': 0.5},
+            {'weigher': 'FakeWeigher', 'hosts_in': 2, 'elapsed': 0.5}])
+        self.driver.run_periodic_tasks(self.context)
+        self.assertEqual(1, mock_log.call_count)
+        self.assertEqual({'kind': 'weigher', 'name': 'FakeWeigher',
+                          'count': 2, 'elapsed': 1.0, 'hosts_in': 5,
+                          'hosts_out': 5},
+                         mock_log.call_args[0][1])
+        self.assertEqual({}, self.driver.trace_stats)
+
     def test_select_destinations_no_valid_host(self):
 
         def _return_no_host(*args, **kwargs):
@@ -324,3 +411,227 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                 # Make sure that we provided a reason why NoValidHost.
                 self.assertIn('reason', e.kwargs)
                 self.assertTrue(len(e.kwargs['reason']) > 0)
+
+    def _test_schedule_batch_placement(self, filter_properties,
+                                       default_filters=None):
+        self.flags(scheduler_batch_placement=True)
+        hosts = [fakes.FakeHostState('host%s' % i, 'node%s' % i,
+                                     {'free_ram_mb': 1024 * i})
+                 for i in xrange(1, 4)]
+        if default_filters is not None:
+            self.driver.host_manager.default_filters = default_filters
+        request_spec = {'num_instances': 3,
+                        'instance_type': {'memory_mb': 512},
+                        'instance_properties': {'project_id': 1,
+                                                'os_type': 'Linux'}}
+        self.stubs.Set(self.driver, '_get_all_host_states',
+                       lambda context: iter(hosts))
+        self.stubs.Set(host_manager.HostState, 'consume_from_instance',
+                       lambda _self, instance: None)
+        with mock.patch.object(self.driver.host_manager, 'get_filtered_hosts',
+                               side_effect=fake_get_filtered_hosts
+                               ) as mock_filter:
+            selected_hosts = self.driver._schedule(self.context,
+                                                   request_spec,
+                                                   filter_properties)
+        self.assertEqual(3, len(selected_hosts))
+        return hosts, mock_filter
+
+    def test_schedule_batch_placement(self):
+        hosts, mock_filter = self._test_schedule_batch_placement({})
+        filter_properties = mock_filter.call_args[0][1]
+        # host3 has the most free RAM and its usage isn't changed, so it is
+        # chosen each time and is the only one filtered again
+        self.assertEqual([mock.call(mock.ANY, filter_properties, index=0),
+                          mock.call([hosts[2]], filter_properties, index=1),
+                          mock.call([hosts[2]], filter_properties, index=2)],
+                         mock_filter.call_args_list)
+
+    def test_schedule_batch_placement_group_updated(self):
+        hosts, mock_filter = self._test_schedule_batch_placement(
+            {'group_updated': True, 'group_hosts': []})
+        filter_properties = mock_filter.call_args[0][1]
+        self.assertEqual([mock.call(mock.ANY, filter_properties, index=0),
+                          mock.call(hosts, filter_properties, index=1),
+                          mock.call(hosts, filter_properties, index=2)],
+                         mock_filter.call_args_list)
+
+    def test_schedule_batch_placement_new_filter_for_index(self):
+        class FakeFilter(filters.BaseHostFilter):
+            def run_filter_for_index(self, index):
+                return index == 1
+
+        hosts, mock_filter = self._test_schedule_batch_placement(
+            {}, default_filters=[FakeFilter()])
+        filter_properties = mock_filter.call_args[0][1]
+        # FakeFilter didn't run for the first instance, so all the hosts
+        # are filtered for the second one
+        self.assertEqual([mock.call(mock.ANY, filter_properties, index=0),
+                          mock.call(hosts, filter_properties, index=1),
+                          mock.call([hosts[2]], filter_properties, index=2)],
+                         mock_filter.call_args_list)
+
+    @mock.patch.object(filter_scheduler.FilterScheduler, 'hosts_up',
+                       return_value=['sched1', 'sched2'])
+    def test_run_periodic_tasks_updates_hash_ring(self, mock_hosts_up):
+        self.flags(scheduler_host_partitioning=True)
+        self.driver.run_periodic_tasks(self.context)
+        ring = self.driver.hash_ring
+        self.assertEqual(set(['sched1', 'sched2']), ring.members)
+
+        # The ring is only rebuilt when the schedulers change
+        self.driver.run_periodic_tasks(self.context)
+        self.assertIs(ring, self.driver.hash_ring)
+        mock_hosts_up.return_value = ['sched1']
+        self.driver.run_periodic_tasks(self.context)
+        self.assertEqual(set(['sched1']), self.driver.hash_ring.members)
+
+    @mock.patch.object(filter_scheduler.FilterScheduler, 'hosts_up')
+    def test_run_periodic_tasks_no_partitioning(self, mock_hosts_up):
+        self.driver.run_periodic_tasks(self.context)
+        self.assertFalse(mock_hosts_up.called)
+        self.assertIsNone(self.driver.hash_ring)
+
+    def _test_schedule_partitioned(self, num_instances, passing_hosts):
+        self.flags(scheduler_host_partitioning=True, host='sched1')
+        hosts = [fakes.FakeHostState('host%s' % i, 'node%s' % i,
+                                     {'free_ram_mb': 1024 * i})
+                 for i in xrange(1, 4)]
+        owners = {'host1': 'sched1', 'host2': 'sched2', 'host3': 'sched2'}
+        self.driver.hash_ring = mock.Mock(members=set(['sched1', 'sched2']))
+        self.driver.hash_ring.get_member.side_effect = owners.get
+        request_spec = {'num_instances': num_instances,
+                        'instance_type': {'memory_mb': 512},
+                        'instance_properties': {'project_id': 1,
+                                                'os_type': 'Linux'}}
+
+        def fake_filter(hosts, filter_properties, index):
+            return [host for host in hosts if host.host in passing_hosts]
+
+        self.stubs.Set(self.driver, '_get_all_host_states',
+                       lambda context: iter(hosts))
+        self.stubs.Set(host_manager.HostState, 'consume_from_instance',
+                       lambda _self, instance: None)
+        with mock.patch.object(self.driver.host_manager, 'get_filtered_hosts',
+                               side_effect=fake_filter) as mock_filter:
+            selected_hosts = self.driver._schedule(self.context,
+                                                   request_spec, {})
+        return hosts, mock_filter, selected_hosts
+
+    def test_schedule_partitioned(self):
+        hosts, mock_filter, selected_hosts = self._test_schedule_partitioned(
+            1, ['host1', 'host2', 'host3'])
+        # host3 has the most free RAM, but host1 belongs to this scheduler
+        self.assertEqual([hosts[0]], [host.obj for host in selected_hosts])
+        self.assertEqual([mock.call([hosts[0]], mock.ANY, index=0)],
+                         mock_filter.call_args_list)
+
+    def test_schedule_partitioned_falls_back_to_other_hosts(self):
+        hosts, mock_filter, selected_hosts = self._test_schedule_partitioned(
+            2, ['host2', 'host3'])
+        self.assertEqual([hosts[2], hosts[2]],
+                         [host.obj for host in selected_hosts])
+        # The filters start again from the first index for the other hosts
+        self.assertEqual([mock.call([hosts[0]], mock.ANY, index=0),
+                          mock.call(hosts[1:], mock.ANY, index=0),
+                          mock.call(hosts[1:], mock.ANY, index=1)],
+                         mock_filter.call_args_list)
+
+    def test_schedule_partitioned_not_in_ring(self):
+        self.flags(scheduler_host_partitioning=True, host='sched3')
+        self.driver.hash_ring = mock.Mock(members=set(['sched1', 'sched2']))
+        self.assertFalse(self.driver._is_partitioned())
+
+    def _test_schedule_claim_resources(self, claimed_hosts, num_instances=2,
+                                       refreshed=False):
+        self.flags(scheduler_claim_resources=True)
+        hosts = []
+        for i in xrange(1, 4):
+            host_state = fakes.FakeHostState('host%s' % i, 'node%s' % i,
+                                             {'free_ram_mb': 1024 * i})
+            host_state.compute_node_id = i
+            host_state.generation = 5
+            hosts.append(host_state)
+        request_spec = {'num_instances': num_instances,
+                        'instance_type': {'memory_mb': 512},
+                        'instance_properties': {'project_id': 1,
+                                                'os_type': 'Linux',
+                                                'vcpus': 1,
+                                                'memory_mb': 512,
+                                                'root_gb': 10,
+                                                'ephemeral_gb': 5}}
+        self.stubs.Set(self.driver, '_get_all_host_states',
+                       lambda context: iter(hosts))
+        self.stubs.Set(host_manager.HostState, 'consume_from_instance',
+                       lambda _self, instance: None)
+
+        def fake_claim(context, compute_id, generation, vcpus, memory_mb,
+                       local_gb):
+            return compute_id in claimed_hosts or generation == 8
+
+        def fake_get_by_id(context, compute_id):
+            if not refreshed:
+                raise exception.ComputeHostNotFound(host=compute_id)
+            return objects.ComputeNode(id=compute_id, generation=8)
+
+        def fake_update_from_compute_node(host_state, compute):
+            host_state.generation = compute.generation
+
+        self.stubs.Set(host_manager.HostState, 'update_from_compute_node',
+                       fake_update_from_compute_node)
+        with contextlib.nested(
+            mock.patch.object(self.driver.host_manager, 'get_filtered_hosts',
+                              side_effect=fake_get_filtered_hosts),
+            mock.patch.object(objects.ComputeNode, 'claim_resources',
+                              side_effect=fake_claim),
+            mock.patch.object(objects.ComputeNode, 'get_by_id',
+                              side_effect=fake_get_by_id)
+        ) as (mock_filter, mock_claim, mock_get_by_id):
+            selected_hosts = self.driver._schedule(self.context,
+                                                   request_spec, {})
+        return hosts, mock_filter, mock_claim, selected_hosts
+
+    def test_schedule_claim_resources(self):
+        hosts, mock_filter, mock_claim, selected_hosts = (
+            self._test_schedule_claim_resources([1, 2]))
+        # host3 is the best host but it changed since it was read, so the
+        # next best host is chosen and host3 isn't filtered anymore
+        self.assertEqual([hosts[1], hosts[1]],
+                         [host.obj for host in selected_hosts])
+        self.assertEqual([mock.call(mock.ANY, 3, 5, 1, 512, 15),
+                          mock.call(mock.ANY, 2, 5, 1, 512, 15),
+                          mock.call(mock.ANY, 2, 6, 1, 512, 15)],
+                         mock_claim.call_args_list)
+        self.assertEqual(set(hosts[:2]),
+                         set(mock_filter.call_args_list[1][0][0]))
+        self.assertEqual(7, hosts[1].generation)
+
+    def test_schedule_claim_resources_refreshed(self):
+        hosts, mock_filter, mock_claim, selected_hosts = (
+            self._test_schedule_claim_resources([], num_instances=1,
+                                                refreshed=True))
+        # host3 changed since it was read, but it still passes the filters
+        # once read again, so it is claimed again
+        self.assertEqual([hosts[2]], [host.obj for host in selected_hosts])
+        self.assertEqual([mock.call(mock.ANY, 3, 5, 1, 512, 15),
+                          mock.call(mock.ANY, 3, 8, 1, 512, 15)],
+                         mock_claim.call_args_list)
+        self.assertEqual(mock.call([hosts[2]], mock.ANY, index=0),
+                         mock_filter.call_args_list[1])
+        self.assertEqual(9, hosts[2].generation)
+
+    def test_schedule_claim_resources_no_host_left(self):
+        hosts, mock_filter, mock_claim, selected_hosts = (
+            self._test_schedule_claim_resources([]))
+        self.assertEqual([], selected_hosts)
+        self.assertEqual(3, mock_claim.call_count)
+        self.assertEqual(1, mock_filter.call_count)
+
+    def test_schedule_claim_resources_no_generation(self):
+        hosts, mock_filter, mock_claim, selected_hosts = (
+            self._test_schedule_claim_resources([], num_instances=0))
+        self.assertFalse(mock_claim.called)
+        host_state = fakes.FakeHostState('host1', 'node1', {})
+        self.assertTrue(self.driver._claim_resources(self.context, host_state,
+                                                     {}))
+        self.assertFalse(mock_claim.called)
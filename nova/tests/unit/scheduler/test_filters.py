@@ -90,7 +90,7 @@ class FiltersTestCase(test.NoDBTestCase):
         filter_objs_initial = ['initial', 'filter1', 'objects1']
         filter_objs_second = ['second', 'filter2', 'objects2']
         filter_objs_last = ['last', 'filter3', 'objects3']
-        filter_properties = 'fake_filter_properties'
+        filter_properties = {'x': 'fake_filter_properties'}
 
         def _fake_base_loader_init(*args, **kwargs):
             pass
@@ -126,13 +126,37 @@ class FiltersTestCase(test.NoDBTestCase):
                                                      filter_properties)
         self.assertEqual(filter_objs_last, result)
 
+    def test_get_filtered_objects_trace(self):
+        trace = []
+        filter_properties = {'scheduler_trace': trace}
+
+        class EvenFilter(filters.BaseFilter):
+            def _filter_one(self, obj, filter_properties):
+                return obj % 2 == 0
+
+        class OnceFilter(filters.BaseFilter):
+            run_filter_once_per_request = True
+
+        self.stubs.Set(loadables.BaseLoader, '__init__',
+                       lambda *args, **kwargs: None)
+        filter_handler = filters.BaseFilterHandler(filters.BaseFilter)
+        result = filter_handler.get_filtered_objects(
+            [EvenFilter(), OnceFilter()], range(5), filter_properties,
+            index=1)
+        self.assertEqual([0, 2, 4], result)
+        self.assertEqual(1, len(trace))
+        elapsed = trace[0].pop('elapsed')
+        self.assertTrue(elapsed >= 0)
+        self.assertEqual({'filter': 'EvenFilter', 'index': 1,
+                          'hosts_in': 5, 'hosts_out': 3}, trace[0])
+
     def test_get_filtered_objects_for_index(self):
         """Test that we don't call a filter when its
         run_filter_for_index() method returns false
         """
         filter_objs_initial = ['initial', 'filter1', 'objects1']
         filter_objs_second = ['second', 'filter2', 'objects2']
-        filter_properties = 'fake_filter_properties'
+        filter_properties = {'x': 'fake_filter_properties'}
 
         def _fake_base_loader_init(*args, **kwargs):
             pass
@@ -168,7 +192,7 @@ class FiltersTestCase(test.NoDBTestCase):
 
     def test_get_filtered_objects_none_response(self):
         filter_objs_initial = ['initial', 'filter1', 'objects1']
-        filter_properties = 'fake_filter_properties'
+        filter_properties = {'x': 'fake_filter_properties'}
 
         def _fake_base_loader_init(*args, **kwargs):
             pass
@@ -0,0 +1,55 @@
+# Copyright (c) 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler hash ring.
+"""
+
+from nova.scheduler import hash_ring
+from nova import test
+
+
+class HashRingTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HashRingTestCase, self).setUp()
+        self.keys = ['host%d' % i for i in xrange(100)]
+
+    def test_empty_ring(self):
+        ring = hash_ring.HashRing([])
+        self.assertIsNone(ring.get_member('host1'))
+
+    def test_get_member_is_stable(self):
+        ring = hash_ring.HashRing(['sched1', 'sched2', 'sched3'])
+        other_ring = hash_ring.HashRing(['sched3', 'sched2', 'sched1'])
+        for key in self.keys:
+            self.assertEqual(ring.get_member(key),
+                             other_ring.get_member(key))
+
+    def test_keys_are_spread(self):
+        ring = hash_ring.HashRing(['sched1', 'sched2'])
+        members = set(ring.get_member(key) for key in self.keys)
+        self.assertEqual(set(['sched1', 'sched2']), members)
+
+    def test_unicode_key(self):
+        ring = hash_ring.HashRing(['sched1'])
+        self.assertEqual('sched1', ring.get_member(u'h\xf6st'))
+
+    def test_only_keys_of_removed_member_move(self):
+        ring = hash_ring.HashRing(['sched1', 'sched2', 'sched3'])
+        smaller_ring = hash_ring.HashRing(['sched1', 'sched2'])
+        for key in self.keys:
+            member = ring.get_member(key)
+            if member != 'sched3':
+                self.assertEqual(member, smaller_ring.get_member(key))
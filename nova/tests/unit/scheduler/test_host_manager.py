@@ -17,7 +17,9 @@ Tests For HostManager
 """
 
 import collections
+import datetime
 
+import iso8601
 import mock
 from oslo_config import cfg
 from oslo_serialization import jsonutils
@@ -75,25 +77,26 @@ class HostManagerTestCase(test.NoDBTestCase):
         filters = self.host_manager._load_filters()
         self.assertEqual(filters, ['FakeFilterClass1'])
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_hosts')
     @mock.patch.object(nova.objects.ComputeNodeList, 'get_all')
     @mock.patch('nova.utils.spawn_n')
     def test_init_instance_info_batches(self, mock_spawn, mock_get_all,
-                                        mock_get_by_filters):
+                                        mock_get_by_hosts):
         mock_spawn.side_effect = lambda f, *a, **k: f(*a, **k)
+        mock_get_by_hosts.return_value = objects.InstanceList()
         cn_list = objects.ComputeNodeList()
-        for num in range(22):
+        for num in range(220):
             host_name = 'host_%s' % num
             cn_list.objects.append(objects.ComputeNode(host=host_name))
         mock_get_all.return_value = cn_list
         self.host_manager._init_instance_info()
-        self.assertEqual(mock_get_by_filters.call_count, 3)
+        self.assertEqual(mock_get_by_hosts.call_count, 3)
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_filters')
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_hosts')
     @mock.patch.object(nova.objects.ComputeNodeList, 'get_all')
     @mock.patch('nova.utils.spawn_n')
     def test_init_instance_info(self, mock_spawn, mock_get_all,
-                                mock_get_by_filters):
+                                mock_get_by_hosts):
         mock_spawn.side_effect = lambda f, *a, **k: f(*a, **k)
         cn1 = objects.ComputeNode(host='host1')
         cn2 = objects.ComputeNode(host='host2')
@@ -101,7 +104,7 @@ class HostManagerTestCase(test.NoDBTestCase):
         inst2 = objects.Instance(host='host1', uuid='uuid2')
         inst3 = objects.Instance(host='host2', uuid='uuid3')
         mock_get_all.return_value = objects.ComputeNodeList(objects=[cn1, cn2])
-        mock_get_by_filters.return_value = objects.InstanceList(
+        mock_get_by_hosts.return_value = objects.InstanceList(
                 objects=[inst1, inst2, inst3])
         hm = self.host_manager
         hm._instance_info = {}
@@ -176,6 +179,21 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual({'fake-host': set([])},
                          self.host_manager.host_aggregates_map)
 
+    def test_update_and_delete_aggregate_index(self):
+        fake_agg = objects.Aggregate(id=1, hosts=['fake-host'],
+                                     metadata={'availability_zone': 'az1'})
+        self.host_manager.update_aggregates([fake_agg])
+        index = self.host_manager.aggregate_index
+        self.assertEqual(set(['fake-host']),
+                         index.get_hosts('availability_zone', 'az1'))
+        fake_agg.metadata = {'availability_zone': 'az2'}
+        self.host_manager.update_aggregates(fake_agg)
+        self.assertEqual(set(), index.get_hosts('availability_zone', 'az1'))
+        self.assertEqual(set(['fake-host']),
+                         index.get_hosts('availability_zone', 'az2'))
+        self.host_manager.delete_aggregate(fake_agg)
+        self.assertEqual(set(), index.get_hosts('availability_zone', 'az2'))
+
     def test_choose_host_filters_not_found(self):
         self.assertRaises(exception.SchedulerHostFilterNotFound,
                           self.host_manager._choose_host_filters,
@@ -217,6 +235,8 @@ class HostManagerTestCase(test.NoDBTestCase):
         result = self.host_manager.get_filtered_hosts(self.fake_hosts,
                 fake_properties)
         self._verify_result(info, result)
+        self.assertIs(self.host_manager.aggregate_index,
+                      fake_properties['aggregate_index'])
 
     @mock.patch.object(FakeFilterClass2, '_filter_one', return_value=True)
     def test_get_filtered_hosts_with_specified_filters(self, mock_filter_one):
@@ -361,9 +381,9 @@ class HostManagerTestCase(test.NoDBTestCase):
                 fake_properties)
         self._verify_result(info, result, False)
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
-    def test_get_all_host_states(self, mock_get_by_host):
-        mock_get_by_host.return_value = objects.InstanceList()
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_hosts')
+    def test_get_all_host_states(self, mock_get_by_hosts):
+        mock_get_by_hosts.return_value = objects.InstanceList()
         context = 'fake_context'
         self.mox.StubOutWithMock(objects.ServiceList, 'get_by_binary')
         self.mox.StubOutWithMock(objects.ComputeNodeList, 'get_all')
@@ -421,35 +441,35 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual(host_states_map[('host4', 'node4')].free_disk_mb,
                          8388608)
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_hosts')
     @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
     @mock.patch.object(objects.ComputeNodeList, 'get_all')
     @mock.patch.object(objects.ServiceList, 'get_by_binary')
     def test_get_all_host_states_with_no_aggs(self, svc_get_by_binary,
                                               cn_get_all, update_from_cn,
-                                              mock_get_by_host):
+                                              mock_get_by_hosts):
         svc_get_by_binary.return_value = [objects.Service(host='fake')]
         cn_get_all.return_value = [
             objects.ComputeNode(host='fake', hypervisor_hostname='fake')]
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_hosts.return_value = objects.InstanceList()
         self.host_manager.host_aggregates_map = collections.defaultdict(set)
 
         self.host_manager.get_all_host_states('fake-context')
         host_state = self.host_manager.host_state_map[('fake', 'fake')]
         self.assertEqual([], host_state.aggregates)
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_hosts')
     @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
     @mock.patch.object(objects.ComputeNodeList, 'get_all')
     @mock.patch.object(objects.ServiceList, 'get_by_binary')
     def test_get_all_host_states_with_matching_aggs(self, svc_get_by_binary,
                                                     cn_get_all,
                                                     update_from_cn,
-                                                    mock_get_by_host):
+                                                    mock_get_by_hosts):
         svc_get_by_binary.return_value = [objects.Service(host='fake')]
         cn_get_all.return_value = [
             objects.ComputeNode(host='fake', hypervisor_hostname='fake')]
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_hosts.return_value = objects.InstanceList()
         fake_agg = objects.Aggregate(id=1)
         self.host_manager.host_aggregates_map = collections.defaultdict(
             set, {'fake': set([1])})
@@ -459,7 +479,7 @@ class HostManagerTestCase(test.NoDBTestCase):
         host_state = self.host_manager.host_state_map[('fake', 'fake')]
         self.assertEqual([fake_agg], host_state.aggregates)
 
-    @mock.patch.object(nova.objects.InstanceList, 'get_by_host')
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_hosts')
     @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
     @mock.patch.object(objects.ComputeNodeList, 'get_all')
     @mock.patch.object(objects.ServiceList, 'get_by_binary')
@@ -467,13 +487,13 @@ class HostManagerTestCase(test.NoDBTestCase):
                                                         svc_get_by_binary,
                                                         cn_get_all,
                                                         update_from_cn,
-                                                        mock_get_by_host):
+                                                        mock_get_by_hosts):
         svc_get_by_binary.return_value = [objects.Service(host='fake'),
                                           objects.Service(host='other')]
         cn_get_all.return_value = [
             objects.ComputeNode(host='fake', hypervisor_hostname='fake'),
             objects.ComputeNode(host='other', hypervisor_hostname='other')]
-        mock_get_by_host.return_value = objects.InstanceList()
+        mock_get_by_hosts.return_value = objects.InstanceList()
         fake_agg = objects.Aggregate(id=1)
         self.host_manager.host_aggregates_map = collections.defaultdict(
             set, {'other': set([1])})
@@ -483,6 +503,105 @@ class HostManagerTestCase(test.NoDBTestCase):
         host_state = self.host_manager.host_state_map[('fake', 'fake')]
         self.assertEqual([], host_state.aggregates)
 
+    def _get_fake_compute_node(self, host, **kwargs):
+        created_at = datetime.datetime(2015, 1, 1,
+                                       tzinfo=iso8601.iso8601.Utc())
+        values = dict(host=host, hypervisor_hostname=host, deleted=False,
+                      created_at=created_at, updated_at=None, deleted_at=None)
+        values.update(kwargs)
+        return objects.ComputeNode(**values)
+
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_hosts')
+    @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all_changed_since')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all')
+    @mock.patch.object(objects.ServiceList, 'get_by_binary')
+    def test_get_all_host_states_incremental(self, svc_get_by_binary,
+                                             cn_get_all, cn_get_changed,
+                                             update_from_cn,
+                                             mock_get_by_hosts):
+        self.flags(scheduler_host_state_refresh_interval=60)
+        utc = iso8601.iso8601.Utc()
+        svc_get_by_binary.return_value = [objects.Service(host='host1'),
+                                          objects.Service(host='host2'),
+                                          objects.Service(host='host3')]
+        cn_get_all.return_value = [
+            self._get_fake_compute_node('host1'),
+            self._get_fake_compute_node(
+                'host2',
+                updated_at=datetime.datetime(2015, 1, 2, tzinfo=utc))]
+        mock_get_by_hosts.return_value = objects.InstanceList()
+
+        self.host_manager.get_all_host_states('fake-context')
+        self.assertEqual(set([('host1', 'host1'), ('host2', 'host2')]),
+                         set(self.host_manager.host_state_map))
+        self.assertFalse(cn_get_changed.called)
+        update_from_cn.reset_mock()
+
+        updated_cn1 = self._get_fake_compute_node(
+            'host1', updated_at=datetime.datetime(2015, 1, 3, tzinfo=utc))
+        new_cn3 = self._get_fake_compute_node(
+            'host3', created_at=datetime.datetime(2015, 1, 4, tzinfo=utc))
+        cn_get_changed.return_value = [
+            updated_cn1,
+            self._get_fake_compute_node(
+                'host2', deleted=True,
+                deleted_at=datetime.datetime(2015, 1, 3, tzinfo=utc)),
+            new_cn3]
+
+        self.host_manager.get_all_host_states('fake-context')
+        self.assertEqual(1, cn_get_all.call_count)
+        cn_get_changed.assert_called_once_with(
+            'fake-context', datetime.datetime(2015, 1, 2, tzinfo=utc))
+        self.assertEqual(set([('host1', 'host1'), ('host3', 'host3')]),
+                         set(self.host_manager.host_state_map))
+        # The unchanged host states are not refreshed
+        update_from_cn.assert_has_calls([mock.call(updated_cn1),
+                                         mock.call(new_cn3)],
+                                        any_order=True)
+        self.assertEqual(2, update_from_cn.call_count)
+        self.assertEqual(datetime.datetime(2015, 1, 4, tzinfo=utc),
+                         self.host_manager._compute_nodes_generation)
+
+    @mock.patch.object(nova.objects.InstanceList, 'get_by_hosts')
+    @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all_changed_since')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all')
+    @mock.patch.object(objects.ServiceList, 'get_by_binary')
+    def test_get_all_host_states_incremental_full_refresh(self,
+                                                          svc_get_by_binary,
+                                                          cn_get_all,
+                                                          cn_get_changed,
+                                                          update_from_cn,
+                                                          mock_get_by_hosts):
+        self.flags(scheduler_host_state_refresh_interval=60)
+        svc_get_by_binary.return_value = [objects.Service(host='host1')]
+        cn_get_all.return_value = [self._get_fake_compute_node('host1')]
+        mock_get_by_hosts.return_value = objects.InstanceList()
+
+        self.host_manager.get_all_host_states('fake-context')
+        self.host_manager._last_full_refresh -= datetime.timedelta(
+            seconds=61)
+        self.host_manager.get_all_host_states('fake-context')
+
+        self.assertEqual(2, cn_get_all.call_count)
+        self.assertFalse(cn_get_changed.called)
+        self.assertEqual(2, update_from_cn.call_count)
+
+    @mock.patch.object(objects.ComputeNodeList, 'get_all_changed_since')
+    @mock.patch.object(objects.ComputeNodeList, 'get_all')
+    def test_get_compute_nodes_not_incremental(self, cn_get_all,
+                                               cn_get_changed):
+        cn_get_all.return_value = fakes.COMPUTE_NODES
+        for i in xrange(2):
+            compute_nodes, changed_nodes = (
+                self.host_manager._get_compute_nodes('fake-context'))
+            self.assertEqual(fakes.COMPUTE_NODES, compute_nodes)
+            self.assertIsNone(changed_nodes)
+        self.assertEqual(2, cn_get_all.call_count)
+        self.assertFalse(cn_get_changed.called)
+        self.assertEqual({}, self.host_manager._compute_nodes)
+
     @mock.patch('nova.objects.ServiceList.get_by_binary')
     @mock.patch('nova.objects.ComputeNodeList.get_all')
     @mock.patch('nova.objects.InstanceList.get_by_host')
@@ -527,6 +646,35 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertTrue(host_state.instances)
         self.assertEqual(host_state.instances['uuid1'], inst1)
 
+    @mock.patch('nova.objects.ServiceList.get_by_binary')
+    @mock.patch('nova.objects.ComputeNodeList.get_all')
+    @mock.patch('nova.objects.InstanceList.get_by_host')
+    @mock.patch('nova.objects.InstanceList.get_by_hosts')
+    def test_get_all_host_states_instances_in_bulk(self, mock_get_by_hosts,
+                                                   mock_get_by_host,
+                                                   mock_get_all_comp,
+                                                   mock_get_svc_by_binary):
+        mock_get_all_comp.return_value = fakes.COMPUTE_NODES
+        mock_get_svc_by_binary.return_value = fakes.SERVICES
+        context = 'fake_context'
+        hm = self.host_manager
+        inst1 = objects.Instance(uuid='uuid1', host='host1')
+        inst2 = objects.Instance(uuid='uuid2', host='host2')
+        hm._instance_info = {'host1': {'instances': {'uuid1': inst1},
+                                       'updated': True}}
+        mock_get_by_hosts.return_value = objects.InstanceList(objects=[inst2])
+        hm.get_all_host_states(context)
+        # The host without a service record is skipped, and host1 sends
+        # updates about its instances
+        mock_get_by_hosts.assert_called_once_with(
+            context, ['host2', 'host3', 'host4'])
+        self.assertFalse(mock_get_by_host.called)
+        self.assertEqual({'uuid1': inst1},
+                         hm.host_state_map[('host1', 'node1')].instances)
+        self.assertEqual({'uuid2': inst2},
+                         hm.host_state_map[('host2', 'node2')].instances)
+        self.assertEqual({}, hm.host_state_map[('host3', 'node3')].instances)
+
     @mock.patch('nova.objects.InstanceList.get_by_host')
     def test_recreate_instance_info(self, mock_get_by_host):
         host_name = 'fake_host'
@@ -689,9 +837,9 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
               host_manager.HostState('host4', 'node4')
             ]
 
-    @mock.patch('nova.objects.InstanceList.get_by_host')
-    def test_get_all_host_states(self, mock_get_by_host):
-        mock_get_by_host.return_value = objects.InstanceList()
+    @mock.patch('nova.objects.InstanceList.get_by_hosts')
+    def test_get_all_host_states(self, mock_get_by_hosts):
+        mock_get_by_hosts.return_value = objects.InstanceList()
         context = 'fake_context'
 
         self.mox.StubOutWithMock(objects.ServiceList, 'get_by_binary')
@@ -705,9 +853,9 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 4)
 
-    @mock.patch('nova.objects.InstanceList.get_by_host')
-    def test_get_all_host_states_after_delete_one(self, mock_get_by_host):
-        mock_get_by_host.return_value = objects.InstanceList()
+    @mock.patch('nova.objects.InstanceList.get_by_hosts')
+    def test_get_all_host_states_after_delete_one(self, mock_get_by_hosts):
+        mock_get_by_hosts.return_value = objects.InstanceList()
         context = 'fake_context'
 
         self.mox.StubOutWithMock(objects.ServiceList, 'get_by_binary')
@@ -729,9 +877,9 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 3)
 
-    @mock.patch('nova.objects.InstanceList.get_by_host')
-    def test_get_all_host_states_after_delete_all(self, mock_get_by_host):
-        mock_get_by_host.return_value = objects.InstanceList()
+    @mock.patch('nova.objects.InstanceList.get_by_hosts')
+    def test_get_all_host_states_after_delete_all(self, mock_get_by_hosts):
+        mock_get_by_hosts.return_value = objects.InstanceList()
         context = 'fake_context'
 
         self.mox.StubOutWithMock(objects.ServiceList, 'get_by_binary')
@@ -66,3 +66,13 @@ class IoOpsWeigherTestCase(test.NoDBTestCase):
         self._do_test(io_ops_weight_multiplier=2.0,
                       expected_weight=2.0,
                       expected_host='host4')
+
+    def test_overridden_weigh_object(self):
+        class BusyIoOpsWeigher(io_ops.IoOpsWeigher):
+            def _weigh_object(self, host_state, weight_properties):
+                return -host_state.num_io_ops
+
+        self.weighers = [BusyIoOpsWeigher()]
+        self._do_test(io_ops_weight_multiplier=None,
+                      expected_weight=0.0,
+                      expected_host='host4')
@@ -57,6 +57,17 @@ class RamWeigherTestCase(test.NoDBTestCase):
         self.assertEqual(1.0, weighed_host.weight)
         self.assertEqual('host4', weighed_host.obj.host)
 
+    def test_overridden_weigh_object(self):
+        class ReservedRAMWeigher(ram.RAMWeigher):
+            def _weigh_object(self, host_state, weight_properties):
+                return host_state.free_ram_mb % 3072
+
+        self.weighers = [ReservedRAMWeigher()]
+        weighed_host = self._get_weighed_host(self._get_all_hosts())
+        self.assertEqual(1.0, weighed_host.weight)
+        self.assertEqual('host4', weighed_host.obj.host)
+        self.assertEqual(2048, self.weighers[0].maxval)
+
     def test_ram_filter_multiplier1(self):
         self.flags(ram_weight_multiplier=0.0)
         hostinfo_list = self._get_all_hosts()
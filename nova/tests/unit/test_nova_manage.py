@@ -13,11 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import StringIO
 import sys
+import time
 
 import fixtures
 import mock
+from oslo_serialization import jsonutils
 
 from nova.cmd import manage
 from nova import context
@@ -383,6 +386,61 @@ class DBCommandsTestCase(test.TestCase):
     def test_archive_deleted_rows_negative(self):
         self.assertEqual(1, self.commands.archive_deleted_rows(-1))
 
+    def test_archive_deleted_rows_online_negative(self):
+        self.assertEqual(1, self.commands.archive_deleted_rows(
+            None, batch_size=0))
+        self.assertEqual(1, self.commands.archive_deleted_rows(
+            None, rows_per_second=-1))
+        self.assertEqual(1, self.commands.archive_deleted_rows(
+            None, rows_per_second=0))
+
+    @mock.patch.object(db, 'archive_deleted_rows_batch')
+    @mock.patch.object(db, 'archive_table_names', return_value=['foo', 'bar'])
+    def test_archive_deleted_rows_online_resume(self, mock_names,
+                                                mock_batch):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout',
+                                             StringIO.StringIO()))
+        checkpoint = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                  'archive.json')
+        ctxt = context.get_admin_context()
+
+        mock_batch.side_effect = [(2, 5), (1, 6)]
+        with mock.patch.object(context, 'get_admin_context',
+                               return_value=ctxt):
+            self.commands.archive_deleted_rows(3, batch_size=2,
+                                               checkpoint=checkpoint)
+        self.assertEqual([mock.call(ctxt, 'foo', 2, marker=None),
+                          mock.call(ctxt, 'foo', 1, marker=5)],
+                         mock_batch.call_args_list)
+        with open(checkpoint) as f:
+            self.assertEqual({'table': 'foo', 'marker': 6}, jsonutils.load(f))
+
+        mock_batch.reset_mock()
+        mock_batch.side_effect = [(0, 6), (1, 3)]
+        with mock.patch.object(context, 'get_admin_context',
+                               return_value=ctxt):
+            self.commands.archive_deleted_rows(None, batch_size=2,
+                                               checkpoint=checkpoint)
+        self.assertEqual([mock.call(ctxt, 'foo', 2, marker=6),
+                          mock.call(ctxt, 'bar', 2, marker=None)],
+                         mock_batch.call_args_list)
+        self.assertFalse(os.path.exists(checkpoint))
+        self.assertIn('Archived 1 rows from table bar', sys.stdout.getvalue())
+
+    @mock.patch.object(time, 'sleep')
+    @mock.patch.object(db, 'archive_deleted_rows_batch',
+                       side_effect=[(10, 10), (4, 14)])
+    @mock.patch.object(db, 'archive_table_names', return_value=['foo'])
+    def test_archive_deleted_rows_online_throttled(self, mock_names,
+                                                   mock_batch, mock_sleep):
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout',
+                                             StringIO.StringIO()))
+        self.commands.archive_deleted_rows(None, batch_size=10,
+                                           rows_per_second=5)
+        self.assertEqual(2, mock_batch.call_count)
+        self.assertEqual(2, mock_sleep.call_count)
+        self.assertTrue(1.5 < mock_sleep.call_args_list[0][0][0] <= 2)
+
     @mock.patch.object(migration, 'db_null_instance_uuid_scan',
                        return_value={'foo': 0})
     def test_null_instance_uuid_scan_no_records_found(self, mock_scan):
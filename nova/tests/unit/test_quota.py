@@ -2340,6 +2340,67 @@ class DbQuotaDriverTestCase(test.TestCase):
         self.assertEqual(calls, exemplar)
 
 
+class OptimisticDbQuotaDriverTestCase(test.TestCase):
+    def setUp(self):
+        super(OptimisticDbQuotaDriverTestCase, self).setUp()
+
+        self.calls = []
+        self.driver = quota.OptimisticDbQuotaDriver()
+        self.useFixture(test.TimeOverride())
+
+    def test_reserve(self):
+        def fake_get_project_quotas(context, resources, project_id,
+                                    quota_class=None, defaults=True,
+                                    usages=True, remains=False,
+                                    project_quotas=None):
+            return {k: dict(limit=v.default) for k, v in resources.items()}
+
+        def fake_quota_reserve_optimistic(context, resources, quotas,
+                                          user_quotas, deltas, expire,
+                                          until_refresh, max_age,
+                                          project_id=None, user_id=None):
+            self.calls.append(('quota_reserve_optimistic', deltas, expire,
+                               project_id, user_id))
+            return ['resv-1']
+
+        self.stubs.Set(self.driver, 'get_project_quotas',
+                       fake_get_project_quotas)
+        self.stubs.Set(db, 'quota_reserve_optimistic',
+                       fake_quota_reserve_optimistic)
+        result = self.driver.reserve(FakeContext('test_project', 'test_class'),
+                                     quota.QUOTAS._resources,
+                                     dict(instances=2), expire=3600)
+
+        expire = timeutils.utcnow() + datetime.timedelta(seconds=3600)
+        self.assertEqual([('quota_reserve_optimistic', dict(instances=2),
+                           expire, 'test_project', 'fake_user')], self.calls)
+        self.assertEqual(['resv-1'], result)
+
+    def test_commit(self):
+        def fake_reservation_commit_optimistic(context, reservations):
+            self.calls.append(('reservation_commit_optimistic',
+                               reservations))
+
+        self.stubs.Set(db, 'reservation_commit_optimistic',
+                       fake_reservation_commit_optimistic)
+        self.driver.commit(FakeContext('test_project', 'test_class'),
+                           ['resv-1', 'resv-2'])
+        self.assertEqual([('reservation_commit_optimistic',
+                           ['resv-1', 'resv-2'])], self.calls)
+
+    def test_rollback(self):
+        def fake_reservation_rollback_optimistic(context, reservations):
+            self.calls.append(('reservation_rollback_optimistic',
+                               reservations))
+
+        self.stubs.Set(db, 'reservation_rollback_optimistic',
+                       fake_reservation_rollback_optimistic)
+        self.driver.rollback(FakeContext('test_project', 'test_class'),
+                             ['resv-1', 'resv-2'])
+        self.assertEqual([('reservation_rollback_optimistic',
+                           ['resv-1', 'resv-2'])], self.calls)
+
+
 class FakeSession(object):
     def begin(self):
         return self
@@ -19,6 +19,7 @@ Tests For weights.
 import mock
 
 from nova.scheduler import weights as scheduler_weights
+from nova.scheduler.weights import ram
 from nova import test
 from nova.tests.unit.scheduler import fakes
 from nova import weights
@@ -56,6 +57,20 @@ class TestWeigher(test.NoDBTestCase):
             ret = weights.normalize(seq, minval=minval, maxval=maxval)
             self.assertEqual(tuple(ret), result)
 
+    def test_weigh_objects_records_min_max(self):
+        class FakeWeigher(weights.BaseWeigher):
+            minval = 0
+
+            def _weigh_object(self, obj, weight_properties):
+                return obj
+
+        weigher = FakeWeigher()
+        weighed_objs = [weights.WeighedObject(obj, 0.0)
+                        for obj in (-5, 3, 1)]
+        self.assertEqual([-5, 3, 1], weigher.weigh_objects(weighed_objs, {}))
+        self.assertEqual(-5, weigher.minval)
+        self.assertEqual(3, weigher.maxval)
+
     @mock.patch('nova.weights.BaseWeigher.weigh_objects')
     def test_only_one_host(self, mock_weigh):
         host_values = [
@@ -71,3 +86,20 @@ class TestWeigher(test.NoDBTestCase):
         self.assertEqual(1, len(weighed_host))
         self.assertEqual('host1', weighed_host[0].obj.host)
         self.assertFalse(mock_weigh.called)
+
+    def test_get_weighed_objects_trace(self):
+        hostinfo = [fakes.FakeHostState('host1', 'node1',
+                                        {'free_ram_mb': 512}),
+                    fakes.FakeHostState('host2', 'node2',
+                                        {'free_ram_mb': 1024})]
+        trace = []
+
+        weight_handler = scheduler_weights.HostWeightHandler()
+        weighers = [ram.RAMWeigher()]
+        weighed_hosts = weight_handler.get_weighed_objects(
+            weighers, hostinfo, {'scheduler_trace': trace})
+        self.assertEqual('host2', weighed_hosts[0].obj.host)
+        self.assertEqual(1, len(trace))
+        self.assertEqual('RAMWeigher', trace[0]['weigher'])
+        self.assertEqual(2, trace[0]['hosts_in'])
+        self.assertTrue(trace[0]['elapsed'] >= 0)
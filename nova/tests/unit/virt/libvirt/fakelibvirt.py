@@ -138,6 +138,13 @@ VIR_DOMAIN_BLOCK_COMMIT_RELATIVE = 4
 VIR_CONNECT_LIST_DOMAINS_ACTIVE = 1
 VIR_CONNECT_LIST_DOMAINS_INACTIVE = 2
 
+VIR_DOMAIN_STATS_STATE = 1
+VIR_DOMAIN_STATS_CPU_TOTAL = 2
+VIR_DOMAIN_STATS_BALLOON = 4
+VIR_DOMAIN_STATS_VCPU = 8
+VIR_DOMAIN_STATS_INTERFACE = 16
+VIR_DOMAIN_STATS_BLOCK = 32
+
 # secret type
 VIR_SECRET_USAGE_TYPE_NONE = 0
 VIR_SECRET_USAGE_TYPE_VOLUME = 1
@@ -550,6 +557,36 @@ class Domain(object):
     def blockStats(self, device):
         return [2, 10000242400, 234, 2343424234, 34]
 
+    def _get_stats(self, stats):
+        record = {}
+        if stats & VIR_DOMAIN_STATS_STATE:
+            record['state.state'] = self._state
+            record['state.reason'] = 0
+        if stats & VIR_DOMAIN_STATS_VCPU:
+            record['vcpu.current'] = self._def['vcpu']
+            record['vcpu.maximum'] = self._def['vcpu']
+        if stats & VIR_DOMAIN_STATS_INTERFACE:
+            nics = self._def['devices'].get('nics', [])
+            record['net.count'] = len(nics)
+            for i, nic in enumerate(nics):
+                values = self.interfaceStats('vnet%d' % i)
+                for j, name in enumerate(['rx.bytes', 'rx.pkts', 'rx.errs',
+                                          'rx.drop', 'tx.bytes', 'tx.pkts',
+                                          'tx.errs', 'tx.drop']):
+                    record['net.%d.%s' % (i, name)] = values[j]
+                record['net.%d.name' % i] = 'vnet%d' % i
+        if stats & VIR_DOMAIN_STATS_BLOCK:
+            disks = self._def['devices'].get('disks', [])
+            record['block.count'] = len(disks)
+            for i, disk in enumerate(disks):
+                values = self.blockStats(disk.get('target_dev'))
+                for j, name in enumerate(['rd.reqs', 'rd.bytes', 'wr.reqs',
+                                          'wr.bytes', 'errors']):
+                    record['block.%d.%s' % (i, name)] = values[j]
+                record['block.%d.name' % i] = disk.get('target_dev')
+                record['block.%d.path' % i] = disk.get('source')
+        return record
+
     def suspend(self):
         self._state = VIR_DOMAIN_PAUSED
 
@@ -858,6 +895,19 @@ class Connection(object):
                     vms.append(vm)
         return vms
 
+    def domainListGetStats(self, doms, stats=0, flags=0):
+        if self.fakeLibVersion < 1002008:
+            raise make_libvirtError(
+                    libvirtError,
+                    "this function is not supported by the connection driver",
+                    error_code=VIR_ERR_NO_SUPPORT,
+                    error_domain=VIR_FROM_DOMAIN)
+        return [(dom, dom._get_stats(stats)) for dom in doms]
+
+    def getAllDomainStats(self, stats=0, flags=0):
+        return self.domainListGetStats(self._running_vms.values(), stats,
+                                       flags)
+
     def _emit_lifecycle(self, dom, event, detail):
         if VIR_DOMAIN_EVENT_ID_LIFECYCLE not in self._event_callbacks:
             return
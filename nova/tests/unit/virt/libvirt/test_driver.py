@@ -87,6 +87,7 @@ from nova.virt.libvirt import driver as libvirt_driver
 from nova.virt.libvirt import firewall
 from nova.virt.libvirt import host
 from nova.virt.libvirt import imagebackend
+from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import lvm
 from nova.virt.libvirt import rbd_utils
 from nova.virt.libvirt import utils as libvirt_utils
@@ -7072,6 +7073,22 @@ class LibvirtConnTestCase(test.NoDBTestCase):
                    None)
         self.assertTrue(self.create_image_called)
 
+    @mock.patch.object(imagecache.ImageCacheManager, 'add_instance')
+    def test_spawn_adds_instance_to_image_cache(self, mock_add):
+        def fake_get_info(instance):
+            return hardware.InstanceInfo(state=power_state.RUNNING)
+
+        instance = objects.Instance(**self.test_instance)
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.stubs.Set(drvr, '_get_guest_xml', lambda *a, **k: None)
+        self.stubs.Set(drvr, '_create_image', lambda *a, **k: None)
+        self.stubs.Set(drvr, '_create_domain_and_network',
+                       lambda *a, **k: None)
+        self.stubs.Set(drvr, 'get_info', fake_get_info)
+
+        drvr.spawn(self.context, instance, {}, [], None)
+        mock_add.assert_called_once_with(instance)
+
     def test_spawn_from_volume_calls_cache(self):
         self.cache_called_for_disk = False
 
@@ -12473,6 +12490,20 @@ class LibvirtDriverTestCase(test.NoDBTestCase):
         shutil.assert_called_with('/path_del')
         self.assertTrue(result)
 
+    @mock.patch('shutil.rmtree')
+    @mock.patch('nova.utils.execute')
+    @mock.patch('os.path.exists', return_value=False)
+    @mock.patch('nova.virt.libvirt.utils.get_instance_path',
+                return_value='/path')
+    def test_delete_instance_files_image_cache(self, get_instance_path,
+                                               exists, exe, shutil):
+        instance = objects.Instance(uuid='fake-uuid', id=1)
+
+        with mock.patch.object(self.drvr.image_cache_manager,
+                               'remove_instance') as mock_remove:
+            self.drvr.delete_instance_files(instance)
+            mock_remove.assert_called_once_with(instance)
+
     @mock.patch('shutil.rmtree')
     @mock.patch('nova.utils.execute')
     @mock.patch('os.path.exists')
@@ -12830,6 +12861,38 @@ class LibvirtVolumeUsageTestCase(test.NoDBTestCase):
                             'rd_req': 169L, 'wr_bytes': 0L}]
         self.assertEqual(vol_usage, expected_usage)
 
+    @mock.patch.object(host.Host, 'get_domain_stats')
+    def test_get_all_volume_usage_domain_stats(self, mock_domain_stats):
+        dom = mock.Mock()
+        dom.UUIDString.return_value = self.ins_ref.uuid
+        record = {'block.count': 2,
+                  'block.0.name': 'vda',
+                  'block.0.rd.reqs': 169L, 'block.0.rd.bytes': 688640L,
+                  'block.0.wr.reqs': 0L, 'block.0.wr.bytes': 0L,
+                  'block.0.errors': -1L,
+                  'block.1.name': 'vde',
+                  'block.1.rd.reqs': 7L, 'block.1.rd.bytes': 28672L,
+                  'block.1.wr.reqs': 3L, 'block.1.wr.bytes': 12288L,
+                  'block.1.errors': -1L}
+        mock_domain_stats.return_value = [
+            host.DomainStats(self.drvr._host, dom, record)]
+
+        with mock.patch.object(self.drvr, 'block_stats') as mock_block_stats:
+            vol_usage = self.drvr.get_all_volume_usage(self.c,
+                  [dict(instance=self.ins_ref, instance_bdms=self.bdms)])
+            self.assertFalse(mock_block_stats.called)
+
+        self.assertFalse(dom.blockStats.called)
+        expected_usage = [{'volume': 1,
+                           'instance': self.ins_ref,
+                           'rd_bytes': 28672L, 'wr_req': 3L,
+                           'rd_req': 7L, 'wr_bytes': 12288L},
+                          {'volume': 2,
+                           'instance': self.ins_ref,
+                           'rd_bytes': 688640L, 'wr_req': 0L,
+                           'rd_req': 169L, 'wr_bytes': 0L}]
+        self.assertEqual(expected_usage, vol_usage)
+
     def test_get_all_volume_usage_device_not_found(self):
         def fake_get_domain(self, instance):
             raise exception.InstanceNotFound(instance_id="fakedom")
@@ -15,6 +15,7 @@
 #    under the License.
 
 import contextlib
+import time
 import uuid
 
 import eventlet
@@ -590,6 +591,186 @@ class HostTestCase(test.NoDBTestCase):
         self.assertEqual(doms[2].name(), vm2.name())
         mock_list.assert_called_with(True)
 
+    def _create_stats_domain(self, conn, name, uuid, vcpus):
+        xml = """
+            <domain type='kvm'>
+              <name>%(name)s</name>
+              <uuid>%(uuid)s</uuid>
+              <vcpu>%(vcpus)d</vcpu>
+              <devices>
+                <disk type='file'>
+                  <source file='/path/to/%(name)s/disk'/>
+                  <target dev='vda' bus='virtio'/>
+                </disk>
+                <interface type='bridge'>
+                  <mac address='fa:16:3e:00:00:01'/>
+                  <source bridge='br100'/>
+                </interface>
+              </devices>
+            </domain>
+        """ % {'name': name, 'uuid': uuid, 'vcpus': vcpus}
+        return conn.createXML(xml, 0)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    @mock.patch.object(host.Host, "get_connection")
+    def test_get_domain_stats_bulk(self, mock_conn, mock_list):
+        conn = fakelibvirt.Connection("qemu:///system", version=1002008)
+        vm1 = self._create_stats_domain(
+            conn, "instance00000001",
+            "cef19ce0-0ca2-11df-855d-b19fbce37686", 2)
+        vm2 = self._create_stats_domain(
+            conn, "instance00000002",
+            "8e9b8a04-8c8f-4a1a-a4b4-0a2c5bfd2a53", 4)
+        mock_conn.return_value = conn
+        mock_list.return_value = [vm1, vm2]
+
+        with mock.patch.object(conn, "domainListGetStats",
+                               wraps=conn.domainListGetStats) as mock_stats:
+            domain_stats = self.host.get_domain_stats()
+            mock_stats.assert_called_once_with(
+                [vm1, vm2],
+                fakelibvirt.VIR_DOMAIN_STATS_STATE |
+                fakelibvirt.VIR_DOMAIN_STATS_VCPU |
+                fakelibvirt.VIR_DOMAIN_STATS_INTERFACE |
+                fakelibvirt.VIR_DOMAIN_STATS_BLOCK)
+
+        self.assertEqual(2, len(domain_stats))
+        self.assertEqual(vm1.UUIDString(), domain_stats[0].uuid)
+        self.assertEqual(2, domain_stats[0].get_vcpus_used())
+        self.assertEqual(4, domain_stats[1].get_vcpus_used())
+        with mock.patch.object(vm1, "blockStats") as mock_block_stats:
+            self.assertEqual((2, 10000242400, 234, 2343424234, 34),
+                             domain_stats[0].block_stats('vda'))
+            self.assertFalse(mock_block_stats.called)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    @mock.patch.object(host.Host, "get_connection")
+    def test_get_domain_stats_fallback(self, mock_conn, mock_list):
+        conn = fakelibvirt.Connection("qemu:///system", version=1002008)
+        vm1 = self._create_stats_domain(
+            conn, "instance00000001",
+            "cef19ce0-0ca2-11df-855d-b19fbce37686", 2)
+        mock_conn.return_value = conn
+        mock_list.return_value = [vm1]
+
+        with mock.patch.object(conn, "domainListGetStats") as mock_stats:
+            mock_stats.side_effect = fakelibvirt.make_libvirtError(
+                fakelibvirt.libvirtError,
+                "API is not supported",
+                error_code=fakelibvirt.VIR_ERR_NO_SUPPORT)
+            domain_stats = self.host.get_domain_stats()
+            mock_stats.assert_called_once_with(mock.ANY, mock.ANY)
+
+            self.assertIsNone(domain_stats[0].record)
+            self.assertIsNone(domain_stats[0].generation)
+            self.assertEqual(2, domain_stats[0].get_vcpus_used())
+
+            # The bulk API is not tried again
+            self.host._domain_stats = None
+            self.host.get_domain_stats()
+            mock_stats.assert_called_once_with(mock.ANY, mock.ANY)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    @mock.patch.object(host.Host, "get_connection")
+    def test_get_domain_stats_old_binding(self, mock_conn, mock_list):
+        conn = fakelibvirt.Connection("qemu:///system", version=1002008)
+        vm1 = self._create_stats_domain(
+            conn, "instance00000001",
+            "cef19ce0-0ca2-11df-855d-b19fbce37686", 2)
+        mock_conn.return_value = conn
+        mock_list.return_value = [vm1]
+        # A python binding older than the library lacks the flags
+        old_libvirt = mock.Mock(spec=['libvirtError'],
+                                libvirtError=fakelibvirt.libvirtError)
+
+        with contextlib.nested(
+                mock.patch.object(host, "libvirt", old_libvirt),
+                mock.patch.object(conn, "domainListGetStats")) as (
+                    _libvirt, mock_stats):
+            domain_stats = self.host.get_domain_stats()
+            self.assertFalse(mock_stats.called)
+
+        self.assertIsNone(domain_stats[0].record)
+        self.assertEqual(2, domain_stats[0].get_vcpus_used())
+        self.assertTrue(self.host._skip_domain_stats)
+
+    @mock.patch.object(host.Host, "list_instance_domains")
+    @mock.patch.object(host.Host, "has_min_version")
+    def test_get_domain_stats_old_libvirt(self, mock_version, mock_list):
+        mock_version.return_value = False
+        vm1 = FakeVirtDomain(id=3, name="instance00000001")
+        mock_list.return_value = [vm1]
+
+        with mock.patch.object(fakelibvirt.Connection,
+                               "domainListGetStats") as mock_stats:
+            domain_stats = self.host.get_domain_stats()
+            self.assertFalse(mock_stats.called)
+
+        self.assertEqual(1, len(domain_stats))
+        self.assertIs(vm1, domain_stats[0].dom)
+        self.assertIsNone(domain_stats[0].record)
+        mock_version.assert_called_once_with(
+            host.MIN_LIBVIRT_DOMAIN_STATS_VERSION)
+
+    @mock.patch.object(host.Host, "_get_domain_stats_records")
+    @mock.patch.object(host.Host, "list_instance_domains")
+    @mock.patch.object(time, "time")
+    def test_get_domain_stats_cached(self, mock_time, mock_list,
+                                     mock_records):
+        mock_time.return_value = 1000
+        mock_list.return_value = [FakeVirtDomain(id=3,
+                                                 name="instance00000001")]
+        mock_records.return_value = None
+        self.host._init_events_pipe()
+
+        domain_stats = self.host.get_domain_stats()
+        self.assertIs(domain_stats, self.host.get_domain_stats())
+        self.assertEqual(1, mock_list.call_count)
+
+        # A new snapshot is taken once the current one is too old
+        mock_time.return_value = 1000 + host.DOMAIN_STATS_MAX_AGE
+        self.assertIsNot(domain_stats, self.host.get_domain_stats())
+        self.assertEqual(2, mock_list.call_count)
+
+        # or when a domain lifecycle event happens
+        domain_stats = self.host.get_domain_stats()
+        self.host._queue_event(
+            event.LifecycleEvent("cef19ce0-0ca2-11df-855d-b19fbce37686",
+                                 event.EVENT_LIFECYCLE_STOPPED))
+        with mock.patch.object(self.host, "_event_emit_delayed"):
+            self.host._dispatch_events()
+        self.assertIsNot(domain_stats, self.host.get_domain_stats())
+        self.assertEqual(3, mock_list.call_count)
+
+    def test_get_domain_xml(self):
+        conn = fakelibvirt.Connection("qemu:///system", version=1002008)
+        vm1 = self._create_stats_domain(
+            conn, "instance00000001",
+            "cef19ce0-0ca2-11df-855d-b19fbce37686", 2)
+        stats = dict(conn.domainListGetStats(
+            [vm1], fakelibvirt.VIR_DOMAIN_STATS_BLOCK |
+            fakelibvirt.VIR_DOMAIN_STATS_INTERFACE))
+
+        with mock.patch.object(vm1, "XMLDesc",
+                               return_value="<domain/>") as mock_xml:
+            domain_stats = host.DomainStats(self.host, vm1, stats[vm1])
+            self.assertEqual("<domain/>", domain_stats.get_xml())
+            self.assertEqual("<domain/>", domain_stats.get_xml())
+            mock_xml.assert_called_once_with(0)
+
+            # The devices of the domain changed
+            record = dict(stats[vm1])
+            record['block.count'] = 0
+            domain_stats = host.DomainStats(self.host, vm1, record)
+            self.assertEqual("<domain/>", domain_stats.get_xml())
+            self.assertEqual(2, mock_xml.call_count)
+
+            # No record, no caching
+            domain_stats = host.DomainStats(self.host, vm1)
+            domain_stats.get_xml()
+            domain_stats.get_xml()
+            self.assertEqual(4, mock_xml.call_count)
+
     def test_cpu_features_bug_1217630(self):
         self.host.get_connection()
 
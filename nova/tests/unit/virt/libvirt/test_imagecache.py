@@ -20,6 +20,7 @@ import hashlib
 import os
 import time
 
+import fixtures
 import mock
 from oslo_concurrency import processutils
 from oslo_config import cfg
@@ -704,13 +705,11 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
         self.stubs.Set(os, 'remove', lambda x: remove(x))
 
         self.mox.StubOutWithMock(objects.block_device.BlockDeviceMappingList,
-                   'get_by_instance_uuid')
+                   'bdms_by_instance_uuid')
 
         ctxt = context.get_admin_context()
-        objects.block_device.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, '123').AndReturn(None)
-        objects.block_device.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, '456').AndReturn(None)
+        objects.block_device.BlockDeviceMappingList.bdms_by_instance_uuid(
+                ctxt, ['123', '456']).AndReturn({})
 
         self.mox.ReplayAll()
         # And finally we can make the call we're actually testing...
@@ -801,13 +800,11 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
 
             self.mox.StubOutWithMock(
                 objects.block_device.BlockDeviceMappingList,
-                'get_by_instance_uuid')
+                'bdms_by_instance_uuid')
 
             ctxt = context.get_admin_context()
-            objects.block_device.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, '123').AndReturn(None)
-            objects.block_device.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, '456').AndReturn(None)
+            objects.block_device.BlockDeviceMappingList.bdms_by_instance_uuid(
+                ctxt, ['123', '456']).AndReturn({})
 
             self.mox.ReplayAll()
 
@@ -997,3 +994,169 @@ class VerifyChecksumTestCase(test.NoDBTestCase):
             # Checksum requests for a file with no checksum now have the
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
+
+
+class ImageCacheInventoryTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(ImageCacheInventoryTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.flags(instances_path=self.tmpdir, host='node1')
+        self.flags(image_cache_inventory=True, group='libvirt')
+        self.base_dir = os.path.join(self.tmpdir, '_base')
+        os.mkdir(self.base_dir)
+
+        self.base_name = hashlib.sha1('1').hexdigest()
+        self.base_file = os.path.join(self.base_dir, self.base_name)
+        open(self.base_file, 'w').close()
+        self.instance = fake_instance.fake_instance_obj(
+            None, uuid='123', name='instance-1', image_ref='1', host='node1',
+            vm_state='', task_state='')
+        self.disk_path = self._make_disk(self.instance)
+
+        self.backing_lookups = []
+        patcher = mock.patch.object(libvirt_utils, 'get_disk_backing_file',
+                                    side_effect=self._get_disk_backing_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            objects.BlockDeviceMappingList, 'bdms_by_instance_uuid',
+            return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _make_disk(self, instance):
+        instance_dir = os.path.join(self.tmpdir, instance.uuid)
+        if not os.path.exists(instance_dir):
+            os.mkdir(instance_dir)
+        disk_path = os.path.join(instance_dir, 'disk')
+        with open(disk_path + '.new', 'w'):
+            pass
+        # Replace the disk like resizes and migrations do
+        os.rename(disk_path + '.new', disk_path)
+        return disk_path
+
+    def _get_disk_backing_file(self, disk_path):
+        self.backing_lookups.append(disk_path)
+        return self.base_name
+
+    def _read_inventory(self):
+        with open(imagecache.get_inventory_filename()) as f:
+            return jsonutils.loads(f.read())
+
+    def test_update_inventory(self):
+        def add(inventory):
+            inventory['instances']['foo'] = {'inode': 1, 'backing': None}
+
+        self.assertTrue(imagecache.update_inventory(add))
+        self.assertFalse(imagecache.update_inventory(lambda inv: False))
+        self.assertEqual({'instances': {'foo': {'inode': 1,
+                                                'backing': None}},
+                          'last_used': {}},
+                         self._read_inventory())
+
+    @mock.patch.object(time, 'time', return_value=1000)
+    def test_add_and_remove_instance(self, mock_time):
+        image_cache_manager = imagecache.ImageCacheManager()
+
+        image_cache_manager.add_instance(self.instance)
+        entry = {'inode': os.stat(self.disk_path).st_ino,
+                 'backing': self.base_name}
+        self.assertEqual({'instances': {'123': entry},
+                          'last_used': {self.base_name: 1000}},
+                         self._read_inventory())
+
+        mock_time.return_value = 2000
+        image_cache_manager.remove_instance(self.instance)
+        self.assertEqual({'instances': {},
+                          'last_used': {self.base_name: 2000}},
+                         self._read_inventory())
+
+    def test_add_instance_disabled(self):
+        self.flags(image_cache_inventory=False, group='libvirt')
+        image_cache_manager = imagecache.ImageCacheManager()
+
+        image_cache_manager.add_instance(self.instance)
+        image_cache_manager.remove_instance(self.instance)
+        self.assertFalse(os.path.exists(imagecache.get_inventory_filename()))
+        self.assertEqual([], self.backing_lookups)
+
+    def test_update_uses_inventory(self):
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.update(None, [])
+        self.assertEqual([], self.backing_lookups)
+
+        # The disk of a spawned instance is only inspected by the hook
+        image_cache_manager.add_instance(self.instance)
+        image_cache_manager.update(None, [self.instance])
+        self.assertEqual([self.disk_path], self.backing_lookups)
+        self.assertEqual([self.base_file],
+                         image_cache_manager.active_base_files)
+        inventory = self._read_inventory()
+        self.assertEqual({'host': 'node1', 'time': mock.ANY},
+                         inventory['lease'])
+        self.assertIn('123', inventory['instances'])
+
+        # A disk which was replaced is inspected again
+        self._make_disk(self.instance)
+        image_cache_manager.update(None, [self.instance])
+        self.assertEqual([self.disk_path] * 2, self.backing_lookups)
+        self.assertEqual(os.stat(self.disk_path).st_ino,
+                         self._read_inventory()['instances']['123']['inode'])
+
+    def test_update_reconciles_inventory(self):
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.update(None, [self.instance])
+        image_cache_manager.update(None, [self.instance])
+        self.assertEqual([self.disk_path], self.backing_lookups)
+
+        self.flags(image_cache_inventory_reconcile_seconds=0, group='libvirt')
+        image_cache_manager.update(None, [self.instance])
+        self.assertEqual([self.disk_path] * 2, self.backing_lookups)
+
+    def test_update_forgets_deleted_instances(self):
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.update(None, [self.instance])
+
+        os.unlink(self.disk_path)
+        image_cache_manager.update(None, [])
+        self.assertEqual({}, self._read_inventory()['instances'])
+
+    def test_update_lease_held_by_other_node(self):
+        def lease(inventory):
+            inventory['lease'] = {'host': 'node2', 'time': time.time()}
+
+        imagecache.update_inventory(lease)
+        image_cache_manager = imagecache.ImageCacheManager()
+        with mock.patch.object(image_cache_manager,
+                               '_list_base_images') as mock_list:
+            image_cache_manager.update(None, [self.instance])
+            self.assertFalse(mock_list.called)
+        self.assertEqual('node2', self._read_inventory()['lease']['host'])
+
+        # The lease is taken over once the other node stops renewing it
+        self.flags(image_cache_manager_interval=60)
+        with mock.patch.object(time, 'time', return_value=time.time() + 121):
+            image_cache_manager.update(None, [self.instance])
+        self.assertEqual('node1', self._read_inventory()['lease']['host'])
+        self.assertEqual([self.base_file],
+                         image_cache_manager.active_base_files)
+
+    def test_update_ages_from_last_use(self):
+        self.flags(remove_unused_original_minimum_age_seconds=3600)
+        os.utime(self.base_file, (0, 0))
+        image_cache_manager = imagecache.ImageCacheManager()
+        image_cache_manager.add_instance(self.instance)
+        image_cache_manager.remove_instance(self.instance)
+        os.unlink(self.disk_path)
+
+        # The base file is old but was released recently
+        image_cache_manager.update(None, [])
+        self.assertEqual([self.base_file],
+                         image_cache_manager.removable_base_files)
+        self.assertTrue(os.path.exists(self.base_file))
+
+        with mock.patch.object(time, 'time', return_value=time.time() + 3600):
+            image_cache_manager.update(None, [])
+        self.assertFalse(os.path.exists(self.base_file))
+        self.assertEqual({}, self._read_inventory()['last_used'])
@@ -12,6 +12,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import itertools
 import uuid
 
 import mock
@@ -1465,6 +1466,58 @@ class VirtNUMAHostTopologyTestCase(test.NoDBTestCase):
                                                         pci_stats=pci_stats)
             self.assertIsNone(fitted_instance1)
 
+    def _fit_all_permutations(self, host, instance, limits=None):
+        # The original search, trying all the permutations of host cells
+        for host_cell_perm in itertools.permutations(host.cells,
+                                                     len(instance)):
+            cells = []
+            for host_cell, instance_cell in zip(host_cell_perm,
+                                                instance.cells):
+                got_cell = hw._numa_fit_instance_cell(host_cell,
+                                                      instance_cell, limits)
+                if got_cell is None:
+                    break
+                cells.append(got_cell)
+            if len(cells) == len(host_cell_perm):
+                return [cell.id for cell in cells]
+
+    def test_get_fitting_same_as_all_permutations(self):
+        host = objects.NUMATopology(cells=[
+            objects.NUMACell(id=i, cpuset=set(range(i * 8, i * 8 + 8)),
+                             memory=8192, cpu_usage=(i * 3) % 8,
+                             memory_usage=(i * 2048) % 8192, mempages=[],
+                             siblings=[], pinned_cpus=set([]))
+            for i in range(8)])
+        limits = objects.NUMATopologyLimits(cpu_allocation_ratio=1.5,
+                                            ram_allocation_ratio=1.0)
+        for cell_sizes in ([(8, 8192)], [(4, 4096)] * 4, [(6, 6144)] * 4,
+                           [(2, 1024), (8, 8192), (4, 2048)],
+                           [(6, 4096)] * 6, [(8, 8192)] * 3):
+            for fit_limits in (None, limits):
+                instance = objects.InstanceNUMATopology(cells=[
+                    objects.InstanceNUMACell(id=i, cpuset=set(range(cpus)),
+                                             memory=memory)
+                    for i, (cpus, memory) in enumerate(cell_sizes)])
+                expected = self._fit_all_permutations(
+                    host, instance.obj_clone(), fit_limits)
+                fitted = hw.numa_fit_instance_to_host(host, instance,
+                                                      fit_limits)
+                if expected is None:
+                    self.assertIsNone(fitted)
+                else:
+                    self.assertEqual(expected,
+                                     [cell.id for cell in fitted.cells])
+
+    @mock.patch.object(hw, '_numa_fit_instance_cell')
+    def test_get_fitting_skips_cells_too_small(self, mock_fit):
+        instance = objects.InstanceNUMATopology(
+                cells=[objects.InstanceNUMACell(id=0, cpuset=set([1, 2]),
+                                                memory=1024),
+                       objects.InstanceNUMACell(id=1, cpuset=set([3, 4, 5]),
+                                                memory=1024)])
+        self.assertIsNone(hw.numa_fit_instance_to_host(self.host, instance))
+        self.assertFalse(mock_fit.called)
+
 
 class NumberOfSerialPortsTest(test.NoDBTestCase):
     def test_flavor(self):
@@ -98,15 +98,13 @@ class ImageCacheManagerTests(test.NoDBTestCase):
         image_cache_manager = imagecache.ImageCacheManager()
 
         self.mox.StubOutWithMock(objects.block_device.BlockDeviceMappingList,
-                   'get_by_instance_uuid')
+                   'bdms_by_instance_uuid')
 
         ctxt = context.get_admin_context()
-        objects.block_device.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, '123').AndReturn(swap_bdm_256)
-        objects.block_device.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, '456').AndReturn(swap_bdm_128)
-        objects.block_device.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, '789').AndReturn(swap_bdm_128)
+        objects.block_device.BlockDeviceMappingList.bdms_by_instance_uuid(
+                ctxt, ['123', '456', '789']).AndReturn(
+                    {'123': swap_bdm_256, '456': swap_bdm_128,
+                     '789': swap_bdm_128})
 
         self.mox.ReplayAll()
 
@@ -151,11 +149,11 @@ class ImageCacheManagerTests(test.NoDBTestCase):
 
         image_cache_manager = imagecache.ImageCacheManager()
         self.mox.StubOutWithMock(objects.block_device.BlockDeviceMappingList,
-                   'get_by_instance_uuid')
+                   'bdms_by_instance_uuid')
 
         ctxt = context.get_admin_context()
-        objects.block_device.BlockDeviceMappingList.get_by_instance_uuid(
-                ctxt, '123').AndReturn(swap_bdm_256)
+        objects.block_device.BlockDeviceMappingList.bdms_by_instance_uuid(
+                ctxt, ['123']).AndReturn({'123': swap_bdm_256})
 
         self.mox.ReplayAll()
         running = image_cache_manager._list_running_instances(ctxt,
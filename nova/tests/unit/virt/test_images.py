@@ -13,7 +13,9 @@
 #    under the License.
 
 import os
+import struct
 
+import fixtures
 import mock
 from oslo_concurrency import processutils
 
@@ -43,3 +45,94 @@ class QemuTestCase(test.NoDBTestCase):
         image_info = images.qemu_img_info('/fake/path')
         self.assertTrue(image_info)
         self.assertTrue(str(image_info))
+
+
+class CachedQemuImgInfoTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(CachedQemuImgInfoTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+        self.addCleanup(images._QEMU_IMG_INFO_CACHE.clear)
+        patcher = mock.patch.object(images, 'qemu_img_info')
+        self.mock_qemu_img_info = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _qcow2(self, name, backing_file='', version=2, nb_snapshots=0,
+               crypt_method=0, incompatible_features=0):
+        header = images._QCOW2_HEADER.pack(
+            images._QCOW2_MAGIC, version, 512 if backing_file else 0,
+            len(backing_file), 16, 10 * 1024 * 1024 * 1024, crypt_method,
+            0, 0, 0, 0, nb_snapshots, 0)
+        header += struct.pack('>Q', incompatible_features)
+        header = header.ljust(512, '\0') + backing_file
+        return self._write(name, header)
+
+    def test_raw(self):
+        path = self._write('disk', 'x' * 4096)
+        info = images.cached_qemu_img_info(path)
+        self.assertEqual('raw', info.file_format)
+        self.assertEqual(4096, info.virtual_size)
+        self.assertIsNone(info.backing_file)
+        self.assertFalse(self.mock_qemu_img_info.called)
+
+    def test_qcow2(self):
+        path = self._qcow2('disk', backing_file='/base/abc')
+        info = images.cached_qemu_img_info(path)
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual(10 * 1024 * 1024 * 1024, info.virtual_size)
+        self.assertEqual(65536, info.cluster_size)
+        self.assertEqual('/base/abc', info.backing_file)
+        self.assertFalse(self.mock_qemu_img_info.called)
+
+    def test_qcow2_relative_backing_file(self):
+        path = self._qcow2('disk', backing_file='abc', version=3)
+        info = images.cached_qemu_img_info(path)
+        self.assertEqual(os.path.join(self.tmpdir, 'abc'), info.backing_file)
+
+    def _test_qemu_img_needed(self, path):
+        info = images.cached_qemu_img_info(path)
+        self.mock_qemu_img_info.assert_called_once_with(path)
+        self.assertEqual(self.mock_qemu_img_info.return_value, info)
+
+    def test_qcow2_snapshots(self):
+        self._test_qemu_img_needed(self._qcow2('disk', nb_snapshots=1))
+
+    def test_qcow2_encrypted(self):
+        self._test_qemu_img_needed(self._qcow2('disk', crypt_method=1))
+
+    def test_qcow2_incompatible_features(self):
+        self._test_qemu_img_needed(self._qcow2('disk', version=3,
+                                               incompatible_features=1))
+
+    def test_other_format(self):
+        self._test_qemu_img_needed(self._write('disk', 'KDMV' + 'x' * 508))
+
+    def test_vdi(self):
+        data = 'x' * 0x40 + images._VDI_SIGNATURE + 'x' * 512
+        self._test_qemu_img_needed(self._write('disk', data))
+
+    def test_missing_path(self):
+        self._test_qemu_img_needed(os.path.join(self.tmpdir, 'missing'))
+
+    def test_cached_until_changed(self):
+        path = self._write('disk', 'x' * 4096)
+        info = images.cached_qemu_img_info(path)
+        with mock.patch.object(images, '_read_image_header') as mock_read:
+            self.assertIs(info, images.cached_qemu_img_info(path))
+            self.assertFalse(mock_read.called)
+
+        st = os.stat(path)
+        os.utime(path, (st.st_atime, st.st_mtime + 10))
+        self.assertIsNot(info, images.cached_qemu_img_info(path))
+
+    def test_cache_size(self):
+        self.stubs.Set(images, '_QEMU_IMG_INFO_CACHE_SIZE', 2)
+        paths = [self._write('disk%d' % i, 'x') for i in range(3)]
+        for path in paths:
+            images.cached_qemu_img_info(path)
+        self.assertEqual(paths[1:], list(images._QEMU_IMG_INFO_CACHE))
@@ -169,7 +169,7 @@ def get_disk_size(path):
     :returns: Size (in bytes) of the given disk image as it would be seen
               by a virtual machine.
     """
-    return images.qemu_img_info(path).virtual_size
+    return images.cached_qemu_img_info(path).virtual_size
 
 
 def extend(image, size, use_cow=False):
@@ -729,6 +729,41 @@ def _numa_fit_instance_cell_with_pinning(host_cell, instance_cell):
             [host_cell.free_cpus], instance_cell, host_cell.id)
 
 
+def _numa_cell_can_fit(host_cell, instance_cell, limit_cell=None):
+    """Check if a instance cell has enough CPUs and memory on a host cell
+
+    :param host_cell: host cell to fit the instance cell onto
+    :param instance_cell: instance cell we want to fit
+    :param limit_cell: an objects.NUMATopologyLimit or None
+
+    Unlike _numa_fit_instance_cell, this only compares the sizes of the
+    cells and does not modify the instance cell, so it can be used to rule
+    out host cells before trying to fit the instance cell onto them.
+
+    :returns: False if the instance cell cannot fit, True otherwise
+    """
+    # NOTE (ndipanov): do not allow an instance to overcommit against
+    # itself on any NUMA cell
+    if (instance_cell.memory > host_cell.memory or
+            len(instance_cell.cpuset) > len(host_cell.cpuset)):
+        return False
+
+    if instance_cell.cpu_pinning_requested:
+        # No oversubscription of the pinned CPUs and their memory
+        return (host_cell.avail_cpus >= len(instance_cell.cpuset) and
+                host_cell.avail_memory >= instance_cell.memory)
+
+    elif limit_cell:
+        memory_usage = host_cell.memory_usage + instance_cell.memory
+        cpu_usage = host_cell.cpu_usage + len(instance_cell.cpuset)
+        cpu_limit = len(host_cell.cpuset) * limit_cell.cpu_allocation_ratio
+        ram_limit = host_cell.memory * limit_cell.ram_allocation_ratio
+        if memory_usage > ram_limit or cpu_usage > cpu_limit:
+            return False
+
+    return True
+
+
 def _numa_fit_instance_cell(host_cell, instance_cell, limit_cell=None):
     """Check if a instance cell can fit and set it's cell id
 
@@ -742,10 +777,7 @@ def _numa_fit_instance_cell(host_cell, instance_cell, limit_cell=None):
 
     :returns: a new instance cell or None
     """
-    # NOTE (ndipanov): do not allow an instance to overcommit against
-    # itself on any NUMA cell
-    if (instance_cell.memory > host_cell.memory or
-            len(instance_cell.cpuset) > len(host_cell.cpuset)):
+    if not _numa_cell_can_fit(host_cell, instance_cell, limit_cell):
         return None
 
     if instance_cell.cpu_pinning_requested:
@@ -756,14 +788,6 @@ def _numa_fit_instance_cell(host_cell, instance_cell, limit_cell=None):
         new_instance_cell.pagesize = instance_cell.pagesize
         instance_cell = new_instance_cell
 
-    elif limit_cell:
-        memory_usage = host_cell.memory_usage + instance_cell.memory
-        cpu_usage = host_cell.cpu_usage + len(instance_cell.cpuset)
-        cpu_limit = len(host_cell.cpuset) * limit_cell.cpu_allocation_ratio
-        ram_limit = host_cell.memory * limit_cell.ram_allocation_ratio
-        if memory_usage > ram_limit or cpu_usage > cpu_limit:
-            return None
-
     pagesize = None
     if instance_cell.pagesize:
         pagesize = _numa_cell_supports_pagesize_request(
@@ -1009,30 +1033,52 @@ def numa_fit_instance_to_host(
     by calling the _numa_fit_instance_cell method, and return a new
     InstanceNUMATopology with it's cell ids set to host cell id's of
     the first successful permutation, or None.
+
+    The permutations are walked in order as a tree, one instance cell per
+    level, so that the permutations sharing a prefix which cannot fit are
+    all skipped at once, and the host cells which an instance cell is too
+    big for are ruled out before walking the permutations.
     """
     if (not (host_topology and instance_topology) or
         len(host_topology) < len(instance_topology)):
         return
-    else:
+
+    candidate_cells = []
+    for instance_cell in instance_topology.cells:
+        candidates = [(index, host_cell) for index, host_cell
+                      in enumerate(host_topology.cells)
+                      if _numa_cell_can_fit(host_cell, instance_cell, limits)]
+        if not candidates:
+            return
+        candidate_cells.append(candidates)
+
+    def _fit_remaining_cells(cells, used_host_cells):
+        if len(cells) == len(instance_topology):
+            if not pci_requests:
+                return cells
+            elif ((pci_stats is not None) and
+                    pci_stats.support_requests(pci_requests, cells)):
+                return cells
+            return None
+
+        instance_cell = instance_topology.cells[len(cells)]
         # TODO(ndipanov): We may want to sort permutations differently
         # depending on whether we want packing/spreading over NUMA nodes
-        for host_cell_perm in itertools.permutations(
-                host_topology.cells, len(instance_topology)):
-            cells = []
-            for host_cell, instance_cell in zip(
-                    host_cell_perm, instance_topology.cells):
-                got_cell = _numa_fit_instance_cell(
-                    host_cell, instance_cell, limits)
-                if got_cell is None:
-                    break
-                cells.append(got_cell)
-            if len(cells) == len(host_cell_perm):
-                if not pci_requests:
-                    return objects.InstanceNUMATopology(cells=cells)
-                elif ((pci_stats is not None) and
-                    pci_stats.support_requests(pci_requests,
-                                                     cells)):
-                    return objects.InstanceNUMATopology(cells=cells)
+        for index, host_cell in candidate_cells[len(cells)]:
+            if index in used_host_cells:
+                continue
+            got_cell = _numa_fit_instance_cell(
+                host_cell, instance_cell, limits)
+            if got_cell is None:
+                continue
+            fitted_cells = _fit_remaining_cells(
+                cells + [got_cell], used_host_cells | set([index]))
+            if fitted_cells is not None:
+                return fitted_cells
+
+    cells = _fit_remaining_cells([], set())
+    if cells is not None:
+        return objects.InstanceNUMATopology(cells=cells)
 
 
 def _numa_pagesize_usage_from_cell(hostcell, instancecell, sign):
@@ -1069,6 +1115,16 @@ def numa_usage_from_instances(host, instances, free=False):
     instances = instances or []
     cells = []
     sign = -1 if free else 1
+
+    # Group the instance cells by host cell once, rather than looking at all
+    # the cells of all the instances for each host cell
+    instance_cells_by_id = collections.defaultdict(list)
+    for instance in instances:
+        pinning_requested = instance.cpu_pinning_requested
+        for instancecell in instance.cells:
+            instance_cells_by_id[instancecell.id].append(
+                (instancecell, pinning_requested))
+
     for hostcell in host.cells:
         memory_usage = hostcell.memory_usage
         cpu_usage = hostcell.cpu_usage
@@ -1078,22 +1134,21 @@ def numa_usage_from_instances(host, instances, free=False):
             cpu_usage=0, memory_usage=0, mempages=hostcell.mempages,
             pinned_cpus=hostcell.pinned_cpus, siblings=hostcell.siblings)
 
-        for instance in instances:
-            for instancecell in instance.cells:
-                if instancecell.id == hostcell.id:
-                    memory_usage = (
-                            memory_usage + sign * instancecell.memory)
-                    cpu_usage = cpu_usage + sign * len(instancecell.cpuset)
-                    if instancecell.pagesize and instancecell.pagesize > 0:
-                        newcell.mempages = _numa_pagesize_usage_from_cell(
-                            hostcell, instancecell, sign)
-                    if instance.cpu_pinning_requested:
-                        pinned_cpus = set(instancecell.cpu_pinning.values())
-                        if free:
-                            newcell.unpin_cpus(pinned_cpus)
-                        else:
-                            newcell.pin_cpus(pinned_cpus)
-
+        for instancecell, pinning_requested in instance_cells_by_id.get(
+                hostcell.id, []):
+            memory_usage = memory_usage + sign * instancecell.memory
+            cpu_usage = cpu_usage + sign * len(instancecell.cpuset)
+            if instancecell.pagesize and instancecell.pagesize > 0:
+                newcell.mempages = _numa_pagesize_usage_from_cell(
+                    hostcell, instancecell, sign)
+            if pinning_requested:
+                pinned_cpus = set(instancecell.cpu_pinning.values())
+                if free:
+                    newcell.unpin_cpus(pinned_cpus)
+                else:
+                    newcell.pin_cpus(pinned_cpus)
+
+        if instances:
             newcell.cpu_usage = max(0, cpu_usage)
             newcell.memory_usage = max(0, memory_usage)
 
@@ -19,7 +19,10 @@
 Handling of VM disk images.
 """
 
+import collections
 import os
+import stat
+import struct
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -43,6 +46,32 @@ CONF = cfg.CONF
 CONF.register_opts(image_opts)
 IMAGE_API = image.API()
 
+# The results of cached_qemu_img_info() by path, with the inode, size and
+# mtime of the image they were read from, least recently used first.
+_QEMU_IMG_INFO_CACHE = collections.OrderedDict()
+_QEMU_IMG_INFO_CACHE_SIZE = 1024
+
+# The first fields of a qcow2 header: magic, version, backing file offset,
+# backing file size, cluster bits, virtual size, encryption method, L1
+# table size and offset, refcount table offset and clusters, number of
+# snapshots and snapshot table offset. The incompatible feature bits of
+# version 3 follow.
+_QCOW2_MAGIC = 'QFI\xfb'
+_QCOW2_HEADER = struct.Struct('>4sIQIIQIIQQIIQ')
+_QCOW2_V3_FEATURES = struct.Struct('>Q')
+_QCOW2_MAX_BACKING_FILE_SIZE = 1023
+
+# The signatures qemu-img probes the start of an image for, an image with
+# none of them is raw. VDI keeps its own at an offset.
+_IMAGE_SIGNATURES = ('QFI\xfb', 'QED\x00', 'KDMV', 'COWD',
+                     '# Disk DescriptorFile', 'conectix', 'vhdxfile',
+                     'WithoutFreeSpace', 'WithouFreSpacExt',
+                     'Bochs Virtual HD Image', '#!/bin/sh\n#V2.0 Format',
+                     'LUKS\xba\xbe')
+_VDI_SIGNATURE = '\x7f\x10\xda\xbe'
+_VDI_SIGNATURE_OFFSET = 0x40
+_PROBE_SIZE = 512
+
 
 def qemu_img_info(path):
     """Return an object containing the parsed output from qemu-img info."""
@@ -66,6 +95,95 @@ def qemu_img_info(path):
     return imageutils.QemuImgInfo(out)
 
 
+def _read_qcow2_header(image_file, header, info):
+    if len(header) < _QCOW2_HEADER.size:
+        return None
+    (_magic, version, backing_file_offset, backing_file_size, cluster_bits,
+     virtual_size, crypt_method, _l1_size, _l1_table_offset,
+     _refcount_table_offset, _refcount_table_clusters, nb_snapshots,
+     _snapshots_offset) = _QCOW2_HEADER.unpack_from(header)
+    # NOTE: qemu-img reports the snapshots and the encryption, leave these
+    # images and any unknown feature to it.
+    if version not in (2, 3) or crypt_method or nb_snapshots:
+        return None
+    if version == 3:
+        if len(header) < _QCOW2_HEADER.size + _QCOW2_V3_FEATURES.size:
+            return None
+        incompatible_features, = _QCOW2_V3_FEATURES.unpack_from(
+            header, _QCOW2_HEADER.size)
+        if incompatible_features:
+            return None
+
+    if backing_file_offset:
+        if backing_file_size > _QCOW2_MAX_BACKING_FILE_SIZE:
+            return None
+        image_file.seek(backing_file_offset)
+        backing_file = image_file.read(backing_file_size)
+        if len(backing_file) != backing_file_size:
+            return None
+        # NOTE: qemu-img reports the actual path, relative to the image.
+        info.backing_file = os.path.join(os.path.dirname(info.image),
+                                         backing_file)
+    info.file_format = 'qcow2'
+    info.virtual_size = virtual_size
+    info.cluster_size = 1 << cluster_bits
+    return info
+
+
+def _read_image_header(path, st):
+    """Read what qemu-img info reports from the header of an image.
+
+    Only raw and plain qcow2 images are understood, None is returned for
+    anything else.
+    """
+    if not stat.S_ISREG(st.st_mode) or path.endswith('.dmg'):
+        return None
+
+    info = imageutils.QemuImgInfo()
+    info.image = path
+    info.disk_size = st.st_blocks * 512
+    try:
+        with open(path, 'rb') as image_file:
+            header = image_file.read(_PROBE_SIZE)
+            if header.startswith(_QCOW2_MAGIC):
+                return _read_qcow2_header(image_file, header, info)
+    except IOError:
+        return None
+
+    if (header.startswith(_IMAGE_SIGNATURES) or
+            header[_VDI_SIGNATURE_OFFSET:_VDI_SIGNATURE_OFFSET + 4] ==
+            _VDI_SIGNATURE):
+        return None
+    info.file_format = 'raw'
+    info.virtual_size = st.st_size
+    return info
+
+
+def cached_qemu_img_info(path):
+    """Return the qemu_img_info() of path, cached until the image changes.
+
+    The result is kept with the inode, size and mtime of the image, and is
+    read from the image header, with no qemu-img run, for the raw and plain
+    qcow2 images. Meant for the periodic tasks looking at the same disks
+    over and over, the images just downloaded should go to qemu_img_info().
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return qemu_img_info(path)
+
+    key = (st.st_ino, st.st_size, st.st_mtime)
+    cached = _QEMU_IMG_INFO_CACHE.pop(path, None)
+    if cached is not None and cached[0] == key:
+        info = cached[1]
+    else:
+        info = _read_image_header(path, st) or qemu_img_info(path)
+    _QEMU_IMG_INFO_CACHE[path] = (key, info)
+    while len(_QEMU_IMG_INFO_CACHE) > _QEMU_IMG_INFO_CACHE_SIZE:
+        _QEMU_IMG_INFO_CACHE.popitem(last=False)
+    return info
+
+
 def convert_image(source, dest, out_format, run_as_root=False):
     """Convert image to other format."""
     cmd = ('qemu-img', 'convert', '-O', out_format, source, dest)
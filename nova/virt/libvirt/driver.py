@@ -2341,6 +2341,7 @@ class LibvirtDriver(driver.ComputeDriver):
                            block_device_info=block_device_info,
                            files=injected_files,
                            admin_pass=admin_password)
+        self.image_cache_manager.add_instance(instance)
         xml = self._get_guest_xml(context, instance, network_info,
                                   disk_info, image_meta,
                                   block_device_info=block_device_info,
@@ -4535,16 +4536,13 @@ class LibvirtDriver(driver.ComputeDriver):
         if CONF.libvirt.virt_type == 'lxc':
             return total + 1
 
-        for dom in self._host.list_instance_domains():
+        for domain_stats in self._host.get_domain_stats():
             try:
-                vcpus = dom.vcpus()
+                total += domain_stats.get_vcpus_used()
             except libvirt.libvirtError as e:
                 LOG.warn(_LW("couldn't obtain the vpu count from domain id:"
                              " %(uuid)s, exception: %(ex)s") %
-                         {"uuid": dom.UUIDString(), "ex": e})
-            else:
-                if vcpus is not None and len(vcpus) > 1:
-                    total += len(vcpus[1])
+                         {"uuid": domain_stats.uuid, "ex": e})
             # NOTE(gtt116): give other tasks a chance.
             greenthread.sleep(0)
         return total
@@ -4765,9 +4763,12 @@ class LibvirtDriver(driver.ComputeDriver):
            a given host.
         """
         vol_usage = []
+        domain_stats = {stats.uuid: stats
+                        for stats in self._host.get_domain_stats()}
 
         for instance_bdms in compute_host_bdms:
             instance = instance_bdms['instance']
+            instance_stats = domain_stats.get(instance.uuid)
 
             for bdm in instance_bdms['instance_bdms']:
                 mountpoint = bdm['device_name']
@@ -4777,7 +4778,11 @@ class LibvirtDriver(driver.ComputeDriver):
 
                 LOG.debug("Trying to get stats for the volume %s",
                           volume_id)
-                vol_stats = self.block_stats(instance, mountpoint)
+                if instance_stats is None:
+                    vol_stats = self.block_stats(instance, mountpoint)
+                else:
+                    vol_stats = self._get_block_stats(
+                        instance, instance_stats, mountpoint)
 
                 if vol_stats:
                     stats = dict(volume=volume_id,
@@ -4799,7 +4804,17 @@ class LibvirtDriver(driver.ComputeDriver):
         """Note that this function takes an instance name."""
         try:
             domain = self._host.get_domain(instance)
-            return domain.blockStats(disk_id)
+        except exception.InstanceNotFound:
+            LOG.info(_LI('Could not find domain in libvirt for instance %s. '
+                         'Cannot get block stats for device'), instance.name)
+            return
+        return self._get_block_stats(instance,
+                                     host.DomainStats(self._host, domain),
+                                     disk_id)
+
+    def _get_block_stats(self, instance, domain_stats, disk_id):
+        try:
+            return domain_stats.block_stats(disk_id)
         except libvirt.libvirtError as e:
             errcode = e.get_error_code()
             LOG.info(_LI('Getting block stats failed, device might have '
@@ -4807,9 +4822,6 @@ class LibvirtDriver(driver.ComputeDriver):
                          'Disk=%(disk)s Code=%(errcode)s Error=%(e)s'),
                      {'instance_name': instance.name, 'disk': disk_id,
                       'errcode': errcode, 'e': e})
-        except exception.InstanceNotFound:
-            LOG.info(_LI('Could not find domain in libvirt for instance %s. '
-                         'Cannot get block stats for device'), instance.name)
 
     def get_console_pool_info(self, console_type):
         # TODO(mdragon): console proxy should be implemented for libvirt,
@@ -6075,9 +6087,10 @@ class LibvirtDriver(driver.ComputeDriver):
         """Return total over committed disk size for all instances."""
         # Disk size that all instance uses : virtual_size - disk_size
         disk_over_committed_size = 0
-        for dom in self._host.list_instance_domains():
+        for domain_stats in self._host.get_domain_stats():
+            dom = domain_stats.dom
             try:
-                xml = dom.XMLDesc(0)
+                xml = domain_stats.get_xml()
                 disk_infos = jsonutils.loads(
                         self._get_instance_disk_info(dom.name(), xml))
                 for info in disk_infos:
@@ -6611,6 +6624,7 @@ class LibvirtDriver(driver.ComputeDriver):
         self.firewall_driver.setup_basic_filtering(instance, nw_info)
 
     def delete_instance_files(self, instance):
+        self.image_cache_manager.remove_instance(instance)
         target = libvirt_utils.get_instance_path(instance)
         # A resize may be in progress
         target_resize = target + '_resize'
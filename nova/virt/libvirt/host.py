@@ -32,6 +32,7 @@ import os
 import socket
 import sys
 import threading
+import time
 
 import eventlet
 from eventlet import greenio
@@ -74,6 +75,13 @@ CONF.import_opt('my_ip', 'nova.netconf')
 HV_DRIVER_QEMU = "QEMU"
 HV_DRIVER_XEN = "Xen"
 
+# The bulk domain statistics API
+MIN_LIBVIRT_DOMAIN_STATS_VERSION = (1, 2, 8)
+
+# How long, in seconds, a snapshot of the domain statistics is shared
+# between its consumers
+DOMAIN_STATS_MAX_AGE = 20
+
 
 class DomainJobInfo(object):
     """Information about libvirt background jobs
@@ -190,6 +198,71 @@ class DomainJobInfo(object):
             return cls._get_job_stats_compat(dom)
 
 
+class DomainStats(object):
+    """Statistics of a guest domain
+
+    This class encapsulates the statistics of a domain taken in
+    a snapshot of all the domains. When the record returned by
+    the bulk virConnectGetAllDomainStats family of APIs is not
+    available the statistics are queried from the domain itself,
+    with the older per domain APIs.
+    """
+
+    def __init__(self, host, dom, record=None):
+        self._host = host
+        self.dom = dom
+        self.record = record
+
+    @property
+    def uuid(self):
+        return self.dom.UUIDString()
+
+    @property
+    def generation(self):
+        """Identifies the devices of the running domain
+
+        Returns a value which changes whenever the domain is restarted or
+        its disks and interfaces change, or None if it is not known.
+        """
+        if self.record is None:
+            return None
+        block = [(self.record.get('block.%d.name' % i),
+                  self.record.get('block.%d.path' % i))
+                 for i in range(self.record.get('block.count', 0))]
+        net = [self.record.get('net.%d.name' % i)
+               for i in range(self.record.get('net.count', 0))]
+        return (self.dom.ID(), tuple(block), tuple(net))
+
+    def get_vcpus_used(self):
+        """Returns the number of vcpus currently used by the domain."""
+        if self.record is not None:
+            return self.record.get('vcpu.current', 0)
+
+        vcpus = self.dom.vcpus()
+        if vcpus is not None and len(vcpus) > 1:
+            return len(vcpus[1])
+        return 0
+
+    def block_stats(self, disk_id):
+        """Returns the statistics of a disk as virDomainBlockStats does."""
+        if self.record is not None:
+            for i in range(self.record.get('block.count', 0)):
+                if self.record.get('block.%d.name' % i) == disk_id:
+                    prefix = 'block.%d.' % i
+                    return (self.record.get(prefix + 'rd.reqs', -1),
+                            self.record.get(prefix + 'rd.bytes', -1),
+                            self.record.get(prefix + 'wr.reqs', -1),
+                            self.record.get(prefix + 'wr.bytes', -1),
+                            self.record.get(prefix + 'errors', -1))
+
+        # The disk may have been attached after the snapshot was taken
+        return self.dom.blockStats(disk_id)
+
+    def get_xml(self):
+        """Returns the XML description of the running domain."""
+        return self._host.get_domain_xml(self)
+
+
 class Host(object):
 
     def __init__(self, uri, read_only=False,
@@ -205,6 +278,10 @@ class Host(object):
         self._conn_event_handler = conn_event_handler
         self._lifecycle_event_handler = lifecycle_event_handler
         self._skip_list_all_domains = False
+        self._skip_domain_stats = False
+        self._domain_stats = None
+        self._domain_stats_time = 0
+        self._domain_xml = {}
         self._caps = None
         self._hostname = None
 
@@ -360,6 +437,9 @@ class Host(object):
             try:
                 event = self._event_queue.get(block=False)
                 if isinstance(event, virtevent.LifecycleEvent):
+                    # The domain statistics do not match the domains any
+                    # more
+                    self._domain_stats = None
                     # call possibly with delay
                     self._event_emit_delayed(event)
 
@@ -721,6 +801,84 @@ class Host(object):
 
         return doms
 
+    def _get_domain_stats_records(self, doms):
+        """Returns the bulk statistics records of the domains by UUID.
+
+        Returns None if the bulk domain statistics API is not available.
+        """
+        if (self._skip_domain_stats or not doms or
+                not self.has_min_version(MIN_LIBVIRT_DOMAIN_STATS_VERSION)):
+            return None
+
+        try:
+            stats = (libvirt.VIR_DOMAIN_STATS_STATE |
+                     libvirt.VIR_DOMAIN_STATS_VCPU |
+                     libvirt.VIR_DOMAIN_STATS_INTERFACE |
+                     libvirt.VIR_DOMAIN_STATS_BLOCK)
+            records = self.get_connection().domainListGetStats(doms, stats)
+        except (libvirt.libvirtError, AttributeError) as ex:
+            LOG.info(_LI("Unable to use bulk domain statistics APIs, "
+                         "falling back to slow code path: %(ex)s"),
+                     {'ex': ex})
+            self._skip_domain_stats = True
+            return None
+
+        return {dom.UUIDString(): record for dom, record in records}
+
+    def get_domain_stats(self):
+        """Get the statistics of the running nova instances
+
+        The statistics of all the domains are collected at once and
+        shared by the callers, such as the periodic tasks, until a
+        domain lifecycle event happens or DOMAIN_STATS_MAX_AGE seconds
+        have passed.
+
+        :returns: list of DomainStats objects
+        """
+
+        now = time.time()
+        if (self._domain_stats is not None and
+                now - self._domain_stats_time < DOMAIN_STATS_MAX_AGE):
+            return self._domain_stats
+
+        doms = self.list_instance_domains()
+        records = self._get_domain_stats_records(doms)
+        if records is None:
+            domain_stats = [DomainStats(self, dom) for dom in doms]
+        else:
+            domain_stats = [DomainStats(self, dom,
+                                        records.get(dom.UUIDString()))
+                            for dom in doms]
+
+        # Forget the descriptions of the domains which went away
+        uuids = set(stats.uuid for stats in domain_stats
+                    if stats.record is not None)
+        for uuid in list(self._domain_xml):
+            if uuid not in uuids:
+                del self._domain_xml[uuid]
+
+        self._domain_stats = domain_stats
+        self._domain_stats_time = now
+        return domain_stats
+
+    def get_domain_xml(self, domain_stats):
+        """Get the XML description of a domain from a statistics snapshot
+
+        The description is kept as long as the domain generation is the
+        same, so that it is not queried again on each snapshot.
+        """
+        generation = domain_stats.generation
+        if generation is None:
+            return domain_stats.dom.XMLDesc(0)
+
+        cached = self._domain_xml.get(domain_stats.uuid)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+        xml = domain_stats.dom.XMLDesc(0)
+        self._domain_xml[domain_stats.uuid] = (generation, xml)
+        return xml
+
     def get_online_cpus(self):
         """Get the set of CPUs that are online on the host
 
@@ -30,11 +30,13 @@ from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+import six
 
 from nova.i18n import _LE
 from nova.i18n import _LI
 from nova.i18n import _LW
 from nova.openstack.common import fileutils
+from nova.openstack.common import periodic_task
 from nova import utils
 from nova.virt import imagecache
 from nova.virt.libvirt import utils as libvirt_utils
@@ -63,12 +65,26 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.BoolOpt('image_cache_inventory',
+                default=False,
+                help='Keep an inventory of the base images used by the '
+                     'instances in _base, updated as instances are spawned '
+                     'and deleted, rather than inspecting every instance '
+                     'disk on each image cache manager pass. On shared '
+                     'instance storage only one compute node at a time then '
+                     'runs the pass'),
+    cfg.IntOpt('image_cache_inventory_reconcile_seconds',
+               default=(24 * 3600),
+               help='How frequently the image cache inventory is checked '
+                    'against all the instance disks'),
     ]
 
 CONF = cfg.CONF
 CONF.register_opts(imagecache_opts, 'libvirt')
 CONF.import_opt('instances_path', 'nova.compute.manager')
 CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
+CONF.import_opt('image_cache_manager_interval', 'nova.virt.imagecache')
+CONF.import_opt('host', 'nova.netconf')
 
 
 def get_cache_fname(images, key):
@@ -211,6 +227,51 @@ def write_stored_info(target, field=None, value=None):
     write_file(info_file, field, value)
 
 
+def get_inventory_filename():
+    """Return the path of the inventory of the base images."""
+    return os.path.join(CONF.instances_path,
+                        CONF.image_cache_subdirectory_name, 'inventory')
+
+
+def update_inventory(func):
+    """Update the inventory of the base images.
+
+    The inventory is passed to func, which changes it in place and returns
+    False if it left it unchanged. The inventory is read and written back
+    while holding a lock, so that the compute nodes sharing the instance
+    storage serialize their updates.
+
+    Returns whether the inventory was written.
+    """
+
+    inventory_file = get_inventory_filename()
+    fileutils.ensure_tree(os.path.dirname(inventory_file))
+    lock_path = os.path.join(CONF.instances_path, 'locks')
+
+    @utils.synchronized('image-cache-inventory', external=True,
+                        lock_path=lock_path)
+    def update_file(inventory_file):
+        d = {}
+        if os.path.exists(inventory_file):
+            with open(inventory_file, 'r') as f:
+                d = _read_possible_json(f.read(), inventory_file)
+        d.setdefault('instances', {})
+        d.setdefault('last_used', {})
+
+        if func(d) is False:
+            return False
+
+        # Write a new file and rename it over the old one, so that the
+        # inventory is never seen half written.
+        tmp_file = inventory_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(jsonutils.dumps(d))
+        os.rename(tmp_file, inventory_file)
+        return True
+
+    return update_file(inventory_file)
+
+
 def _hash_file(filename):
     """Generate a hash for the contents of a file."""
     checksum = hashlib.sha1()
@@ -255,6 +316,12 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.removable_base_files = []
         self.unexplained_images = []
 
+        # The inventory as read at the start of the pass, the instance disks
+        # inspected and the base files used during it
+        self.inventory = None
+        self.inventory_instances = {}
+        self.inventory_last_used = {}
+
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
         entpath = os.path.join(base_dir, ent)
@@ -304,9 +371,9 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 if os.path.exists(disk_path):
                     LOG.debug('%s has a disk file', ent)
                     try:
-                        backing_file = libvirt_utils.get_disk_backing_file(
-                            disk_path)
-                    except processutils.ProcessExecutionError:
+                        backing_file = self._get_disk_backing_file(ent,
+                                                                   disk_path)
+                    except (OSError, processutils.ProcessExecutionError):
                         # (for bug 1261442)
                         if not os.path.exists(disk_path):
                             LOG.debug('Failed to get disk backing file: %s',
@@ -337,6 +404,133 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                             self.unexplained_images.remove(backing_path)
         return inuse_images
 
+    def _get_disk_backing_file(self, ent, disk_path):
+        """Return the backing file of an instance disk.
+
+        With the inventory enabled the backing file recorded there is used,
+        as long as the disk is still the same file.
+        """
+        if self.inventory is None:
+            return libvirt_utils.get_disk_backing_file(disk_path)
+
+        inode = os.stat(disk_path).st_ino
+        known = self.inventory['instances'].get(ent)
+        if known and known['inode'] == inode:
+            backing_file = known['backing']
+        else:
+            backing_file = libvirt_utils.get_disk_backing_file(disk_path)
+        self.inventory_instances[ent] = {'inode': inode,
+                                         'backing': backing_file}
+        return backing_file
+
+    def _inspect_instance(self, instance):
+        """Return the inventory entry of an instance, or None."""
+        instance_dir = libvirt_utils.get_instance_path(instance)
+        disk_path = os.path.join(instance_dir, 'disk')
+        try:
+            inode = os.stat(disk_path).st_ino
+            backing_file = libvirt_utils.get_disk_backing_file(disk_path)
+        except (OSError, processutils.ProcessExecutionError):
+            return None
+        return {'inode': inode, 'backing': backing_file}
+
+    def add_instance(self, instance):
+        """Record the base image of a newly spawned instance."""
+        if not CONF.libvirt.image_cache_inventory:
+            return
+
+        ent = os.path.basename(libvirt_utils.get_instance_path(instance))
+        entry = self._inspect_instance(instance)
+        if entry is None:
+            return
+
+        def add(inventory):
+            inventory['instances'][ent] = entry
+            if entry['backing']:
+                inventory['last_used'][entry['backing']] = time.time()
+
+        try:
+            update_inventory(add)
+        except (IOError, OSError) as e:
+            # The next reconciliation of the inventory will catch up
+            LOG.warn(_LW('Failed to update the image cache inventory: %s'),
+                     e, instance=instance)
+
+    def remove_instance(self, instance):
+        """Forget the base image of an instance being deleted."""
+        if not CONF.libvirt.image_cache_inventory:
+            return
+
+        ent = os.path.basename(libvirt_utils.get_instance_path(instance))
+
+        def remove(inventory):
+            entry = inventory['instances'].pop(ent, None)
+            if entry is None:
+                return False
+            if entry['backing']:
+                inventory['last_used'][entry['backing']] = time.time()
+
+        try:
+            update_inventory(remove)
+        except (IOError, OSError) as e:
+            LOG.warn(_LW('Failed to update the image cache inventory: %s'),
+                     e, instance=instance)
+
+    def _load_inventory(self):
+        """Read the inventory and take the lease on the cache manager pass.
+
+        Compute nodes sharing the instance storage share the inventory, and
+        the one holding the lease runs the pass for all of them. The lease
+        is renewed on each pass and is taken over by another node once the
+        holder misses two of them.
+
+        Returns False if another compute node holds the lease.
+        """
+        interval = max(CONF.image_cache_manager_interval,
+                       periodic_task.DEFAULT_INTERVAL)
+        now = time.time()
+
+        def load(inventory):
+            lease = inventory.get('lease')
+            if (lease and lease['host'] != CONF.host and
+                    now - lease['time'] < 2 * interval):
+                LOG.debug('Skipping the image cache manager pass, %s runs '
+                          'it for this instance storage', lease['host'])
+                return False
+
+            inventory['lease'] = {'host': CONF.host, 'time': now}
+            reconciled = inventory.get('reconciled')
+            if (not reconciled or now - reconciled >=
+                    CONF.libvirt.image_cache_inventory_reconcile_seconds):
+                # Inspect every instance disk again during this pass
+                LOG.debug('Reconciling the image cache inventory')
+                inventory['instances'] = {}
+                inventory['reconciled'] = now
+            self.inventory = inventory
+
+        return update_inventory(load)
+
+    def _save_inventory(self):
+        """Write back what this pass learnt to the inventory."""
+        loaded = self.inventory['instances']
+        removed_base_files = [os.path.basename(base_file)
+                              for base_file in self.removable_base_files
+                              if not os.path.exists(base_file)]
+
+        def save(inventory):
+            inventory['instances'].update(self.inventory_instances)
+            # Forget the instances which went away during the pass, unless
+            # they were updated in the meantime
+            for ent, entry in six.iteritems(loaded):
+                if (ent not in self.inventory_instances and
+                        inventory['instances'].get(ent) == entry):
+                    del inventory['instances'][ent]
+            inventory['last_used'].update(self.inventory_last_used)
+            for base_file in removed_base_files:
+                inventory['last_used'].pop(base_file, None)
+
+        update_inventory(save)
+
     def _find_base_file(self, base_dir, fingerprint):
         """Find the base file matching this fingerprint.
 
@@ -448,6 +642,12 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         if not exists:
             return
 
+        if self.inventory is not None:
+            last_used = self.inventory['last_used'].get(
+                os.path.basename(base_file))
+            if last_used:
+                age = min(age, time.time() - last_used)
+
         if age < maxage:
             LOG.info(_LI('Base or swap file too young to remove: %s'),
                          base_file)
@@ -562,7 +762,11 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                            'base_file': base_file})
                 if os.path.exists(base_file):
                     libvirt_utils.chown(base_file, os.getuid())
-                    os.utime(base_file, None)
+                    if self.inventory is None:
+                        os.utime(base_file, None)
+                    else:
+                        self.inventory_last_used[
+                            os.path.basename(base_file)] = time.time()
 
     def _age_and_verify_swap_images(self, context, base_dir):
         LOG.debug('Verify swap images')
@@ -651,6 +855,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             return
         # reset the local statistics
         self._reset_state()
+        if CONF.libvirt.image_cache_inventory and not self._load_inventory():
+            return
         # read the cached images
         self._list_base_images(base_dir)
         # read running instances data
@@ -662,3 +868,5 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         # perform the aging and image verification
         self._age_and_verify_cached_images(context, all_instances, base_dir)
         self._age_and_verify_swap_images(context, base_dir)
+        if self.inventory is not None:
+            self._save_inventory()
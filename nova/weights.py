@@ -18,6 +18,7 @@ Pluggable Weighing support
 """
 
 import abc
+import time
 
 import six
 
@@ -89,6 +90,24 @@ class BaseWeigher(object):
     def _weigh_object(self, obj, weight_properties):
         """Weigh an specific object."""
 
+    def _record_min_max(self, weights):
+        """Record the min and max values of the weights.
+
+        The min and max values are only updated if they are None or exceeded
+        by the weights. If they are anything but None we assume that the
+        weigher has set them.
+        """
+        if not weights:
+            return
+
+        if self.minval is None:
+            self.minval = weights[0]
+        if self.maxval is None:
+            self.maxval = weights[0]
+
+        self.minval = min(self.minval, min(weights))
+        self.maxval = max(self.maxval, max(weights))
+
     def weigh_objects(self, weighed_obj_list, weight_properties):
         """Weigh multiple objects.
 
@@ -97,24 +116,9 @@ class BaseWeigher(object):
         just return a list of weights.
         """
         # Calculate the weights
-        weights = []
-        for obj in weighed_obj_list:
-            weight = self._weigh_object(obj.obj, weight_properties)
-
-            # Record the min and max values if they are None. If they anything
-            # but none we assume that the weigher has set them
-            if self.minval is None:
-                self.minval = weight
-            if self.maxval is None:
-                self.maxval = weight
-
-            if weight < self.minval:
-                self.minval = weight
-            elif weight > self.maxval:
-                self.maxval = weight
-
-            weights.append(weight)
-
+        weights = [self._weigh_object(obj.obj, weight_properties)
+                   for obj in weighed_obj_list]
+        self._record_min_max(weights)
         return weights
 
 
@@ -122,13 +126,20 @@ class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
     def get_weighed_objects(self, weighers, obj_list, weighing_properties):
-        """Return a sorted (descending), normalized list of WeighedObjects."""
+        """Return a sorted (descending), normalized list of WeighedObjects.
+
+        If weighing_properties contains a 'scheduler_trace' list, a dict with
+        the name, the number of objects and the time taken by each weigher is
+        appended to it.
+        """
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
 
         if len(weighed_objs) <= 1:
             return weighed_objs
 
+        trace = weighing_properties.get('scheduler_trace')
         for weigher in weighers:
+            start = time.time()
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
             # Normalize the weights
@@ -136,8 +147,13 @@ class BaseWeightHandler(loadables.BaseLoader):
                                 minval=weigher.minval,
                                 maxval=weigher.maxval)
 
-            for i, weight in enumerate(weights):
-                obj = weighed_objs[i]
-                obj.weight += weigher.weight_multiplier() * weight
+            multiplier = weigher.weight_multiplier()
+            for obj, weight in zip(weighed_objs, weights):
+                obj.weight += multiplier * weight
+
+            if trace is not None:
+                trace.append({'weigher': weigher.__class__.__name__,
+                              'hosts_in': len(weighed_objs),
+                              'elapsed': time.time() - start})
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)